@@ -1,18 +1,29 @@
 import faiss
 import pickle
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from openai import OpenAI
+from embedding_backend import load_embedding_model
 from difflib import get_close_matches
 import spacy
 import re
 import nltk
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
 from rank_bm25 import BM25Okapi
-import string
 import os
+import time
+import asyncio
+from functools import lru_cache
 from dotenv import load_dotenv
+from llm import achat_completion, chat_completion, get_gateway
+from summarizer import SummaryStore, summarize_owner
+from fact_extractor import FactStore, QUESTION_FACTS, extract_owner_facts, format_fact_answer
+from context_assembler import create_context_assembler
+from singleflight import SingleFlight, normalize_question
+from metrics import ASK_SECONDS, SEARCH_SECONDS, observe_stage, stage_timer
+from tracing import current_trace, trace_set
+from compaction import compact_index, compact_list, merge_ranges, shift_ids
+from retrieval import HybridRetriever, normalize_rows, preprocess_text, rank_owner_chunks
+from keyword_index import load_keyword_index
+from token_windows import encode_chunks
+import threading
 
 # Load environment variables
 load_dotenv()
@@ -29,38 +40,167 @@ except LookupError:
     nltk.download('stopwords')
 
 # === Load FAISS index dan metadata ===
-print("Memuat index dan metadata...")
-index = faiss.read_index("doc_index.faiss")
-with open("doc_chunks.pkl", "rb") as f:
-    data = pickle.load(f)
+class Corpus:
+    """
+    Snapshot index + chunks + metadata beserta chunk id yang sudah dihapus (tombstone).
+    Tidak pernah diubah di tempat: tombstone baru dan compaction memasang snapshot baru (satu
+    assignment), jadi query yang sedang berjalan selalu membaca satu versi yang konsisten.
+    """
 
-chunks = data["chunks"]
-metadatas = data["metadatas"]
+    def __init__(self, index, chunks, metadatas, deleted=frozenset(), generation=0):
+        self.index = index
+        self.chunks = chunks
+        self.metadatas = metadatas
+        self.deleted = deleted
+        self.generation = generation
+
+    def with_deleted(self, ranges):
+        deleted = self.deleted.union(i for start, end in ranges for i in range(start, min(end, len(self.chunks))))
+        return Corpus(self.index, self.chunks, self.metadatas, deleted, self.generation)
+
+    def appended(self, new_chunks, new_metadatas, embeddings):
+        """Snapshot baru dengan chunk tambahan di akhir (id lama tetap); index lama disalin, tidak diubah"""
+        appended_index = faiss.clone_index(self.index)
+        appended_index.add(np.asarray(embeddings, dtype=np.float32))
+        return Corpus(appended_index, self.chunks + list(new_chunks), self.metadatas + list(new_metadatas),
+                      self.deleted, self.generation + 1)
+
+    def compacted(self, ranges):
+        """Snapshot baru tanpa rentang (id chunk bergeser); index/list lama tetap utuh"""
+        ranges = merge_ranges(ranges, limit=len(self.chunks))
+        return Corpus(compact_index(self.index, ranges), compact_list(self.chunks, ranges),
+                      compact_list(self.metadatas, ranges), shift_ids(self.deleted, ranges), self.generation + 1)
+
+# FAISS_MMAP=1: vektor IndexFlat dibaca lewat mmap (page cache) alih-alih disalin ke heap,
+# sehingga beberapa worker (serve.py) berbagi halaman index yang sama
+FAISS_MMAP = os.getenv("FAISS_MMAP", "0").lower() in ("1", "true", "yes")
+
+def read_index(path="doc_index.faiss"):
+    # IO_FLAG_MMAP_IFC belum ada di faiss lama → baca biasa
+    mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    if FAISS_MMAP and mmap_flag is not None:
+        return faiss.read_index(path, mmap_flag)
+    return faiss.read_index(path)
+
+def load_corpus(tombstones=(), generation=0):
+    """Baca index + chunks dari disk; tombstones = rentang chunk [start, end) yang sudah dihapus"""
+    with open("doc_chunks.pkl", "rb") as f:
+        data = pickle.load(f)
+    return Corpus(read_index(), data["chunks"], data["metadatas"], generation=generation).with_deleted(tombstones)
+
+# RETRIEVAL_SHARDS=url,url,...: corpus dilayani proses shard (sharding.py / shard_server.py);
+# proses ini tidak memuat index/chunks, retrieval owner dikirim ke shard owner
+RETRIEVAL_SHARDS = [url.strip() for url in os.getenv("RETRIEVAL_SHARDS", "").split(",") if url.strip()]
+shard_router = None
+if RETRIEVAL_SHARDS:
+    from sharding import ShardRouter
+    print(f"Menghubungkan ke {len(RETRIEVAL_SHARDS)} shard retrieval...")
+    shard_router = ShardRouter(RETRIEVAL_SHARDS)
+    corpus = Corpus(faiss.IndexFlatL2(shard_router.dimension), [], [])
+else:
+    print("Memuat index dan metadata...")
+    corpus = load_corpus()
+
+# Nama lama (benchmark, /metrics); selalu menunjuk ke snapshot terbaru
+index, chunks, metadatas = corpus.index, corpus.chunks, corpus.metadatas
+_corpus_lock = threading.Lock()  # hanya untuk penulis (tombstone/compaction), bukan query
+
+def mark_deleted(ranges):
+    """
+    Tombstone rentang chunk id: langsung tidak ikut retrieval (cek O(1) per chunk).
+    Fakta/rangkuman owner yang tidak punya chunk tersisa ikut dibuang.
+    """
+    global corpus
+    with _corpus_lock:
+        corpus = corpus.with_deleted(ranges)
+        snapshot = corpus
+    owners = {snapshot.metadatas[i].get("owner", "") for start, end in ranges
+              for i in range(start, min(end, len(snapshot.chunks)))}
+    for owner in owners:
+        if owner and not any(meta.get("owner", "") == owner and i not in snapshot.deleted
+                             for i, meta in enumerate(snapshot.metadatas)):
+            fact_store.remove(owner)
+            summary_store.remove(owner)
+
+def apply_compaction(ranges):
+    """Pasang snapshot yang sudah dipadatkan (dipanggil compactor setelah file ditulis ulang)"""
+    global corpus, index, chunks, metadatas
+    with _corpus_lock:
+        corpus = corpus.compacted(ranges)
+        index, chunks, metadatas = corpus.index, corpus.chunks, corpus.metadatas
+    get_owner_retrieval.cache_clear()
+    reset_global_retriever()
+
+def append_chunks(start, new_chunks, new_metadatas, embeddings):
+    """
+    Chunk yang baru di-index worker upload langsung ikut query (deteksi owner, /ask, /search).
 
-# === Load embedding model ===
-model = SentenceTransformer("all-MiniLM-L6-v2")
+    Returns:
+        False jika snapshot tidak bisa disambung (start bukan akhir snapshot, index di-mmap, atau
+        corpus dilayani shard): pemanggil memuat ulang dengan reload_corpus
+    """
+    global corpus, index, chunks, metadatas, all_owners
+    if shard_router is not None or FAISS_MMAP:
+        return False
+    with _corpus_lock:
+        if start != len(corpus.chunks):
+            return False
+        corpus = corpus.appended(new_chunks, new_metadatas, embeddings)
+        index, chunks, metadatas = corpus.index, corpus.chunks, corpus.metadatas
+        _extend_global_retriever(corpus, new_chunks, new_metadatas)
+    all_owners = list(set(all_owners).union(meta["owner"] for meta in new_metadatas
+                                            if isinstance(meta, dict) and "owner" in meta))
+    get_owner_retrieval.cache_clear()
+    return True
+
+def reload_corpus(tombstones=()):
+    """
+    Ganti snapshot dengan isi file terbaru (chunk id bergeser di proses lain, atau compaction
+    dengan FAISS_MMAP agar index tetap di-mmap).
 
-# === Setup OpenAI Client untuk DeepSeek Chat V3 ===
-client = OpenAI(
-    base_url=os.getenv("OPENAI_BASE_URL", "https://openrouter.ai/api/v1"),
-    api_key=os.getenv("OPENAI_API_KEY", "Your API key here"),
-    timeout=30.0  # Tambah timeout
-)
+    Raises:
+        RuntimeError: index dan chunks di disk tidak sejajar (sedang ditulis) → coba lagi nanti
+    """
+    global corpus, index, chunks, metadatas, all_owners
+    if shard_router is not None:
+        return  # shard dibangun ulang dari file master dengan `sharding.py split`
+    fresh = load_corpus(tombstones)
+    if fresh.index.ntotal != len(fresh.chunks):
+        raise RuntimeError(f"Index ({fresh.index.ntotal}) dan chunks ({len(fresh.chunks)}) tidak sejajar")
+    with _corpus_lock:
+        fresh.generation = corpus.generation + 1
+        corpus = fresh
+        index, chunks, metadatas = corpus.index, corpus.chunks, corpus.metadatas
+    all_owners = list(set(meta["owner"] for meta in metadatas if isinstance(meta, dict) and "owner" in meta))
+    get_owner_retrieval.cache_clear()
+    reset_global_retriever()
+
+# === Load embedding model (EMBEDDING_BACKEND: torch | onnx | onnx-int8) ===
+model = load_embedding_model()
+
+# === Penyusun konteks prompt (dedup + budget token) ===
+context_assembler = create_context_assembler(model.tokenizer)
+
+# === Setup LLM gateway untuk DeepSeek Chat V3 (connection pool, retry, hedging, circuit breaker) ===
+llm_gateway = get_gateway()
+
+# === Rangkuman per dokumen (dihitung saat ingest, lihat summarizer.py) ===
+summary_store = SummaryStore.shared()
+
+# === Tabel fakta per owner (tanggal, luas/lokasi properti, area rambah) ===
+fact_store = FactStore.shared()
+
+# === Coalescing pertanyaan identik yang sedang diproses ===
+inflight_questions = SingleFlight()
 
 # === Test Koneksi API ===
 def test_api_connection():
     """Test koneksi ke DeepSeek Chat V3 API"""
     try:
         print("🔍 Testing koneksi ke DeepSeek Chat V3...")
-        response = client.chat.completions.create(
-            extra_headers={
-                "HTTP-Referer": "https://aiPintar.local",
-                "X-Title": "AI Pintar Document QA System",
-            },
-            model=os.getenv("MODEL_NAME", "deepseek/deepseek-chat-v3-0324:free"),
-            messages=[
-                {"role": "user", "content": "Hello, please respond with 'API connection successful'"}
-            ],
+        chat_completion(
+            "You are a connection test.",
+            "Hello, please respond with 'API connection successful'",
             max_tokens=50
         )
         print("Koneksi API berhasil!")
@@ -79,41 +219,10 @@ nlp = spacy.load("en_core_web_sm")
 
 # === Ambil daftar owner unik ===
 all_owners = list(set(meta["owner"] for meta in metadatas if isinstance(meta, dict) and "owner" in meta))
+if shard_router is not None:
+    all_owners = list(shard_router.owners)
 
-# === Preprocessing Functions ===
-def preprocess_text(text):
-    """
-    Preprocessing text: lowercase, tokenisasi, hapus stopwords dan punctuation
-    """
-    if not text:
-        return []
-    
-    try:
-        # Download nltk data jika belum ada
-        try:
-            stopwords.words('indonesian')
-        except LookupError:
-            nltk.download('stopwords', quiet=True)
-            nltk.download('punkt', quiet=True)
-    except:
-        pass
-    
-    # Lowercase
-    text = text.lower()
-    
-    # Tokenize
-    tokens = word_tokenize(text)
-    
-    # Remove punctuation and stopwords
-    try:
-        stop_words = set(stopwords.words('english')) | set(stopwords.words('indonesian'))
-    except:
-        stop_words = set(stopwords.words('english'))
-    
-    tokens = [token for token in tokens if token not in string.punctuation and token not in stop_words and len(token) > 2]
-    
-    return tokens
-
+# === Preprocessing Functions (preprocess_text ada di retrieval.py, dipakai juga oleh shard) ===
 def preprocess_query(query):
     """
     Preprocessing untuk query: lowercase, tokenisasi
@@ -126,81 +235,190 @@ def preprocess_chunks_for_bm25(chunks):
     """
     return [preprocess_text(chunk) for chunk in chunks]
 
-def hybrid_retrieval(query, owner_chunks, top_k=5):
+# === Struktur retrieval per owner (BM25 + embedding chunk), dipakai bersama oleh semua pertanyaan ===
+OWNER_CACHE_SIZE = int(os.getenv("OWNER_CACHE_SIZE", "128"))
+
+@lru_cache(maxsize=OWNER_CACHE_SIZE)
+def get_owner_retrieval(owner_key, generation=0):
     """
-    Hybrid retrieval menggunakan BM25 + FAISS untuk pertanyaan bebas
+    Chunk milik owner beserta BM25 dan embedding chunk (ternormalisasi) yang dibangun sekali.
+    Embedding diambil dari FAISS index tanpa encode ulang jika index sejajar dengan chunks.
+    Tombstone tidak dibuang di sini (difilter saat query); generation = versi snapshot corpus.
+    """
+    snapshot = corpus
+    ids = [i for i, meta in enumerate(snapshot.metadatas) if meta.get("owner", "").lower() == owner_key]
+    owner_chunks = [{'text': snapshot.chunks[i], 'index': i, 'metadata': snapshot.metadatas[i]} for i in ids]
+    if not ids:
+        return owner_chunks, None, None
+
+    bm25 = BM25Okapi([preprocess_text(snapshot.chunks[i]) for i in ids])
+    if snapshot.index.ntotal == len(snapshot.chunks):
+        embeddings = np.vstack([snapshot.index.reconstruct(i) for i in ids])
+    else:
+        embeddings = encode_chunks(model, [snapshot.chunks[i] for i in ids])
+    return owner_chunks, bm25, normalize_rows(np.asarray(embeddings, dtype=np.float32))
+
+def hybrid_retrieval_batch(queries, owner, top_k=5):
     """
+    Hybrid retrieval (BM25 + FAISS) untuk beberapa pertanyaan bebas milik satu owner sekaligus:
+    satu kali encode untuk semua pertanyaan dan struktur BM25/embedding owner yang sama.
+
+    Returns:
+        List hasil per pertanyaan (urutan sama dengan queries)
+    """
+    if shard_router is not None:
+        try:
+            with stage_timer("embedding"):
+                query_embeddings = np.asarray(model.encode(list(queries)), dtype=np.float32)
+            with stage_timer("shard_search"):
+                results = shard_router.search_owner(owner, list(queries), query_embeddings, top_k)
+            print(f"🔍 Hybrid retrieval: {len(queries)} pertanyaan untuk '{owner}' di shard {shard_router.shard_for(owner)}")
+            return results
+        except Exception as e:
+            print(f"❌ Error dalam hybrid retrieval (shard): {e}")
+            return [[] for _ in queries]
+
+    snapshot = corpus
+    owner_chunks, bm25, chunk_embeddings = get_owner_retrieval(owner.lower(), snapshot.generation)
+    # Chunk dokumen yang sudah dihapus (tombstone) tidak boleh terpilih
+    dead = np.array([chunk['index'] in snapshot.deleted for chunk in owner_chunks], dtype=bool) \
+        if snapshot.deleted else None
+    live_count = len(owner_chunks) - (int(dead.sum()) if dead is not None else 0)
+    if not live_count:
+        return [[] for _ in queries]
+
     try:
-        # Preprocessing query
-        processed_query = preprocess_text(query)
-        
-        # Preprocessing semua chunk untuk BM25
-        processed_chunks = []
-        chunk_texts = []
-        for chunk in owner_chunks:
-            processed_chunk = preprocess_text(chunk['text'])
-            processed_chunks.append(processed_chunk)
-            chunk_texts.append(chunk['text'])
-        
-        if not processed_chunks:
-            return []
-        
-        # Inisialisasi BM25
-        bm25 = BM25Okapi(processed_chunks)
-        
-        # Hitung skor BM25
-        bm25_scores = bm25.get_scores(processed_query)
-        
-        # Hitung FAISS similarity
-        query_embedding = model.encode([query])
-        
-        faiss_scores = []
-        for chunk_text in chunk_texts:
-            chunk_embedding = model.encode([chunk_text])
-            # Cosine similarity
-            similarity = np.dot(query_embedding[0], chunk_embedding[0]) / (
-                np.linalg.norm(query_embedding[0]) * np.linalg.norm(chunk_embedding[0])
-            )
-            faiss_scores.append(similarity)
-        
-        faiss_scores = np.array(faiss_scores)
-        
-        # Normalisasi skor (0-1)
-        if len(bm25_scores) > 1 and np.max(bm25_scores) > np.min(bm25_scores):
-            bm25_scores_norm = (bm25_scores - np.min(bm25_scores)) / (np.max(bm25_scores) - np.min(bm25_scores))
-        else:
-            bm25_scores_norm = np.ones_like(bm25_scores)
-            
-        if len(faiss_scores) > 1 and np.max(faiss_scores) > np.min(faiss_scores):
-            faiss_scores_norm = (faiss_scores - np.min(faiss_scores)) / (np.max(faiss_scores) - np.min(faiss_scores))
-        else:
-            faiss_scores_norm = np.ones_like(faiss_scores)
-        
-        # Gabungkan skor (weighted average: 40% BM25 + 60% FAISS)
-        combined_scores = 0.4 * bm25_scores_norm + 0.6 * faiss_scores_norm
-        
-        # Ambil top_k chunks dengan skor tertinggi
-        top_indices = np.argsort(combined_scores)[::-1][:top_k]
-        
-        # Return chunks dengan skor
-        result_chunks = []
-        for idx in top_indices:
-            chunk_data = owner_chunks[idx].copy()
-            chunk_data['bm25_score'] = float(bm25_scores[idx])
-            chunk_data['faiss_score'] = float(faiss_scores[idx])
-            chunk_data['combined_score'] = float(combined_scores[idx])
-            result_chunks.append(chunk_data)
-        
-        print(f"🔍 Hybrid retrieval: {len(result_chunks)} chunks retrieved")
-        for i, chunk in enumerate(result_chunks):
-            print(f"  Chunk {i+1}: BM25={chunk['bm25_score']:.3f}, FAISS={chunk['faiss_score']:.3f}, Combined={chunk['combined_score']:.3f}")
-        
-        return result_chunks
-        
+        with stage_timer("embedding"):
+            query_embeddings = normalize_rows(np.asarray(model.encode(list(queries)), dtype=np.float32))
+        results = rank_owner_chunks(owner_chunks, bm25, chunk_embeddings, queries, query_embeddings, top_k, dead)
+        print(f"🔍 Hybrid retrieval: {len(queries)} pertanyaan, {len(owner_chunks)} chunk milik '{owner}'")
+        return results
+
     except Exception as e:
         print(f"❌ Error dalam hybrid retrieval: {e}")
-        # Fallback: ambil 5 chunk pertama
-        return owner_chunks[:top_k]
+        # Fallback: ambil chunk pertama
+        live_chunks = [chunk for chunk in owner_chunks if chunk['index'] not in snapshot.deleted]
+        return [live_chunks[:top_k] for _ in queries]
+
+def hybrid_retrieval(query, owner, top_k=5):
+    """
+    Hybrid retrieval menggunakan BM25 + FAISS untuk pertanyaan bebas
+    """
+    result_chunks = hybrid_retrieval_batch([query], owner, top_k=top_k)[0]
+    for i, chunk in enumerate(result_chunks):
+        print(f"  Chunk {i+1}: BM25={chunk.get('bm25_score', 0):.3f}, FAISS={chunk.get('faiss_score', 0):.3f}, "
+              f"Combined={chunk.get('combined_score', 0):.3f}")
+    return result_chunks
+
+# === Retrieval saja tanpa LLM (/search, /search/batch) ===
+# Dengan filter type/pasal kandidat diambil SEARCH_OVERFETCH x top_k lalu disaring
+SEARCH_OVERFETCH = int(os.getenv("SEARCH_OVERFETCH", "5"))
+
+# (generation, HybridRetriever) untuk pencarian lintas owner; diperpanjang di tempat saat append
+_global_retriever = None
+_global_retriever_lock = threading.Lock()
+
+def get_global_retriever(generation=0):
+    """
+    HybridRetriever atas snapshot corpus untuk pencarian lintas owner. Keyword index dimuat dari
+    doc_keyword_index.pkl dan dibatasi ke chunk id snapshot (load_keyword_index, tanpa menulis file);
+    chunk upload berikutnya ditambahkan incremental oleh append_chunks.
+    Snapshot dengan generation lebih lama memakai retriever terbaru (append tidak menggeser chunk id).
+    """
+    global _global_retriever
+    cached = _global_retriever
+    if cached is not None and cached[0] >= generation:
+        return cached[1]
+    with _global_retriever_lock:
+        snapshot = corpus
+        if _global_retriever is None or _global_retriever[0] < snapshot.generation:
+            # List sendiri: add_chunks memperpanjang chunks/metadata retriever, bukan milik snapshot
+            retriever = HybridRetriever(model, list(snapshot.chunks), list(snapshot.metadatas),
+                                        keyword_index=load_keyword_index(snapshot.chunks))
+            retriever.set_faiss_index(snapshot.index)
+            _global_retriever = (snapshot.generation, retriever)
+        return _global_retriever[1]
+
+def reset_global_retriever():
+    """Chunk id bergeser (compaction/reload): retriever dibangun ulang saat query berikutnya"""
+    global _global_retriever
+    with _global_retriever_lock:
+        _global_retriever = None
+
+def _extend_global_retriever(snapshot, new_chunks, new_metadatas):
+    """Chunk baru masuk keyword index dan FAISS retriever yang sudah ada, tanpa membangun ulang"""
+    global _global_retriever
+    with _global_retriever_lock:
+        if _global_retriever is None:
+            return
+        generation, retriever = _global_retriever
+        if generation >= snapshot.generation:
+            return  # dibangun dari snapshot ini oleh query yang berjalan bersamaan
+        if generation + 1 != snapshot.generation or len(retriever.chunks) + len(new_chunks) != len(snapshot.chunks):
+            _global_retriever = None
+            return
+        retriever.add_chunks(list(new_chunks), list(new_metadatas))
+        retriever.set_faiss_index(snapshot.index)
+        _global_retriever = (snapshot.generation, retriever)
+
+def _search_hit(chunk_id, score, keyword_score, semantic_score, text, metadata, include_text):
+    hit = {"chunk_id": chunk_id, "score": score, "keyword_score": keyword_score,
+           "semantic_score": semantic_score, "metadata": metadata}
+    if include_text:
+        hit["text"] = text
+    return hit
+
+def search_chunks(queries, owner=None, top_k=5, doc_type=None, pasal=None, include_text=True, expand=False):
+    """
+    Chunk teratas per query tanpa memanggil LLM.
+
+    Dengan owner: ranking yang sama dengan /ask (BM25 + cosine atas chunk owner, keyword_score = BM25,
+    semantic_score = cosine). Tanpa owner: hybrid search global (TF-IDF + FAISS) atas seluruh corpus,
+    atau scatter-gather ke semua shard jika RETRIEVAL_SHARDS diset.
+
+    Args:
+        doc_type: Filter metadata type (tanggal | pasal | umum)
+        pasal: Filter nomor pasal (metadata pasal == "PASAL <n>")
+        expand: Pencarian global tanpa shard: setiap query diperluas dengan QueryExpander dan
+            hasil semua variasinya digabung dengan RRF (multi_query_search)
+
+    Returns:
+        (hasil per query, shard yang gagal menjawab)
+    """
+    def keep(meta):
+        return ((doc_type is None or meta.get("type") == doc_type)
+                and (pasal is None or meta.get("pasal") == f"PASAL {pasal}"))
+
+    fetch_k = top_k * SEARCH_OVERFETCH if doc_type is not None or pasal is not None else top_k
+    failed = []
+    started = time.perf_counter()
+    if owner:
+        results = [[_search_hit(c["index"], c["combined_score"], c["bm25_score"], c["faiss_score"],
+                                c["text"], c["metadata"], include_text)
+                    for c in ranked if keep(c["metadata"])][:top_k]
+                   for ranked in hybrid_retrieval_batch(queries, _resolve_owner(owner), fetch_k)]
+    else:
+        if shard_router is not None:
+            with stage_timer("embedding"):
+                query_vecs = np.asarray(model.encode(list(queries)), dtype=np.float32)
+            with stage_timer("shard_search"):
+                ranked_lists, failed = shard_router.search(list(queries), query_vecs, fetch_k)
+        else:
+            snapshot = corpus
+            retriever = get_global_retriever(snapshot.generation)
+            if expand:
+                ranked_lists = [retriever.multi_query_search(query, fetch_k, rerank=False, exclude=snapshot.deleted)
+                                for query in queries]
+            else:
+                ranked_lists = retriever.hybrid_search_batch(list(queries), fetch_k, exclude=snapshot.deleted)
+        results = [[_search_hit(r["chunk_index"], r["combined_score"], r["keyword_score"], r["semantic_score"],
+                                r["text"], r["metadata"], include_text)
+                    for r in ranked if keep(r["metadata"])][:top_k]
+                   for ranked in ranked_lists]
+    elapsed = (time.perf_counter() - started) / max(len(queries), 1)
+    for _ in queries:
+        SEARCH_SECONDS.observe(elapsed, "owner" if owner else "global")
+    return results, failed
 
 # === Deteksi nama owner dari pertanyaan ===
 def detect_owner_from_question(question):
@@ -262,25 +480,109 @@ def extract_pasal_index(question):
 # === Proses pertanyaan ===
 def ask_question(question, top_k=5):
     print(f"❓ Pertanyaan: {question}")
+    started = time.perf_counter()
 
-    owner = detect_owner_from_question(question)
+    with stage_timer("owner_detection"):
+        owner = detect_owner_from_question(question)
     if not owner:
         return "Tidak bisa mendeteksi nama pemilik dari pertanyaan. Harap sebutkan nama lengkapnya."
     print(f"Deteksi owner: {owner}")
 
-    qtype = detect_question_type(question)
-    print(f"Jenis pertanyaan: {qtype}")
+    trace_set("owner", owner)
+
+    if current_trace() is not None:
+        # Request debug/profiling selalu dihitung sendiri agar breakdown tahapnya utuh
+        answer = _answer_question(question, owner, top_k)
+    else:
+        # Pertanyaan identik (owner + pertanyaan ternormalisasi) yang sedang berjalan berbagi satu komputasi
+        key = (owner.lower(), normalize_question(question), top_k)
+        answer, shared = inflight_questions.do(key, _answer_question, question, owner, top_k)
+        if shared:
+            print(f"Pertanyaan digabung dengan request lain yang sedang berjalan (owner: {owner})")
+    ASK_SECONDS.observe(time.perf_counter() - started, detect_question_type(question))
+    return answer
+
+def _answer_question(question, owner, top_k):
+    prepared = prepare_answer(question, owner, top_k)
+    if "answer" in prepared:
+        return prepared["answer"]
+
+    print(" Mengirim ke model DeepSeek Chat V3...")
+    try:
+        with stage_timer("llm"):
+            return chat_completion(prepared["system_prompt"], prepared["user_prompt"])
+    except Exception as e:
+        return _llm_error_answer(e)
+
+def _llm_error_answer(e):
+    print(f" Error saat menghubungi DeepSeek Chat V3: {e}")
+    print("🔧Kemungkinan penyebab:")
+    print("   1. Masalah koneksi internet")
+    print("   2. API key tidak valid")
+    print("   3. Firewall blocking request")
+    print("   4. Service OpenRouter sedang down")
+    return f"Gagal mendapatkan respons dari AI: {str(e)}"
+
+def prepare_answer(question, owner, top_k=5, retrieved=None):
+    """
+    Semua langkah sebelum LLM: tabel fakta, pemilihan konteks dan prompt.
+
+    Args:
+        retrieved: Hasil hybrid retrieval yang sudah dihitung (batch); None = hitung di sini
 
-    # Filter semua chunk milik owner
-    filtered = [(i, chunk, meta) for i, (chunk, meta) in enumerate(zip(chunks, metadatas))
-                if meta.get("owner", "").lower() == owner.lower()]
+    Returns:
+        {"answer": ...} jika bisa dijawab tanpa LLM, atau {"system_prompt": ..., "user_prompt": ...}
+    """
+    with stage_timer("classification"):
+        qtype = detect_question_type(question)
+    print(f"Jenis pertanyaan: {qtype}")
+    trace_set("question_type", qtype)
+
+    # Filter semua chunk milik owner (tanpa chunk dokumen yang sudah dihapus)
+    snapshot = corpus
+    chunks, metadatas = snapshot.chunks, snapshot.metadatas
+    with stage_timer("filtering"):
+        if shard_router is not None:
+            # Chunk owner dari shard-nya; fakta/rangkuman cukup melihat chunk owner ini
+            owner_chunks = shard_router.owner_chunks(owner)
+            filtered = [(c["index"], c["text"], c["metadata"]) for c in owner_chunks]
+            chunks, metadatas = [c["text"] for c in owner_chunks], [c["metadata"] for c in owner_chunks]
+        else:
+            filtered = [(i, chunk, meta) for i, (chunk, meta) in enumerate(zip(chunks, metadatas))
+                        if meta.get("owner", "").lower() == owner.lower() and i not in snapshot.deleted]
     if not filtered:
-        return f" Tidak ditemukan dokumen milik '{owner}'."
+        return {"answer": f" Tidak ditemukan dokumen milik '{owner}'."}
+
+    # Pertanyaan tanggal/luas/lokasi dijawab dari tabel fakta tanpa LLM jika confidence cukup
+    fact_name = QUESTION_FACTS.get(qtype)
+    if fact_name:
+        with stage_timer("fact_lookup"):
+            if not fact_store.has_owner(owner):
+                fact_store.put(owner, extract_owner_facts(owner, chunks, metadatas))
+            fact = fact_store.lookup(owner, fact_name)
+        if fact:
+            print(f"Menjawab dari tabel fakta ({fact_name}, confidence={fact['confidence']})")
+            trace_set("answered_from", "fact_table")
+            return {"answer": format_fact_answer(fact_name, fact)}
+        print(f"Fakta '{fact_name}' tidak tersedia/confidence rendah, fallback ke LLM")
 
     selected_contexts = []
+    context_scores = None  # default: urutan selected_contexts
 
     if qtype == "define_rangkuman":
-        selected_contexts = [chunk for _, chunk, _ in filtered]
+        # Pakai rangkuman yang sudah dihitung saat ingest; jika belum ada, hitung sekali (map-reduce) lalu simpan
+        summary = summary_store.get(owner)
+        if summary is None:
+            print(f"Rangkuman '{owner}' belum ada, menjalankan map-reduce...")
+            try:
+                with stage_timer("summary"):
+                    summary = summarize_owner(owner, chunks, metadatas, chat_completion, summary_store)
+            except Exception as e:
+                print(f" Gagal membuat rangkuman: {e}")
+                return {"answer": f"Gagal mendapatkan respons dari AI: {str(e)}"}
+        else:
+            print(f"Memakai rangkuman tersimpan untuk '{owner}'")
+        selected_contexts = [summary] if summary else []
 
     elif qtype == "define_tanggal":
         # Untuk pertanyaan tanggal, ambil HANYA chunk pertama dari dokumen (informasi tanggal ada di chunk pertama)
@@ -319,35 +621,36 @@ def ask_question(question, top_k=5):
 
     else:
         # Free question → hybrid retrieval (BM25 + FAISS)
-        print("Melakukan hybrid retrieval (BM25 + FAISS)...")
-        
-        # Siapkan owner chunks dalam format yang diperlukan untuk hybrid retrieval
-        owner_chunks = []
-        for i, chunk, meta in filtered:
-            owner_chunks.append({
-                'text': chunk,
-                'index': i,
-                'metadata': meta
-            })
-        
-        if owner_chunks:
-            # Gunakan hybrid retrieval
-            result_chunks = hybrid_retrieval(question, owner_chunks, top_k=top_k)
-            selected_contexts = [chunk_data['text'] for chunk_data in result_chunks]
-        else:
-            selected_contexts = []
+        if retrieved is None:
+            print("Melakukan hybrid retrieval (BM25 + FAISS)...")
+            retrieved = hybrid_retrieval(question, owner, top_k=top_k)
+        selected_contexts = [chunk_data['text'] for chunk_data in retrieved]
+        context_scores = [chunk_data.get('combined_score', 0.0) for chunk_data in retrieved]
+        trace_set("candidates", [{"chunk_id": chunk_data.get('index'),
+                                  "bm25_score": chunk_data.get('bm25_score'),
+                                  "faiss_score": chunk_data.get('faiss_score'),
+                                  "combined_score": chunk_data.get('combined_score')}
+                                 for chunk_data in retrieved])
 
     if not selected_contexts:
-        return f" Tidak ditemukan informasi yang cocok di dokumen milik '{owner}'."
-
-    context = "\n---\n".join(selected_contexts)
+        return {"answer": f" Tidak ditemukan informasi yang cocok di dokumen milik '{owner}'."}
+    if current_trace() is not None and qtype not in ("free", "define_rangkuman"):
+        # Id chunk yang dipilih langsung (tanpa skor) untuk jenis pertanyaan berbasis posisi/pasal
+        trace_set("candidates", [{"chunk_id": i} for i, chunk, _ in filtered if chunk in selected_contexts])
+
+    # Buang span yang tumpang tindih, urutkan berdasarkan skor, dan batasi dengan budget token
+    assembly_started = time.perf_counter()
+    context, context_report = context_assembler.assemble(selected_contexts, context_scores)
+    trace_set("context", context_report)
+    print(f"Konteks: {context_report['tokens_after']} token "
+          f"(hemat {context_report['tokens_saved']} token, "
+          f"{context_report['duplicate_spans_removed']} span duplikat dibuang)")
 
     # Adaptive system prompt based on question type
     if qtype == "define_rangkuman":
         system_prompt = (
-            "Berikan rangkuman komprehensif dari dokumen ini. Jangan memberikan informasi tambahan di luar dokumen. "
-            "Buatlah rangkuman dalam 5 poin penjelasan singkat yang merangkum keseluruhan isi dokumen. "
-            "Setiap poin harus mencakup aspek penting dari dokumen seperti pihak-pihak yang terlibat, "
+            "Berikut adalah rangkuman dokumen yang sudah disiapkan. Jawab permintaan pengguna berdasarkan rangkuman ini saja. "
+            "Sajikan dalam 5 poin penjelasan singkat yang mencakup pihak-pihak yang terlibat, "
             "ruang lingkup pekerjaan, jangka waktu, dan ketentuan-ketentuan utama."
         )
     elif qtype == "define_tanggal": #untuk tanggal p,pembuatan erjanjian
@@ -388,30 +691,119 @@ def ask_question(question, top_k=5):
             "Jika tidak ditemukan jawabannya, balas: 'Informasi tidak ditemukan dalam dokumen.'"
         )
 
-    print(" Mengirim ke model DeepSeek Chat V3...")
+    observe_stage("prompt_assembly", time.perf_counter() - assembly_started)
+    return {"system_prompt": system_prompt, "user_prompt": f"Dokumen:\n{context}\n\nPertanyaan:\n{question}"}
+
+# === Batch pertanyaan (banyak owner x banyak pertanyaan) ===
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "8"))
+
+def _resolve_owner(owner):
+    """Nama owner dari request batch → nama owner di index (case-insensitive / fuzzy)"""
+    for known in all_owners:
+        if known.lower() == owner.lower():
+            return known
+    match = get_close_matches(owner, all_owners, n=1, cutoff=0.8)
+    return match[0] if match else owner
+
+def prepare_owner_batch(owner, questions, top_k=5):
+    """
+    Siapkan semua pertanyaan milik satu owner: pertanyaan bebas di-retrieve sekaligus
+    (satu encode + BM25 bersama), jenis lain lewat jalur prepare_answer biasa.
+
+    Returns:
+        List hasil prepare_answer (urutan sama dengan questions)
+    """
+    free_positions = [i for i, q in enumerate(questions) if detect_question_type(q) == "free"]
+    retrieved = {}
+    if free_positions:
+        batch_results = hybrid_retrieval_batch([questions[i] for i in free_positions], owner, top_k=top_k)
+        retrieved = dict(zip(free_positions, batch_results))
+    return [prepare_answer(q, owner, top_k, retrieved.get(i)) for i, q in enumerate(questions)]
+
+async def ask_batch(items, top_k=5, max_concurrency=None):
+    """
+    Jawab banyak pertanyaan sekaligus. Pertanyaan dikelompokkan per owner (pertanyaan identik
+    untuk owner yang sama hanya dijawab sekali), retrieval per owner berjalan di thread,
+    dan panggilan LLM berjalan bersamaan dengan batas max_concurrency.
+
+    Args:
+        items: List dict {"id", "question", "owner" (opsional, default dideteksi dari pertanyaan)}
+
+    Yields:
+        Hasil per pertanyaan sesuai urutan selesai:
+        {"id", "question", "owner", "answer", "status", "elapsed_ms"}
+    """
+    started = time.perf_counter()
+    semaphore = asyncio.Semaphore(max_concurrency or BATCH_LLM_CONCURRENCY)
+    results = asyncio.Queue()
+
+    async def emit(group_items, owner, answer, status):
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        for item in group_items:
+            await results.put({"id": item["id"], "question": item["question"], "owner": owner,
+                               "answer": answer, "status": status, "elapsed_ms": elapsed_ms})
+
+    async def answer_prepared(group_items, owner, prepared):
+        if "answer" in prepared:
+            await emit(group_items, owner, prepared["answer"], "success")
+            return
+        async with semaphore:
+            try:
+                with stage_timer("llm"):
+                    answer = await achat_completion(prepared["system_prompt"], prepared["user_prompt"])
+                status = "success"
+            except Exception as e:
+                answer = _llm_error_answer(e)
+                status = "error"
+        await emit(group_items, owner, answer, status)
+
+    async def answer_owner(owner, questions):
+        # questions: pertanyaan ternormalisasi -> item-item dengan pertanyaan tersebut
+        grouped = list(questions.values())
+        try:
+            prepared_list = await asyncio.to_thread(
+                prepare_owner_batch, owner, [group[0]["question"] for group in grouped], top_k)
+        except Exception as e:
+            print(f" Error saat menyiapkan batch owner '{owner}': {e}")
+            for group in grouped:
+                await emit(group, owner, f"Error processing question: {str(e)}", "error")
+            return
+        await asyncio.gather(*(answer_prepared(group, owner, prepared)
+                               for group, prepared in zip(grouped, prepared_list)))
+
+    async def run():
+        # Kelompokkan per owner; owner yang tidak disebutkan dideteksi dari pertanyaan (spaCy, di thread)
+        detected = await asyncio.to_thread(
+            lambda: [_resolve_owner(item["owner"]) if item.get("owner") else detect_owner_from_question(item["question"])
+                     for item in items])
+        owners = {}
+        for item, owner in zip(items, detected):
+            if not owner:
+                await emit([item], None, "Tidak bisa mendeteksi nama pemilik dari pertanyaan. "
+                                         "Harap sebutkan nama lengkapnya.", "error")
+                continue
+            owners.setdefault(owner, {}).setdefault(normalize_question(item["question"]), []).append(item)
+
+        print(f"Batch: {len(items)} pertanyaan, {len(owners)} owner")
+        await asyncio.gather(*(answer_owner(owner, questions) for owner, questions in owners.items()))
+
+    async def run_guarded():
+        # Error tak terduga diteruskan ke consumer agar stream tidak menunggu selamanya
+        try:
+            await run()
+        except Exception as e:
+            await results.put(e)
+
+    runner = asyncio.ensure_future(run_guarded())
     try:
-        response = client.chat.completions.create(
-            extra_headers={
-                "HTTP-Referer": "https://aiPintar.local",
-                "X-Title": "AI Pintar Document QA System",
-            },
-            model=os.getenv("MODEL_NAME", "deepseek/deepseek-chat-v3-0324:free"),
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Dokumen:\n{context}\n\nPertanyaan:\n{question}"}
-            ],
-            timeout=30.0  # Tambah timeout
-        )
-        return response.choices[0].message.content
-    
-    except Exception as e:
-        print(f" Error saat menghubungi DeepSeek Chat V3: {e}")
-        print("🔧Kemungkinan penyebab:")
-        print("   1. Masalah koneksi internet")
-        print("   2. API key tidak valid")
-        print("   3. Firewall blocking request")
-        print("   4. Service OpenRouter sedang down")
-        return f"Gagal mendapatkan respons dari AI: {str(e)}"
+        for _ in range(len(items)):
+            result = await results.get()
+            if isinstance(result, Exception):
+                raise result
+            yield result
+    finally:
+        if not runner.done():
+            runner.cancel()
 
 # === CLI Loop ===
 if __name__ == "__main__":
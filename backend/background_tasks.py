@@ -1,36 +1,81 @@
-import asyncio
 import os
 import threading
 import time
 from pathlib import Path
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional, Tuple
 import logging
 from datetime import datetime
 import json
 
 # Import existing modules
-from semantic_chunker import split_into_chunks, load_pdf_text
+from semantic_chunker import CHUNKING_MODE, split_into_chunks, load_pdf_text
+from token_windows import CHUNK_FIT, encode_chunks
 import pickle
 import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
+from embedding_backend import load_embedding_model
+from keyword_index import InvertedIndex, load_or_build_keyword_index, KEYWORD_INDEX_PATH
+from llm import chat_completion
+from summarizer import SummaryStore, summarize_text
+from fact_extractor import FactStore, extract_facts
+from metrics import INGEST_STAGE_SECONDS, INGEST_TASKS_TOTAL, stage_timer
+from job_queue import JobQueue, JobStatus, PermanentJobError, worker_identity
+from doc_catalog import DocumentCatalog, DocStatus, hash_file, pdf_page_count
+from compaction import Compactor
+from ingest import _atomic_pickle, _atomic_write_index, CHUNKS_PATH, INDEX_PATH
 
 logger = logging.getLogger(__name__)
 
-class TaskStatus:
-    PENDING = "pending"
-    PROCESSING = "processing"
-    COMPLETED = "completed"
-    FAILED = "failed"
+# Nama lama dipertahankan untuk modul lain (main.py)
+TaskStatus = JobStatus
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "1"))
+INGEST_POLL_SECONDS = float(os.getenv("INGEST_POLL_SECONDS", "1.0"))
+# Progress setelah index tersimpan; retry dari titik ini tidak meng-index ulang (hanya rangkuman)
+INDEXED_PROGRESS = 96
 
 class BackgroundTaskManager:
-    def __init__(self):
-        self.tasks: Dict[str, Dict] = {}
+    """
+    Worker ingest + compactor. Index/chunks baru dimuat dan thread baru jalan di start(), agar
+    proses yang hanya melayani query (worker serve.py selain yang pertama) tidak menyalin index
+    dan tidak ada thread yang hidup saat fork.
+    """
+    def __init__(self, num_workers: int = INGEST_WORKERS):
+        self.num_workers = num_workers
         self.model = None
         self.index = None
         self.chunks = []
         self.metadatas = []
-        self.load_existing_data()
+        self.keyword_index = InvertedIndex()
+        self.summary_store = SummaryStore.shared()
+        self.fact_store = FactStore.shared()
+        self.queue = JobQueue()
+        self.catalog = DocumentCatalog()
+        # Update index/chunk in-memory + simpan ke disk hanya satu worker sekaligus
+        self._index_lock = threading.Lock()
+        # Dipanggil dengan list rentang chunk [start, end): tombstone baru / rentang yang sudah dipadatkan
+        self.tombstone_listeners: List[Callable[[List[Tuple[int, int]]], None]] = []
+        self.compaction_listeners: List[Callable[[List[Tuple[int, int]]], None]] = []
+        # Dipanggil (start, chunks, metadatas, embeddings) setelah chunk baru tersimpan ke disk
+        self.index_listeners: List[Callable[[int, List[str], List[Dict], np.ndarray], None]] = []
+        self.compactor = Compactor(self)
+        # Compaction yang terputus diselesaikan sebelum ask.py memuat index
+        if self.catalog.pending_compaction() is not None:
+            self.load_existing_data()
+            self.compactor.recover()
+        self._stop = threading.Event()
+        self._workers: List[threading.Thread] = []
+    
+    def start(self, num_workers: Optional[int] = None):
+        """Muat index/chunks lalu jalankan compactor dan worker ingest"""
+        if self.index is None:
+            self.load_existing_data()
+        self.compactor.start()
+        self.start_workers(self.num_workers if num_workers is None else num_workers)
+    
+    def stop(self, timeout: Optional[float] = None):
+        self.compactor.stop(timeout)
+        self.stop_workers(timeout)
         
     def load_existing_data(self):
         """Load existing FAISS index and chunks if they exist"""
@@ -41,10 +86,11 @@ class BackgroundTaskManager:
                     data = pickle.load(f)
                     self.chunks = data["chunks"]
                     self.metadatas = data["metadatas"]
+                self.keyword_index = load_or_build_keyword_index(self.chunks)
                 logger.info(f"Loaded existing index with {len(self.chunks)} chunks")
             else:
                 # Initialize empty index
-                self.model = SentenceTransformer("all-MiniLM-L6-v2")
+                self.model = load_embedding_model()
                 embedding_dim = self.model.get_sentence_embedding_dimension()
                 self.index = faiss.IndexFlatL2(embedding_dim)
                 self.chunks = []
@@ -53,151 +99,294 @@ class BackgroundTaskManager:
         except Exception as e:
             logger.error(f"Error loading existing data: {e}")
             # Fallback to empty index
-            self.model = SentenceTransformer("all-MiniLM-L6-v2")
+            self.model = load_embedding_model()
             embedding_dim = self.model.get_sentence_embedding_dimension()
             self.index = faiss.IndexFlatL2(embedding_dim)
             self.chunks = []
             self.metadatas = []
     
-    def create_task(self, task_id: str, task_type: str, file_path: str) -> str:
-        """Create a new background task"""
-        self.tasks[task_id] = {
-            "id": task_id,
-            "type": task_type,
-            "status": TaskStatus.PENDING,
-            "file_path": file_path,
-            "filename": os.path.basename(file_path),
-            "created_at": datetime.now().isoformat(),
-            "progress": 0,
-            "message": "Task created",
-            "error": None
-        }
-        
-        # Start processing in background thread
-        thread = threading.Thread(target=self._process_task, args=(task_id,))
-        thread.daemon = True
-        thread.start()
+    def start_workers(self, count: int):
+        """Jalankan worker; job milik proses sebelumnya yang mati dilanjutkan"""
+        released = self.queue.release_dead_workers()
+        if released:
+            logger.info(f"Resumed {released} task(s) interrupted by restart")
+        for i in range(count):
+            worker = threading.Thread(target=self._worker_loop, name=f"ingest-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+    
+    def stop_workers(self, timeout: Optional[float] = None):
+        self._stop.set()
+        self.queue.wakeup.set()
+        for worker in self._workers:
+            worker.join(timeout)
+        self._workers = []
+    
+    def create_task(self, task_id: str, task_type: str, file_path: str, filename: Optional[str] = None) -> str:
+        """
+        Masukkan file ke job queue (persisten). Diproses oleh worker, bukan di request.
         
-        return task_id
+        Args:
+            filename: Nama file asli (menentukan owner); default basename file_path
+        """
+        payload = {"file_path": file_path, "filename": filename or os.path.basename(file_path)}
+        return self.queue.enqueue(task_type, payload, job_id=task_id)
+    
+    def get_task(self, task_id: str) -> Optional[Dict]:
+        return self.queue.get(task_id)
     
     def get_task_status(self, task_id: str) -> Dict:
         """Get status of a specific task"""
-        return self.tasks.get(task_id, {"status": "not_found"})
+        return self.get_task(task_id) or {"status": "not_found"}
+    
+    def get_all_tasks(self, limit: int = 100) -> List[Dict]:
+        """Task terbaru (semua status)"""
+        return self.queue.list(limit)
+    
+    def cleanup_old_tasks(self, max_age_hours: int = 24) -> int:
+        """Remove old completed/failed tasks"""
+        removed = self.queue.prune(max_age_hours)
+        logger.info(f"Cleaned up {removed} old tasks")
+        return removed
+    
+    def delete_document(self, doc_id: str, before_commit: Optional[Callable[[Dict], None]] = None) -> Optional[Dict]:
+        """
+        Hapus dokumen dari katalog dan tombstone rentang chunk-nya: langsung tidak ikut retrieval,
+        vektor dan teksnya dibuang compactor kemudian.
+        
+        Args:
+            before_commit: Dijalankan di dalam transaksi katalog (mis. unlink file)
+        
+        Returns:
+            Baris katalog yang dihapus, atau None jika tidak ada
+        """
+        with self._index_lock:
+            doc = self.catalog.remove(doc_id, before_commit=before_commit, tombstone=True)
+            if doc is not None and doc["chunks"]:
+                self._notify_tombstone([(doc["chunk_start"], doc["chunk_end"])], doc["owner"])
+        return doc
     
-    def cleanup_old_tasks(self, max_age_hours: int = 24):
-        """Remove tasks older than max_age_hours"""
+    def _notify_indexed(self, start: int, end: int):
+        """
+        Chunk [start, end) sudah tersimpan: snapshot query di proses ini (index_listeners) dan worker
+        lain (index_version di katalog) ikut memuatnya. self._index_lock dipegang.
+        """
+        self.catalog.bump_index_version()
+        if not self.index_listeners:
+            return
+        embeddings = self.index.reconstruct_n(start, end - start)
+        for listener in self.index_listeners:
+            try:
+                listener(start, self.chunks[start:end], self.metadatas[start:end], embeddings)
+            except Exception as e:
+                logger.warning(f"Index listener failed for chunks {start}-{end}: {e}")
+    
+    def _notify_tombstone(self, ranges: List[Tuple[int, int]], owner: Optional[str]):
+        for listener in self.tombstone_listeners:
+            listener(ranges)
+        # Fakta/rangkuman owner hanya dibuang jika tidak ada dokumen lain milik owner yang sama
+        if owner and self.catalog.list(limit=1, owner=owner, status=DocStatus.INDEXED)[1] == 0:
+            self.fact_store.remove(owner)
+            self.summary_store.remove(owner)
+        self.compactor.request()
+    
+    def _worker_loop(self):
+        worker_id = worker_identity()
+        while not self._stop.is_set():
+            try:
+                job = self.queue.claim(worker_id)
+            except Exception as e:
+                logger.error(f"Worker {worker_id}: claim failed: {e}")
+                job = None
+            if job is None:
+                self.queue.wakeup.wait(INGEST_POLL_SECONDS)
+                self.queue.wakeup.clear()
+                continue
+            self._run_job(job, worker_id)
+    
+    def _run_job(self, job: Dict, worker_id: str):
+        # Heartbeat memperpanjang lease selama job berjalan (embedding/rangkuman bisa lama)
+        stop_heartbeat = threading.Event()
+        
+        def heartbeat():
+            while not stop_heartbeat.wait(self.queue.lease_seconds / 3):
+                if not self.queue.heartbeat(job["id"], worker_id):
+                    break
+        
+        threading.Thread(target=heartbeat, daemon=True).start()
         try:
-            current_time = datetime.now()
-            to_remove = []
-            
-            for task_id, task in self.tasks.items():
-                created_at = datetime.fromisoformat(task["created_at"])
-                age_hours = (current_time - created_at).total_seconds() / 3600
-                
-                if age_hours > max_age_hours:
-                    to_remove.append(task_id)
-            
-            for task_id in to_remove:
-                del self.tasks[task_id]
-                logger.info(f"Cleaned up old task: {task_id}")
-                
-            return len(to_remove)
+            result = self._process_task(job)
+            message = result.pop("message")
+            if not self.queue.complete(job["id"], worker_id, result, message):
+                logger.warning(f"Task {job['id']}: lease lost before completion, result discarded")
+                return
+            INGEST_TASKS_TOTAL.inc(TaskStatus.COMPLETED)
+            logger.info(f"Task {job['id']} completed successfully")
         except Exception as e:
-            logger.error(f"Error cleaning up tasks: {e}")
-            return 0
+            status = self.queue.fail(job["id"], worker_id, str(e), retry=not isinstance(e, PermanentJobError))
+            if status is None:
+                logger.warning(f"Task {job['id']}: lease lost, failure not recorded: {e}")
+                return
+            INGEST_TASKS_TOTAL.inc("retried" if status == TaskStatus.PENDING else TaskStatus.FAILED)
+            logger.error(f"Task {job['id']} attempt {job['attempts']} failed ({status}): {e}")
+        finally:
+            stop_heartbeat.set()
     
-    def _process_task(self, task_id: str):
-        """Process a single file indexing task"""
-        try:
-            task = self.tasks[task_id]
-            file_path = task["file_path"]
-            filename = task["filename"]
-            
-            # Update status
-            task["status"] = TaskStatus.PROCESSING
-            task["progress"] = 10
-            task["message"] = "Extracting text from PDF..."
-            
-            # Extract text
+    def _rollback(self, start: int):
+        """Buang chunk >= start dari state in-memory (index/save gagal di tengah jalan)"""
+        for doc_id in range(start, len(self.chunks)):
+            self.keyword_index.remove_document(doc_id)
+        if self.index.ntotal > start:
+            self.index.remove_ids(faiss.IDSelectorRange(start, self.index.ntotal))
+        del self.chunks[start:]
+        del self.metadatas[start:]
+    
+    def _catalog_indexed(self, doc_id: str, file_path: str, filename: str, owner: str,
+                         chunk_start: int, chunk_end: int):
+        """Catat rentang chunk di katalog; dokumen yang belum tercatat (job lama) didaftarkan dari file"""
+        if self.catalog.mark_indexed(doc_id, owner, chunk_start, chunk_end):
+            return
+        if not os.path.exists(file_path):
+            # Dihapus lewat DELETE /files selama indexing: chunk yang baru ditambahkan langsung di-tombstone
+            logger.warning(f"Task {doc_id}: file deleted during indexing, chunks tombstoned")
+            self.catalog.add_tombstone(doc_id, owner, chunk_start, chunk_end)
+            self._notify_tombstone([(chunk_start, chunk_end)], owner)
+            return
+        size, sha256 = hash_file(file_path)
+        self.catalog.upsert_indexed(doc_id, os.path.basename(file_path), filename, owner, chunk_start, chunk_end,
+                                    size, sha256, pdf_page_count(file_path))
+    
+    def _find_saved_chunks(self, doc_id: str, owner: str, new_chunks: List[str]) -> Optional[Tuple[int, int]]:
+        """
+        Rentang [start, end) berisi persis new_chunks yang sudah tersimpan oleh attempt sebelumnya:
+        rentang katalog dokumen ini, atau rentang owner yang belum dimiliki dokumen lain di katalog
+        (crash sebelum katalog dicatat). self._index_lock dipegang.
+        """
+        doc = self.catalog.get(doc_id)
+        if doc and doc["chunk_start"] is not None:
+            start, end = doc["chunk_start"], doc["chunk_end"]
+            if self.chunks[start:end] == new_chunks:
+                return start, end
+        claimed = {row["chunk_start"] for row in self.catalog.list(limit=1000, owner=owner)[0]}
+        tombstoned = {start for start, _ in self.catalog.tombstone_ranges()}
+        size = len(new_chunks)
+        for start in range(len(self.chunks) - size, -1, -1):
+            if (self.metadatas[start].get("owner") == owner and start not in claimed and start not in tombstoned
+                    and self.chunks[start:start + size] == new_chunks):
+                return start, start + size
+        return None
+
+    def _process_task(self, job: Dict) -> Dict:
+        """
+        Process a single file indexing task.
+        
+        Returns:
+            Hasil job (disimpan di queue), "message" dipakai sebagai pesan akhir
+        """
+        task_id = job["id"]
+        file_path = job["payload"]["file_path"]
+        filename = job["payload"]["filename"]
+        already_indexed = job["progress"] >= INDEXED_PROGRESS
+        
+        def progress(value: int, message: str, stage: str):
+            self.queue.update_progress(task_id, value, message, stage)
+        
+        if not os.path.exists(file_path):
+            raise PermanentJobError(f"File not found: {file_path}")
+        
+        progress(10, "Extracting text from PDF...", "extract")
+        
+        # Extract text
+        with stage_timer("extract", INGEST_STAGE_SECONDS):
             text = load_pdf_text(file_path)
-            if not text:
-                raise Exception("Failed to extract text from PDF")
-            
-            task["progress"] = 30
-            task["message"] = "Creating semantic chunks..."
-            
-            # Create chunks
-            new_chunks, new_metadatas = split_into_chunks(text, filename)
-            if not new_chunks:
-                raise Exception("No chunks created from document")
+        if not text:
+            raise PermanentJobError("Failed to extract text from PDF")
+        
+        # Create chunks (owner dari nama file asli, bukan nama simpanan dengan prefix id)
+        progress(30, "Creating semantic chunks...", "chunk")
+        # Mode semantic meng-encode kalimat dengan model yang sama dengan embedding chunk;
+        # CHUNK_FIT=pack memakai tokenizer model tersebut untuk ukuran window
+        if (CHUNKING_MODE == "semantic" or CHUNK_FIT == "pack") and self.model is None:
+            self.model = load_embedding_model()
+        with stage_timer("chunking", INGEST_STAGE_SECONDS):
+            new_chunks, new_metadatas = split_into_chunks(text, filename, model=self.model)
+        if not new_chunks:
+            raise PermanentJobError("No chunks created from document")
+        owner = new_metadatas[0]["owner"]
+        
+        if not already_indexed and job["attempts"] > 1:
+            # Attempt sebelumnya bisa crash setelah index/chunks tersimpan tapi sebelum progress dicatat
+            with self._index_lock:
+                saved = self._find_saved_chunks(task_id, owner, new_chunks)
+                if saved is not None:
+                    self._notify_indexed(*saved)
+                    self._catalog_indexed(task_id, file_path, filename, owner, *saved)
+            if saved is not None:
+                progress(INDEXED_PROGRESS, "Index saved", "saved")
+                already_indexed = True
+
+        if already_indexed:
+            logger.info(f"Task {task_id}: index already saved by a previous attempt, skipping to summary")
+        else:
+            # Ekstrak fakta terstruktur (tanggal, luas, lokasi) dengan regex
+            with stage_timer("facts", INGEST_STAGE_SECONDS):
+                self.fact_store.put(owner, extract_facts(text))
             
-            task["progress"] = 60
-            task["message"] = "Generating embeddings..."
+            progress(60, "Generating embeddings...", "embed")
             
             # Load model if not already loaded
             if self.model is None:
-                self.model = SentenceTransformer("all-MiniLM-L6-v2")
+                self.model = load_embedding_model()
             
             # Generate embeddings for new chunks
-            embeddings = self.model.encode(new_chunks, show_progress_bar=False)
-            embeddings = np.array(embeddings).astype("float32")
-            
-            task["progress"] = 80
-            task["message"] = "Updating index..."
-            
-            # Add to existing data
-            self.chunks.extend(new_chunks)
-            self.metadatas.extend(new_metadatas)
-            
-            # Add embeddings to index
-            self.index.add(embeddings)
+            with stage_timer("embedding", INGEST_STAGE_SECONDS):
+                embeddings = encode_chunks(self.model, new_chunks)
             
-            task["progress"] = 95
-            task["message"] = "Saving index..."
-            
-            # Save updated index and chunks
-            faiss.write_index(self.index, "doc_index.faiss")
-            with open("doc_chunks.pkl", "wb") as f:
-                pickle.dump({
-                    "chunks": self.chunks,
-                    "metadatas": self.metadatas
-                }, f)
-            
-            # Complete task
-            task["status"] = TaskStatus.COMPLETED
-            task["progress"] = 100
-            task["message"] = f"Successfully indexed {len(new_chunks)} chunks from {filename}"
-            task["completed_at"] = datetime.now().isoformat()
-            
-            logger.info(f"Task {task_id} completed successfully")
-            
-        except Exception as e:
-            # Mark task as failed
-            self.tasks[task_id]["status"] = TaskStatus.FAILED
-            self.tasks[task_id]["error"] = str(e)
-            self.tasks[task_id]["message"] = f"Failed: {str(e)}"
-            logger.error(f"Task {task_id} failed: {e}")
-    
-    def get_all_tasks(self) -> List[Dict]:
-        """Get all active tasks"""
-        return list(self.tasks.values())
-    
-    def cleanup_old_tasks(self, max_age_hours: int = 24):
-        """Remove old completed/failed tasks"""
-        current_time = datetime.now()
-        to_remove = []
-        
-        for task_id, task in self.tasks.items():
-            created_at = datetime.fromisoformat(task["created_at"])
-            age_hours = (current_time - created_at).total_seconds() / 3600
-            
-            if age_hours > max_age_hours and task["status"] in [TaskStatus.COMPLETED, TaskStatus.FAILED]:
-                to_remove.append(task_id)
+            progress(80, "Updating index...", "index")
+            with self._index_lock:
+                start = len(self.chunks)
+                try:
+                    with stage_timer("index_update", INGEST_STAGE_SECONDS):
+                        # Add to existing data (keyword index di-update incremental, tanpa refit)
+                        self.keyword_index.add_documents(new_chunks, start_id=start)
+                        self.chunks.extend(new_chunks)
+                        self.metadatas.extend(new_metadatas)
+                        
+                        # Add embeddings to index
+                        self.index.add(embeddings)
+                    
+                    # Save updated index and chunks
+                    # Tulis ke file sementara + rename: proses lain bisa sedang me-mmap index lama
+                    with stage_timer("save", INGEST_STAGE_SECONDS):
+                        _atomic_write_index(self.index, INDEX_PATH)
+                        _atomic_pickle({
+                            "chunks": self.chunks,
+                            "metadatas": self.metadatas
+                        }, CHUNKS_PATH)
+                        self.keyword_index.save(KEYWORD_INDEX_PATH)
+                except Exception:
+                    self._rollback(start)
+                    raise
+                # Sebelum katalog: tombstone untuk file yang dihapus selama indexing harus mengenai chunk ini
+                self._notify_indexed(start, start + len(new_chunks))
+                self._catalog_indexed(task_id, file_path, filename, owner, start, start + len(new_chunks))
+            progress(INDEXED_PROGRESS, "Index saved", "saved")
         
-        for task_id in to_remove:
-            del self.tasks[task_id]
+        # Rangkuman dokumen dihitung sekali di sini (map-reduce), bukan di setiap pertanyaan
+        progress(97, "Summarizing document...", "summary")
+        try:
+            with stage_timer("summary", INGEST_STAGE_SECONDS):
+                summary, sections = summarize_text(text, chat_completion)
+            if summary:
+                self.summary_store.put(owner, summary, sections)
+        except Exception as e:
+            logger.warning(f"Task {task_id}: summary failed, will be computed on demand: {e}")
         
-        logger.info(f"Cleaned up {len(to_remove)} old tasks")
+        return {
+            "owner": owner,
+            "chunks": len(new_chunks),
+            "message": f"Successfully indexed {len(new_chunks)} chunks from {filename}"
+        }
 
 # Global task manager instance
 task_manager = BackgroundTaskManager()
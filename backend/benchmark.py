@@ -0,0 +1,365 @@
+# benchmark.py
+"""
+Benchmark performa yang reproducible di atas korpus perjanjian sintetis (synthetic_corpus.py).
+
+Mengukur:
+1. Throughput ingest: load_pdf_text → split_into_chunks → embedding → FAISS index (+ keyword index)
+2. Latency ask_question p50/p99 per jenis pertanyaan dengan LLM stub (LLM_BACKEND=stub)
+3. Memori puncak: RSS (ru_maxrss) per fase, opsional tracemalloc
+
+Hasil ditulis sebagai JSON agar bisa dibandingkan antar commit:
+
+    python benchmark.py run --docs 200 --output bench_results.json
+    python benchmark.py compare bench_base.json bench_results.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import pickle
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from synthetic_corpus import generate_corpus
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Template pertanyaan per jenis (jenis dicek ulang dengan ask.detect_question_type)
+QUESTION_TEMPLATES = {
+    "define_tanggal": "Kapan perjanjian {owner} ditandatangani?",
+    "define_luas_lokasi": "Berapa luas lahan properti milik {owner}?",
+    "define_luas_area_rambah": "Berapa luas area rambah milik {owner}?",
+    "define_pasal": "Apa isi pasal {pasal} dokumen {owner}?",
+    "define_rangkuman": "Rangkum dokumen {owner}",
+    "free": "Apa kewajiban pihak pertama dalam perjanjian {owner}?",
+}
+
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux: KB, macOS: byte
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def _latency_summary(samples: List[float]) -> Dict:
+    values = np.asarray(samples) * 1000
+    return {
+        "count": len(samples),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+
+class Phase:
+    """Ukur durasi, RSS puncak dan (opsional) puncak tracemalloc satu fase"""
+
+    def __init__(self, results: Dict, name: str, trace_memory: bool):
+        self.results = results
+        self.name = name
+        self.trace_memory = trace_memory
+
+    def __enter__(self):
+        if self.trace_memory:
+            tracemalloc.start()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.results[self.name] = {"seconds": round(time.perf_counter() - self.started, 3),
+                                   "peak_rss_mb": _peak_rss_mb()}
+        if self.trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.results[self.name]["tracemalloc_peak_mb"] = round(peak / 1e6, 1)
+        return False
+
+
+def _chunk_size_summary(chunks: List[str], metadatas: List[Dict]) -> Dict:
+    """Jumlah chunk per type dan distribusi ukuran (kata) chunk umum"""
+    from semantic_chunker import count_tokens
+
+    by_type: Dict[str, int] = {}
+    for meta in metadatas:
+        by_type[meta.get("type", "")] = by_type.get(meta.get("type", ""), 0) + 1
+    sizes = [count_tokens(chunk) for chunk, meta in zip(chunks, metadatas) if meta.get("type") == "umum"]
+    return {
+        "by_type": by_type,
+        "umum_tokens": {"mean": round(float(np.mean(sizes)), 1), "p50": round(float(np.percentile(sizes, 50)), 1),
+                        "p95": round(float(np.percentile(sizes, 95)), 1), "max": max(sizes)} if sizes else {},
+    }
+
+
+def bench_ingestion(pdf_dir: str, batch_size: int, trace_memory: bool, chunking_mode: Optional[str] = None,
+                    chunk_fit: Optional[str] = None) -> Dict:
+    """Jalur ingest yang sama dengan background_tasks, dijalankan berurutan untuk seluruh korpus"""
+    import faiss
+    from embedding_backend import load_embedding_model
+    from keyword_index import InvertedIndex, KEYWORD_INDEX_PATH
+    from semantic_chunker import load_pdf_text, split_into_chunks
+    from token_windows import encode_chunks, truncation_stats
+
+    phases = {}
+    stage_seconds = {"load_pdf_text": 0.0, "split_into_chunks": 0.0}
+    chunks, metadatas = [], []
+    filenames = sorted(name for name in os.listdir(pdf_dir) if name.endswith(".pdf"))
+
+    model = load_embedding_model()
+    with Phase(phases, "extract_and_chunk", trace_memory):
+        # Log DEBUG per file dari semantic_chunker tidak ikut diukur sebagai output terminal
+        with contextlib.redirect_stdout(io.StringIO()):
+            for filename in filenames:
+                started = time.perf_counter()
+                text = load_pdf_text(os.path.join(pdf_dir, filename))
+                stage_seconds["load_pdf_text"] += time.perf_counter() - started
+
+                started = time.perf_counter()
+                file_chunks, file_metadatas = split_into_chunks(text, filename, mode=chunking_mode, model=model,
+                                                                fit=chunk_fit)
+                stage_seconds["split_into_chunks"] += time.perf_counter() - started
+                chunks.extend(file_chunks)
+                metadatas.extend(file_metadatas)
+
+    with Phase(phases, "embedding", trace_memory):
+        embeddings = encode_chunks(model, chunks, batch_size=batch_size, fit=chunk_fit)
+
+    with Phase(phases, "index", trace_memory):
+        index = faiss.IndexFlatL2(embeddings.shape[1])
+        index.add(embeddings)
+        faiss.write_index(index, "doc_index.faiss")
+        with open("doc_chunks.pkl", "wb") as f:
+            pickle.dump({"chunks": chunks, "metadatas": metadatas}, f)
+        InvertedIndex.build(chunks).save(KEYWORD_INDEX_PATH)
+
+    total = sum(phase["seconds"] for phase in phases.values())
+    return {
+        "docs": len(filenames),
+        "chunks": len(chunks),
+        "chunk_sizes": _chunk_size_summary(chunks, metadatas),
+        "truncation": truncation_stats(chunks, model, chunk_fit),
+        "index_bytes": {path: os.path.getsize(path) for path in ("doc_index.faiss", "doc_chunks.pkl", KEYWORD_INDEX_PATH)},
+        "stages_seconds": {name: round(value, 3) for name, value in stage_seconds.items()},
+        "phases": phases,
+        "total_seconds": round(total, 3),
+        "docs_per_second": round(len(filenames) / total, 2) if total else None,
+        "chunks_per_second_embedding": round(len(chunks) / phases["embedding"]["seconds"], 1)
+        if phases["embedding"]["seconds"] else None,
+    }
+
+
+def bench_queries(owners: List[str], num_pasal: int, queries_per_type: int, trace_memory: bool) -> Dict:
+    """Latency ask_question per jenis pertanyaan; ask.py dimuat dari index korpus sintetis di CWD"""
+    os.environ["LLM_BACKEND"] = "stub"
+    with contextlib.redirect_stdout(io.StringIO()):
+        import ask
+    from llm import _stub_llm
+
+    results = {}
+    phases = {}
+    with Phase(phases, "queries", trace_memory):
+        for qtype, template in QUESTION_TEMPLATES.items():
+            questions = [template.format(owner=owners[i % len(owners)], pasal=(i % num_pasal) + 1)
+                         for i in range(queries_per_type)]
+            detected = ask.detect_question_type(questions[0])
+            if detected != qtype:
+                print(f"[BENCH] Template '{qtype}' terdeteksi sebagai '{detected}'")
+
+            latencies = []
+            with contextlib.redirect_stdout(io.StringIO()):
+                ask.ask_question(questions[0])  # warmup (model, cache owner)
+                for question in questions:
+                    started = time.perf_counter()
+                    ask.ask_question(question)
+                    latencies.append(time.perf_counter() - started)
+            results[qtype] = _latency_summary(latencies)
+
+    return {"per_type": results, "phases": phases, "llm_calls": _stub_llm.calls}
+
+
+def run(args) -> Dict:
+    workdir = args.workdir or tempfile.mkdtemp(prefix="docqa_bench_")
+    pdf_dir = os.path.join(workdir, "pdf")
+    started = time.perf_counter()
+    corpus = generate_corpus(pdf_dir, args.docs, args.pasal, args.scanned_ratio, args.seed)
+    print(f"[BENCH] Korpus: {corpus['docs']} dokumen, {corpus['pages']} halaman "
+          f"({time.perf_counter() - started:.1f}s) di '{workdir}'")
+
+    # ask.py dan store-nya membaca/menulis file di CWD → jalankan di workdir
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        ingestion = bench_ingestion(pdf_dir, args.batch_size, args.tracemalloc, args.chunking_mode, args.chunk_fit)
+        print(f"[BENCH] Ingest: {ingestion['docs_per_second']} dok/s, {ingestion['chunks']} chunk")
+        queries = None
+        if not args.skip_queries:
+            queries = bench_queries(list(corpus["facts"]), args.pasal, args.queries_per_type, args.tracemalloc)
+            for qtype, summary in queries["per_type"].items():
+                print(f"[BENCH] {qtype:25s} p50={summary['p50_ms']:.2f}ms p99={summary['p99_ms']:.2f}ms")
+    finally:
+        os.chdir(cwd)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "embedding_backend": os.getenv("EMBEDDING_BACKEND", "torch"),
+            "chunking_mode": args.chunking_mode or os.getenv("CHUNKING_MODE", "tokens"),
+            "chunk_fit": args.chunk_fit or os.getenv("CHUNK_FIT", "pack"),
+            "tracemalloc": args.tracemalloc,
+            "params": {"docs": args.docs, "pasal": args.pasal, "scanned_ratio": args.scanned_ratio,
+                       "seed": args.seed, "queries_per_type": args.queries_per_type,
+                       "batch_size": args.batch_size},
+        },
+        "corpus": {key: corpus[key] for key in ("docs", "pages", "bytes")},
+        "ingestion": ingestion,
+        "queries": queries,
+        "memory": {"peak_rss_mb": _peak_rss_mb()},
+    }
+
+
+def compare_chunking(args) -> Dict:
+    """
+    Ingest korpus sintetis yang sama dengan setiap mode chunking (folder kerja terpisah per mode).
+    Mode ditulis "<chunking_mode>" atau "<chunking_mode>:<chunk_fit>", mis. "tokens:off,tokens:pack".
+    """
+    workdir = args.workdir or tempfile.mkdtemp(prefix="docqa_chunking_")
+    pdf_dir = os.path.join(workdir, "pdf")
+    corpus = generate_corpus(pdf_dir, args.docs, args.pasal, args.scanned_ratio, args.seed)
+    print(f"[BENCH] Korpus: {corpus['docs']} dokumen, {corpus['pages']} halaman di '{workdir}'")
+
+    modes = {}
+    cwd = os.getcwd()
+    for mode in args.modes.split(","):
+        chunking_mode, _, chunk_fit = mode.partition(":")
+        mode_dir = os.path.join(workdir, mode.replace(":", "_"))
+        os.makedirs(mode_dir, exist_ok=True)
+        os.chdir(mode_dir)
+        try:
+            modes[mode] = bench_ingestion(pdf_dir, args.batch_size, False, chunking_mode, chunk_fit or None)
+        finally:
+            os.chdir(cwd)
+
+    print(f"{'mode':>14} {'chunks':>7} {'umum':>6} {'mean kata':>10} {'p95 kata':>9} {'input':>6} {'trunc %':>8} "
+          f"{'index KB':>9} {'chunk s':>8} {'embed s':>8} {'total s':>8}")
+    for mode, result in modes.items():
+        sizes = result["chunk_sizes"]
+        truncation = result["truncation"]
+        print(f"{mode:>14} {result['chunks']:>7} {sizes['by_type'].get('umum', 0):>6} "
+              f"{sizes['umum_tokens'].get('mean', 0):>10} {sizes['umum_tokens'].get('p95', 0):>9} "
+              f"{truncation['encoder_inputs']:>6} {truncation['truncated_token_ratio'] * 100:>8.1f} "
+              f"{sum(result['index_bytes'].values()) / 1024:>9.1f} {result['stages_seconds']['split_into_chunks']:>8.2f} "
+              f"{result['phases']['embedding']['seconds']:>8.2f} {result['total_seconds']:>8.2f}")
+    return {
+        "meta": {"timestamp": datetime.now().isoformat(), "git_commit": _git_commit(),
+                 "embedding_backend": os.getenv("EMBEDDING_BACKEND", "torch"),
+                 "params": {"docs": args.docs, "pasal": args.pasal, "scanned_ratio": args.scanned_ratio,
+                            "seed": args.seed, "batch_size": args.batch_size}},
+        "corpus": {key: corpus[key] for key in ("docs", "pages", "bytes")},
+        "modes": modes,
+    }
+
+
+def _flatten(data, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            flat.update(_flatten(value, f"{prefix}.{key}" if prefix else key))
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        flat[prefix] = data
+    return flat
+
+
+def compare(base_path: str, new_path: str, threshold: float = 0.1) -> bool:
+    """Bandingkan dua hasil benchmark; metrik yang berubah > threshold ditandai"""
+    with open(base_path) as f:
+        base = _flatten({k: v for k, v in json.load(f).items() if k != "meta"})
+    with open(new_path) as f:
+        new = _flatten({k: v for k, v in json.load(f).items() if k != "meta"})
+
+    regressed = False
+    for key in sorted(set(base) & set(new)):
+        if not base[key]:
+            continue
+        change = (new[key] - base[key]) / base[key]
+        # Throughput: naik = lebih baik; selain itu (durasi/latency/memori) turun = lebih baik
+        worse = -change if "per_second" in key else change
+        marker = ""
+        if abs(change) > threshold:
+            marker = " REGRESI" if worse > 0 else " membaik"
+            regressed |= worse > 0
+        print(f"{key:60s} {base[key]:>12.3f} → {new[key]:>12.3f} ({change:+.1%}){marker}")
+    return not regressed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ingest dan query di atas korpus sintetis")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run")
+    run_parser.add_argument("--docs", type=int, default=100)
+    run_parser.add_argument("--pasal", type=int, default=12)
+    run_parser.add_argument("--scanned-ratio", type=float, default=0.1)
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--queries-per-type", type=int, default=50)
+    run_parser.add_argument("--batch-size", type=int, default=64)
+    run_parser.add_argument("--workdir", default=None, help="Default: folder temporary baru")
+    run_parser.add_argument("--tracemalloc", action="store_true",
+                            help="Ukur puncak alokasi Python (memperlambat, bandingkan hanya dengan run yang sama)")
+    run_parser.add_argument("--skip-queries", action="store_true")
+    run_parser.add_argument("--chunking-mode", default=None, help="tokens | semantic (default CHUNKING_MODE)")
+    run_parser.add_argument("--chunk-fit", default=None, help="pack | pool | off (default CHUNK_FIT)")
+    run_parser.add_argument("--output", default="bench_results.json")
+
+    chunking_parser = subparsers.add_parser("chunking", help="Bandingkan mode chunking: jumlah chunk, ukuran index, waktu ingest")
+    chunking_parser.add_argument("--modes", default="tokens:off,tokens:pack,tokens:pool,semantic:pack",
+                                 help="<chunking_mode>[:<chunk_fit>] dipisah koma")
+    chunking_parser.add_argument("--docs", type=int, default=50)
+    chunking_parser.add_argument("--pasal", type=int, default=12)
+    chunking_parser.add_argument("--scanned-ratio", type=float, default=0.0)
+    chunking_parser.add_argument("--seed", type=int, default=42)
+    chunking_parser.add_argument("--batch-size", type=int, default=64)
+    chunking_parser.add_argument("--workdir", default=None, help="Default: folder temporary baru")
+    chunking_parser.add_argument("--output", default="chunking_results.json")
+
+    compare_parser = subparsers.add_parser("compare")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=0.1)
+
+    args = parser.parse_args()
+    if args.command == "run":
+        results = run(args)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"[BENCH] Hasil disimpan ke '{args.output}'")
+    elif args.command == "chunking":
+        results = compare_chunking(args)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"[BENCH] Hasil disimpan ke '{args.output}'")
+    else:
+        sys.exit(0 if compare(args.base, args.new, args.threshold) else 1)
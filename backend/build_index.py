@@ -1,11 +1,12 @@
 import faiss
 import pickle
-import numpy as np
-from sentence_transformers import SentenceTransformer
+from embedding_backend import load_embedding_model
+from keyword_index import InvertedIndex, KEYWORD_INDEX_PATH
+from token_windows import CHUNK_FIT, encode_chunks, truncation_stats
 
 # === Load model embedding ===
 print("Memuat model embedding...")
-model = SentenceTransformer("all-MiniLM-L6-v2")
+model = load_embedding_model()
 
 # === Load chunks dan metadata dari file pickle ===
 print("Membaca data dari 'doc_chunks.pkl'...")
@@ -22,9 +23,9 @@ print(f"Total chunk yang ditemukan: {len(chunks)}")
 print(f"Contoh owner pertama: {metadatas[0].get('owner', 'N/A')}")
 
 # === Buat embedding untuk setiap chunk ===
-print("Membuat embedding untuk setiap chunk...")
-embeddings = model.encode(chunks, show_progress_bar=True)
-embeddings = np.array(embeddings).astype("float32")
+print(f"Membuat embedding untuk setiap chunk (CHUNK_FIT={CHUNK_FIT})...")
+print(f"Token di luar max_seq_length: {truncation_stats(chunks, model)}")
+embeddings = encode_chunks(model, chunks)
 
 # === Buat FAISS index ===
 print("Loading index FAISS...")
@@ -39,8 +40,14 @@ with open("doc_chunks.pkl", "wb") as f:
         "metadatas": metadatas
     }, f)
 
+# === Buat keyword index (inverted index + document frequency) ===
+print("Membuat keyword index...")
+keyword_index = InvertedIndex.build(chunks)
+keyword_index.save(KEYWORD_INDEX_PATH)
+print(f"Keyword index: {keyword_index.stats()}")
+
 print("Index dan metadata berhasil disimpan!")
-print("File: doc_index.faiss + doc_chunks.pkl")
+print(f"File: doc_index.faiss + doc_chunks.pkl + {KEYWORD_INDEX_PATH}")
 
 # === Verifikasi index ===
 index = faiss.read_index("doc_index.faiss")
@@ -0,0 +1,232 @@
+# compaction.py
+"""
+Tombstone chunk dan compaction index/chunks di background.
+
+DELETE /files hanya menandai rentang chunk dokumen sebagai tombstone (di katalog dan di snapshot
+query ask.py), sehingga chunk itu langsung tidak ikut retrieval tanpa menulis ulang index.
+Compactor membuang vektor dan teks chunk secara fisik setelah tombstone melewati ambang:
+
+- Index/chunks baru dibangun dari salinan; query tetap memakai snapshot lama sampai snapshot baru
+  dipasang. Yang ditahan hanya worker ingest (lock index), bukan query.
+- Write-ahead marker di katalog (compaction_pending): compaction yang terputus diselesaikan
+  (roll-forward) saat start, sebelum ask.py memuat index.
+- Rentang chunk di ingest_manifest.json ikut digeser di dalam marker yang sama (tepat sekali per
+  id compaction), agar run ingest.py berikutnya tidak memakai rentang lama.
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from ingest import _atomic_pickle, _atomic_write_index, CHUNKS_PATH, INDEX_PATH, IngestManifest, MANIFEST_PATH
+from keyword_index import InvertedIndex, KEYWORD_INDEX_PATH
+from metrics import INGEST_STAGE_SECONDS, stage_timer
+
+logger = logging.getLogger(__name__)
+
+COMPACT_MIN_TOMBSTONES = int(os.getenv("COMPACT_MIN_TOMBSTONES", "50"))
+COMPACT_TOMBSTONE_RATIO = float(os.getenv("COMPACT_TOMBSTONE_RATIO", "0.1"))
+COMPACT_CHECK_SECONDS = float(os.getenv("COMPACT_CHECK_SECONDS", "60"))
+
+
+def merge_ranges(ranges: Iterable[Tuple[int, int]], limit: Optional[int] = None) -> List[Tuple[int, int]]:
+    """Rentang [start, end) terurut tanpa tumpang tindih, dipotong ke [0, limit)"""
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if limit is not None:
+            end = min(end, limit)
+        if start >= end:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def shift_ids(ids: Iterable[int], ranges: List[Tuple[int, int]]) -> frozenset:
+    """Id setelah rentang (hasil merge_ranges) dibuang: id di dalam rentang hilang, sisanya bergeser"""
+    starts = [start for start, _ in ranges]
+    removed_before = [0]
+    for start, end in ranges:
+        removed_before.append(removed_before[-1] + end - start)
+    shifted = set()
+    for i in ids:
+        pos = bisect.bisect_right(starts, i)
+        if pos and i < ranges[pos - 1][1]:
+            continue
+        shifted.add(i - removed_before[pos])
+    return frozenset(shifted)
+
+
+def compact_index(index, ranges: List[Tuple[int, int]]):
+    """
+    Index baru tanpa vektor di rentang; index asli tidak disentuh (masih dipakai query).
+    Dibangun dari reconstruct_n, bukan clone_index + remove_ids, karena index yang dibaca
+    dengan mmap (FAISS_MMAP) tidak bisa di-clone/diubah.
+    """
+    vectors = index.reconstruct_n(0, index.ntotal) if index.ntotal else None
+    compacted = faiss.IndexFlat(index.d, index.metric_type)
+    kept, previous = [], 0
+    for start, end in ranges:
+        kept.append(vectors[previous:start])
+        previous = end
+    if vectors is not None:
+        kept.append(vectors[previous:])
+        compacted.add(np.ascontiguousarray(np.concatenate(kept), dtype=np.float32))
+    return compacted
+
+
+def compact_list(items: List, ranges: List[Tuple[int, int]]) -> List:
+    kept, previous = [], 0
+    for start, end in ranges:
+        kept.extend(items[previous:start])
+        previous = end
+    kept.extend(items[previous:])
+    return kept
+
+
+def compact_manifest(ranges: List[Tuple[int, int]], compaction_id: str, path: str = MANIFEST_PATH) -> bool:
+    """Terapkan compaction ke ingest_manifest.json (jika ada); aman dipanggil ulang saat recovery"""
+    manifest = IngestManifest.load(path)
+    if not manifest.apply_compaction(ranges, compaction_id):
+        return False
+    manifest.save()
+    return True
+
+
+class Compactor:
+    """
+    Thread compaction untuk BackgroundTaskManager: memakai index/chunks/metadata, lock index,
+    katalog dan compaction_listeners milik manager.
+    """
+
+    def __init__(self, manager, min_tombstones: int = COMPACT_MIN_TOMBSTONES,
+                 ratio: float = COMPACT_TOMBSTONE_RATIO, check_seconds: float = COMPACT_CHECK_SECONDS):
+        self.manager = manager
+        self.min_tombstones = min_tombstones
+        self.ratio = ratio
+        self.check_seconds = check_seconds
+        self.last_result: Dict = {}
+        self._run_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def should_compact(self) -> bool:
+        tombstoned = self.manager.catalog.stats()["tombstoned_chunks"]
+        total = max(len(self.manager.chunks), 1)
+        return tombstoned > 0 and tombstoned >= max(self.min_tombstones, self.ratio * total)
+
+    def request(self):
+        """Bangunkan thread compactor (dipanggil setelah tombstone baru)"""
+        self._wakeup.set()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="compactor", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.check_seconds)
+            self._wakeup.clear()
+            if self._stop.is_set():
+                break
+            try:
+                # Permintaan POST /files/compact dari worker lain lewat katalog
+                forced = self.manager.catalog.take_compaction_request()
+                if forced or self.should_compact():
+                    self.compact(forced)
+            except Exception as e:
+                logger.error(f"Compaction failed: {e}")
+
+    def _rewrite(self, ranges: List[Tuple[int, int]]):
+        """Tulis ulang index, chunks dan keyword index tanpa rentang (manager._index_lock dipegang)"""
+        manager = self.manager
+        index = compact_index(manager.index, ranges)
+        chunks = compact_list(manager.chunks, ranges)
+        metadatas = compact_list(manager.metadatas, ranges)
+        keyword_index = InvertedIndex.build(chunks)
+        _atomic_pickle({"chunks": chunks, "metadatas": metadatas}, CHUNKS_PATH)
+        _atomic_write_index(index, INDEX_PATH)
+        keyword_index.save(KEYWORD_INDEX_PATH)
+        manager.index, manager.chunks, manager.metadatas = index, chunks, metadatas
+        manager.keyword_index = keyword_index
+
+    def compact(self, force: bool = False) -> Dict:
+        """
+        Buang chunk bertombstone dari index/chunks secara fisik.
+
+        Args:
+            force: Abaikan ambang COMPACT_MIN_TOMBSTONES / COMPACT_TOMBSTONE_RATIO
+        """
+        with self._run_lock:
+            if not force and not self.should_compact():
+                return {"compacted": False, "reason": "below threshold"}
+            manager = self.manager
+            started = time.perf_counter()
+            with manager._index_lock:
+                ranges = merge_ranges(manager.catalog.tombstone_ranges(), limit=len(manager.chunks))
+                if not ranges:
+                    return {"compacted": False, "reason": "no tombstones"}
+                before = len(manager.chunks)
+                compaction_id = manager.catalog.begin_compaction(ranges, before)
+                try:
+                    with stage_timer("compaction", INGEST_STAGE_SECONDS):
+                        self._rewrite(ranges)
+                except Exception:
+                    # File bisa sudah setengah ditulis; state in-memory belum diganti → tulis kembali
+                    _atomic_pickle({"chunks": manager.chunks, "metadatas": manager.metadatas}, CHUNKS_PATH)
+                    _atomic_write_index(manager.index, INDEX_PATH)
+                    manager.catalog.abort_compaction()
+                    raise
+                compact_manifest(ranges, compaction_id)
+                manager.catalog.commit_compaction(ranges)
+                for listener in manager.compaction_listeners:
+                    listener(ranges)
+
+            self.last_result = {
+                "compacted": True,
+                "removed_chunks": before - len(manager.chunks),
+                "total_chunks": len(manager.chunks),
+                "seconds": round(time.perf_counter() - started, 3),
+            }
+            logger.info(f"Compaction: {self.last_result}")
+            return self.last_result
+
+    def recover(self) -> bool:
+        """Selesaikan compaction yang terputus (dipanggil saat start, sebelum query dilayani)"""
+        pending = self.manager.catalog.pending_compaction()
+        if pending is None:
+            return False
+        manager = self.manager
+        ranges = [tuple(r) for r in pending["ranges"]]
+        before = pending["chunk_count_before"]
+        removed = sum(end - start for start, end in ranges)
+        if manager.index.ntotal == before:
+            manager.index = compact_index(manager.index, ranges)
+            _atomic_write_index(manager.index, INDEX_PATH)
+        if len(manager.chunks) == before:
+            manager.chunks = compact_list(manager.chunks, ranges)
+            manager.metadatas = compact_list(manager.metadatas, ranges)
+            _atomic_pickle({"chunks": manager.chunks, "metadatas": manager.metadatas}, CHUNKS_PATH)
+        if manager.index.ntotal != before - removed or len(manager.chunks) != before - removed:
+            raise RuntimeError("Compaction yang terputus tidak bisa diselesaikan: index/chunks tidak sejajar")
+        manager.keyword_index = InvertedIndex.build(manager.chunks)
+        manager.keyword_index.save(KEYWORD_INDEX_PATH)
+        # Marker lama (sebelum ada id) belum pernah menyentuh manifest
+        compact_manifest(ranges, pending.get("id", "legacy"))
+        manager.catalog.commit_compaction(ranges)
+        logger.info(f"Recovery: interrupted compaction of {removed} chunks completed")
+        return True
@@ -0,0 +1,148 @@
+# context_assembler.py
+import os
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+CONTEXT_SEPARATOR = "\n---\n"
+
+# Span kalimat: teks sampai tanda baca akhir (., !, ?, ;) berikut whitespace sesudahnya
+SPAN_PATTERN = re.compile(r"[^.!?;]+(?:[.!?;]+|$)\s*")
+WORD_PATTERN = re.compile(r"\w+")
+
+TokenCounter = Callable[[str], int]
+
+
+def get_token_counter(hf_tokenizer=None) -> TokenCounter:
+    """
+    Token counter dari tokenizer sungguhan: tiktoken (cl100k_base) jika terpasang,
+    kalau tidak tokenizer HuggingFace yang diberikan (misalnya tokenizer model embedding).
+    Fallback terakhir: jumlah kata.
+    """
+    try:
+        import tiktoken
+
+        encoding = tiktoken.get_encoding("cl100k_base")
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    except Exception:
+        pass
+
+    if hf_tokenizer is not None:
+        return lambda text: len(hf_tokenizer.encode(text, add_special_tokens=False, verbose=False))
+
+    return lambda text: len(text.split())
+
+
+class ContextAssembler:
+    """
+    Menyusun konteks prompt dari chunk terpilih:
+    1. Buang span kalimat yang sudah muncul di chunk lain (shingle hashing)
+    2. Urutkan chunk berdasarkan skor
+    3. Masukkan ke dalam budget token (dihitung dengan tokenizer sungguhan)
+    """
+
+    def __init__(self, token_counter: TokenCounter, token_budget: int = 3000,
+                 shingle_size: int = 4, duplicate_threshold: float = 0.8):
+        self.count_tokens = token_counter
+        self.token_budget = token_budget
+        self.shingle_size = shingle_size
+        self.duplicate_threshold = duplicate_threshold
+
+    def _shingles(self, span: str) -> set:
+        words = WORD_PATTERN.findall(span.lower())
+        if len(words) < self.shingle_size:
+            return {hash(tuple(words))} if words else set()
+        return {hash(tuple(words[i:i + self.shingle_size]))
+                for i in range(len(words) - self.shingle_size + 1)}
+
+    def deduplicate(self, texts: List[str]) -> Tuple[List[List[str]], int]:
+        """
+        Returns:
+            (span yang dipertahankan per chunk, jumlah span duplikat yang dibuang)
+        """
+        seen = set()
+        kept_spans = []
+        dropped = 0
+        for text in texts:
+            spans = []
+            for span in SPAN_PATTERN.findall(text):
+                shingles = self._shingles(span)
+                if not shingles:
+                    continue
+                overlap = len(shingles & seen) / len(shingles)
+                if overlap >= self.duplicate_threshold:
+                    dropped += 1
+                    continue
+                seen |= shingles
+                spans.append(span)
+            kept_spans.append(spans)
+        return kept_spans, dropped
+
+    def assemble(self, texts: List[str], scores: Optional[List[float]] = None) -> Tuple[str, Dict]:
+        """
+        Args:
+            texts: Teks chunk terpilih
+            scores: Skor relevansi per chunk (default: urutan input)
+
+        Returns:
+            (context string, report) dimana report berisi jumlah token sebelum/sesudah dan yang dihemat
+        """
+        if scores is None:
+            scores = [-i for i in range(len(texts))]
+
+        # Chunk berskor tinggi diproses lebih dulu sehingga versinya yang dipertahankan
+        order = sorted(range(len(texts)), key=lambda i: scores[i], reverse=True)
+        ordered_texts = [texts[i] for i in order]
+        kept_spans, dropped_spans = self.deduplicate(ordered_texts)
+
+        parts = []
+        used_tokens = 0
+        truncated = False
+        for spans in kept_spans:
+            if not spans:
+                continue
+            remaining = self.token_budget - used_tokens
+            if remaining <= 0:
+                truncated = True
+                break
+
+            part = "".join(spans).strip()
+            part_tokens = self.count_tokens(part)
+            if part_tokens > remaining:
+                # Ambil span sebanyak yang muat dalam sisa budget
+                truncated = True
+                partial = []
+                partial_tokens = 0
+                for span in spans:
+                    span_tokens = self.count_tokens(span)
+                    if partial_tokens + span_tokens > remaining:
+                        break
+                    partial.append(span)
+                    partial_tokens += span_tokens
+                part = "".join(partial).strip()
+                part_tokens = self.count_tokens(part) if part else 0
+            if part:
+                parts.append(part)
+                used_tokens += part_tokens
+
+        context = CONTEXT_SEPARATOR.join(parts)
+        tokens_before = self.count_tokens(CONTEXT_SEPARATOR.join(texts))
+        tokens_after = self.count_tokens(context)
+        report = {
+            "chunks_in": len(texts),
+            "chunks_out": len(parts),
+            "duplicate_spans_removed": dropped_spans,
+            "tokens_before": tokens_before,
+            "tokens_after": tokens_after,
+            "tokens_saved": tokens_before - tokens_after,
+            "token_budget": self.token_budget,
+            "truncated": truncated
+        }
+        return context, report
+
+
+def create_context_assembler(hf_tokenizer=None) -> ContextAssembler:
+    """ContextAssembler dengan budget dari CONTEXT_TOKEN_BUDGET (default 3000 token)"""
+    return ContextAssembler(
+        token_counter=get_token_counter(hf_tokenizer),
+        token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+    )
@@ -0,0 +1,513 @@
+# doc_catalog.py
+"""
+Katalog dokumen persisten di SQLite (WAL): satu baris per dokumen dengan id, nama asli, owner,
+sha256, ukuran, jumlah halaman, rentang chunk id [chunk_start, chunk_end) dan waktu upload/ingest.
+
+- /files dilayani dari katalog (paginasi + filter lewat index SQLite), bukan glob + stat folder
+- Statistik (jumlah dokumen, chunk, byte, halaman) dijaga trigger di catalog_stats pada transaksi
+  yang sama dengan perubahan dokumen, sehingga stats() selalu O(1) dan konsisten
+- Penghapusan rentang chunk menggeser rentang dokumen sesudahnya dalam satu transaksi
+  (mengikuti penghapusan di FAISS/doc_chunks.pkl)
+- Dokumen yang dihapus lewat API meninggalkan tombstone rentang chunk sampai compaction
+  (compaction.py) membuangnya secara fisik
+- corpus_version naik setiap kali chunk id bergeser, agar worker lain (serve.py) tahu kapan
+  index/chunks harus dimuat ulang; index_version naik setiap kali chunk baru ditambahkan
+"""
+import json
+import hashlib
+import os
+import sqlite3
+import threading
+import uuid
+import weakref
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+CATALOG_DB_PATH = os.getenv("CATALOG_DB_PATH", "doc_catalog.db")
+COMPACTION_PENDING_KEY = "compaction_pending"
+CORPUS_VERSION_KEY = "corpus_version"
+INDEX_VERSION_KEY = "index_version"
+COMPACTION_REQUESTED_KEY = "compaction_requested"
+
+
+class DocStatus:
+    UPLOADED = "uploaded"
+    INDEXED = "indexed"
+
+
+SORT_COLUMNS = {"uploaded_at", "indexed_at", "original_name", "owner", "size", "pages"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    stored_name TEXT NOT NULL,
+    original_name TEXT NOT NULL COLLATE NOCASE,
+    owner TEXT COLLATE NOCASE,
+    sha256 TEXT,
+    size INTEGER NOT NULL DEFAULT 0,
+    pages INTEGER,
+    chunk_start INTEGER,
+    chunk_end INTEGER,
+    status TEXT NOT NULL,
+    uploaded_at TEXT NOT NULL,
+    indexed_at TEXT,
+    updated_at TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS documents_stored ON documents (source, stored_name);
+CREATE INDEX IF NOT EXISTS documents_uploaded ON documents (uploaded_at);
+CREATE INDEX IF NOT EXISTS documents_owner ON documents (owner, uploaded_at);
+CREATE INDEX IF NOT EXISTS documents_chunks ON documents (chunk_start);
+CREATE INDEX IF NOT EXISTS documents_sha ON documents (sha256);
+
+CREATE TABLE IF NOT EXISTS catalog_stats (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO catalog_stats (key) VALUES
+    ('documents'), ('indexed_documents'), ('chunks'), ('bytes'), ('pages'), ('tombstoned_chunks');
+CREATE TABLE IF NOT EXISTS catalog_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TABLE IF NOT EXISTS tombstones (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    doc_id TEXT NOT NULL,
+    owner TEXT,
+    chunk_start INTEGER NOT NULL,
+    chunk_end INTEGER NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tombstones_chunks ON tombstones (chunk_start);
+
+CREATE TRIGGER IF NOT EXISTS tombstones_stats_insert AFTER INSERT ON tombstones BEGIN
+    UPDATE catalog_stats SET value = value + NEW.chunk_end - NEW.chunk_start WHERE key = 'tombstoned_chunks';
+END;
+CREATE TRIGGER IF NOT EXISTS tombstones_stats_delete AFTER DELETE ON tombstones BEGIN
+    UPDATE catalog_stats SET value = value - (OLD.chunk_end - OLD.chunk_start) WHERE key = 'tombstoned_chunks';
+END;
+CREATE TRIGGER IF NOT EXISTS documents_stats_insert AFTER INSERT ON documents BEGIN
+    UPDATE catalog_stats SET value = value + CASE key
+        WHEN 'documents' THEN 1
+        WHEN 'indexed_documents' THEN NEW.status = 'indexed'
+        WHEN 'chunks' THEN COALESCE(NEW.chunk_end - NEW.chunk_start, 0)
+        WHEN 'bytes' THEN NEW.size
+        WHEN 'pages' THEN COALESCE(NEW.pages, 0) ELSE 0 END;
+END;
+CREATE TRIGGER IF NOT EXISTS documents_stats_delete AFTER DELETE ON documents BEGIN
+    UPDATE catalog_stats SET value = value - CASE key
+        WHEN 'documents' THEN 1
+        WHEN 'indexed_documents' THEN OLD.status = 'indexed'
+        WHEN 'chunks' THEN COALESCE(OLD.chunk_end - OLD.chunk_start, 0)
+        WHEN 'bytes' THEN OLD.size
+        WHEN 'pages' THEN COALESCE(OLD.pages, 0) ELSE 0 END;
+END;
+CREATE TRIGGER IF NOT EXISTS documents_stats_update AFTER UPDATE ON documents BEGIN
+    UPDATE catalog_stats SET value = value + CASE key
+        WHEN 'documents' THEN 0
+        WHEN 'indexed_documents' THEN (NEW.status = 'indexed') - (OLD.status = 'indexed')
+        WHEN 'chunks' THEN COALESCE(NEW.chunk_end - NEW.chunk_start, 0)
+                         - COALESCE(OLD.chunk_end - OLD.chunk_start, 0)
+        WHEN 'bytes' THEN NEW.size - OLD.size
+        WHEN 'pages' THEN COALESCE(NEW.pages, 0) - COALESCE(OLD.pages, 0) ELSE 0 END;
+END;
+"""
+
+
+def _now_iso() -> str:
+    return datetime.now().isoformat()
+
+
+def pdf_page_count(path: str) -> Optional[int]:
+    """Jumlah halaman dari xref PDF (tanpa ekstraksi teks); None jika PDF tidak terbaca"""
+    import fitz  # PyMuPDF
+
+    try:
+        with fitz.open(path) as doc:
+            return doc.page_count
+    except Exception:
+        return None
+
+
+class HashingReader:
+    """Bungkus file-like: sha256 dan jumlah byte dihitung sambil disalin (tanpa baca ulang file)"""
+
+    def __init__(self, source):
+        self.source = source
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        block = self.source.read(size)
+        self.digest.update(block)
+        self.size += len(block)
+        return block
+
+    def hexdigest(self) -> str:
+        return self.digest.hexdigest()
+
+
+def hash_file(path: str, block_size: int = 1 << 20) -> Tuple[int, str]:
+    """
+    Returns:
+        (ukuran byte, sha256 hex)
+    """
+    with open(path, "rb") as f:
+        reader = HashingReader(f)
+        while reader.read(block_size):
+            pass
+    return reader.size, reader.hexdigest()
+
+
+# Koneksi sqlite tidak boleh dipakai lintas fork (serve.py): proses anak membuka koneksi sendiri
+_catalogs = weakref.WeakSet()
+
+
+def _forget_connections_after_fork():
+    for catalog in list(_catalogs):
+        catalog._local = threading.local()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_connections_after_fork)
+
+
+class DocumentCatalog:
+    def __init__(self, path: str = CATALOG_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._connect().executescript(SCHEMA)
+        _catalogs.add(self)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Satu koneksi per thread (sqlite3 tidak aman dibagi antar thread)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        if conn.in_transaction:
+            # Dipanggil dari dalam transaksi lain (mis. callback): ikut transaksi luar
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _row_to_dict(row: sqlite3.Row) -> Dict:
+        doc = dict(row)
+        if doc["chunk_start"] is not None and doc["chunk_end"] is not None:
+            doc["chunks"] = doc["chunk_end"] - doc["chunk_start"]
+        else:
+            doc["chunks"] = 0
+        return doc
+
+    # === Tulis ===
+    def register(self, doc_id: str, stored_name: str, original_name: str, size: int,
+                 sha256: Optional[str] = None, pages: Optional[int] = None, owner: Optional[str] = None,
+                 source: str = "upload", uploaded_at: Optional[str] = None) -> Dict:
+        """Catat dokumen yang baru disimpan (status uploaded). Upload ulang id yang sama menimpa baris lama."""
+        now = _now_iso()
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM documents WHERE id = ? OR (source = ? AND stored_name = ?)",
+                         (doc_id, source, stored_name))
+            conn.execute(
+                "INSERT INTO documents (id, source, stored_name, original_name, owner, sha256, size, pages, "
+                "status, uploaded_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (doc_id, source, stored_name, original_name, owner, sha256, size, pages,
+                 DocStatus.UPLOADED, uploaded_at or now, now))
+            row = conn.execute("SELECT * FROM documents WHERE id = ?", (doc_id,)).fetchone()
+        return self._row_to_dict(row)
+
+    def mark_indexed(self, doc_id: str, owner: str, chunk_start: int, chunk_end: int,
+                     pages: Optional[int] = None) -> bool:
+        """
+        Catat rentang chunk hasil ingest. Panggil setelah index/chunks tersimpan ke disk.
+
+        Returns:
+            False jika dokumen tidak ada di katalog (sudah dihapus)
+        """
+        now = _now_iso()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE documents SET owner = ?, chunk_start = ?, chunk_end = ?, pages = COALESCE(?, pages), "
+                "status = ?, indexed_at = ?, updated_at = ? WHERE id = ?",
+                (owner, chunk_start, chunk_end, pages, DocStatus.INDEXED, now, now, doc_id))
+        return cursor.rowcount == 1
+
+    def upsert_indexed(self, doc_id: str, stored_name: str, original_name: str, owner: str,
+                       chunk_start: int, chunk_end: int, size: int, sha256: Optional[str] = None,
+                       pages: Optional[int] = None, source: str = "upload",
+                       uploaded_at: Optional[str] = None, indexed_at: Optional[str] = None):
+        """Catat dokumen yang langsung di-index (bulk ingest / adopsi) dalam satu transaksi"""
+        with self._transaction():
+            self.register(doc_id, stored_name, original_name, size, sha256, pages, owner, source, uploaded_at)
+            self.mark_indexed(doc_id, owner, chunk_start, chunk_end)
+            if indexed_at:
+                self._connect().execute("UPDATE documents SET indexed_at = ? WHERE id = ?", (indexed_at, doc_id))
+
+    def remove(self, doc_id: str, before_commit: Optional[Callable[[Dict], None]] = None,
+               tombstone: bool = False) -> Optional[Dict]:
+        """
+        Hapus dokumen dari katalog. before_commit(doc) dijalankan di dalam transaksi (mis. unlink file);
+        jika melempar exception, penghapusan di katalog dibatalkan.
+
+        Args:
+            tombstone: Catat rentang chunk dokumen sebagai tombstone (chunk masih ada di index)
+
+        Returns:
+            Baris yang dihapus, atau None jika tidak ada
+        """
+        with self._transaction() as conn:
+            row = conn.execute("SELECT * FROM documents WHERE id = ?", (doc_id,)).fetchone()
+            if row is None:
+                return None
+            doc = self._row_to_dict(row)
+            conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+            if tombstone and doc["chunks"]:
+                self.add_tombstone(doc_id, doc["owner"], doc["chunk_start"], doc["chunk_end"])
+            if before_commit is not None:
+                before_commit(doc)
+        return doc
+
+    def add_tombstone(self, doc_id: str, owner: Optional[str], chunk_start: int, chunk_end: int):
+        with self._transaction() as conn:
+            conn.execute("INSERT INTO tombstones (doc_id, owner, chunk_start, chunk_end, created_at) "
+                         "VALUES (?, ?, ?, ?, ?)", (doc_id, owner, chunk_start, chunk_end, _now_iso()))
+
+    def tombstone_ranges(self) -> List[Tuple[int, int]]:
+        rows = self._connect().execute("SELECT chunk_start, chunk_end FROM tombstones ORDER BY chunk_start")
+        return [(row["chunk_start"], row["chunk_end"]) for row in rows]
+
+    def remove_chunk_ranges(self, ranges: Iterable[Tuple[int, int]]):
+        """
+        Geser rentang chunk dokumen (dan tombstone) setelah rentang [start, end) dihapus dari
+        index/chunks. Dokumen yang rentangnya ikut terhapus kembali ke status uploaded tanpa rentang;
+        tombstone di dalam rentang dibuang.
+        """
+        ranges = sorted(ranges, reverse=True)
+        if not ranges:
+            return
+        now = _now_iso()
+        with self._transaction() as conn:
+            # Dari rentang terbesar ke terkecil agar offset rentang berikutnya tetap valid
+            for start, end in ranges:
+                conn.execute(
+                    "UPDATE documents SET chunk_start = NULL, chunk_end = NULL, status = ?, updated_at = ? "
+                    "WHERE chunk_start >= ? AND chunk_end <= ?", (DocStatus.UPLOADED, now, start, end))
+                conn.execute(
+                    "UPDATE documents SET chunk_start = chunk_start - ?, chunk_end = chunk_end - ?, "
+                    "updated_at = ? WHERE chunk_start >= ?", (end - start, end - start, now, end))
+                conn.execute("DELETE FROM tombstones WHERE chunk_start >= ? AND chunk_end <= ?", (start, end))
+                conn.execute("UPDATE tombstones SET chunk_start = chunk_start - ?, chunk_end = chunk_end - ? "
+                             "WHERE chunk_start >= ?", (end - start, end - start, end))
+            conn.execute("INSERT INTO catalog_meta (key, value) VALUES (?, '1') ON CONFLICT(key) "
+                         "DO UPDATE SET value = CAST(value AS INTEGER) + 1", (CORPUS_VERSION_KEY,))
+
+    # === Compaction (write-ahead marker) ===
+    def begin_compaction(self, ranges: List[Tuple[int, int]], chunk_count_before: int) -> str:
+        """
+        Dicatat sebelum file index/chunks ditulis ulang, agar restart bisa menyelesaikannya
+
+        Returns:
+            Id compaction (dipakai ingest_manifest.json untuk menerapkan pergeseran tepat sekali)
+        """
+        compaction_id = uuid.uuid4().hex
+        self.set_meta(COMPACTION_PENDING_KEY, json.dumps({"id": compaction_id, "ranges": ranges,
+                                                          "chunk_count_before": chunk_count_before}))
+        return compaction_id
+
+    def pending_compaction(self) -> Optional[Dict]:
+        value = self.get_meta(COMPACTION_PENDING_KEY)
+        return json.loads(value) if value else None
+
+    def abort_compaction(self):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM catalog_meta WHERE key = ?", (COMPACTION_PENDING_KEY,))
+
+    def request_compaction(self):
+        """Minta compaction paksa dari proses yang tidak menjalankan compactor (serve.py)"""
+        self.set_meta(COMPACTION_REQUESTED_KEY, _now_iso())
+
+    def take_compaction_request(self) -> bool:
+        with self._transaction() as conn:
+            return conn.execute("DELETE FROM catalog_meta WHERE key = ?", (COMPACTION_REQUESTED_KEY,)).rowcount > 0
+
+    def commit_compaction(self, ranges: List[Tuple[int, int]]):
+        """Rentang sudah dibuang dari file: geser rentang, buang tombstone dan marker dalam satu transaksi"""
+        with self._transaction() as conn:
+            self.remove_chunk_ranges(ranges)
+            conn.execute("DELETE FROM catalog_meta WHERE key = ?", (COMPACTION_PENDING_KEY,))
+
+    def sync_indexed(self, source: str, entries: Dict[str, Dict],
+                     page_counter: Optional[Callable[[str], Optional[int]]] = None) -> int:
+        """
+        Samakan baris katalog satu source dengan daftar otoritatif (mis. ingest_manifest.json).
+        Idempotent: baris yang tidak ada di entries dihapus, yang berubah ditulis ulang.
+
+        Args:
+            entries: stored_name -> {owner, sha256, size, chunk_start, chunk_end, ingested_at}
+            page_counter: Dipanggil hanya untuk baris baru/berubah
+
+        Returns:
+            Jumlah baris yang ditulis atau dihapus
+        """
+        changed = 0
+        with self._transaction() as conn:
+            existing = {row["stored_name"]: row for row in
+                        conn.execute("SELECT * FROM documents WHERE source = ?", (source,))}
+            for name in set(existing) - set(entries):
+                conn.execute("DELETE FROM documents WHERE id = ?", (existing[name]["id"],))
+                changed += 1
+            for name, entry in entries.items():
+                row = existing.get(name)
+                if (row is not None and row["status"] == DocStatus.INDEXED and row["sha256"] == entry["sha256"]
+                        and row["chunk_start"] == entry["chunk_start"] and row["chunk_end"] == entry["chunk_end"]):
+                    continue
+                pages = page_counter(name) if page_counter else None
+                self.upsert_indexed(f"{source}:{name}", name, name, entry["owner"], entry["chunk_start"],
+                                    entry["chunk_end"], entry["size"], entry["sha256"], pages, source,
+                                    uploaded_at=entry.get("ingested_at"), indexed_at=entry.get("ingested_at"))
+                changed += 1
+        return changed
+
+    def max_chunk_end(self, exclude_source: Optional[str] = None) -> int:
+        """Akhir rentang chunk terbesar yang tercatat (dokumen dan tombstone), opsional tanpa satu source"""
+        conn = self._connect()
+        if exclude_source:
+            row = conn.execute("SELECT MAX(chunk_end) FROM documents WHERE source != ?", (exclude_source,)).fetchone()
+        else:
+            row = conn.execute("SELECT MAX(chunk_end) FROM documents").fetchone()
+        tombstones = conn.execute("SELECT MAX(chunk_end) FROM tombstones").fetchone()
+        return max(row[0] or 0, tombstones[0] or 0)
+
+    def set_meta(self, key: str, value: str):
+        with self._transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO catalog_meta (key, value) VALUES (?, ?)", (key, value))
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self._connect().execute("SELECT value FROM catalog_meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def corpus_version(self) -> int:
+        """Naik setiap kali rentang chunk dibuang dari index/chunks (compaction atau prune ingest.py)"""
+        return int(self.get_meta(CORPUS_VERSION_KEY) or 0)
+
+    def bump_index_version(self):
+        """Dipanggil setelah chunk baru tersimpan ke index/chunks (upload worker, ingest.py)"""
+        with self._transaction() as conn:
+            conn.execute("INSERT INTO catalog_meta (key, value) VALUES (?, '1') ON CONFLICT(key) "
+                         "DO UPDATE SET value = CAST(value AS INTEGER) + 1", (INDEX_VERSION_KEY,))
+
+    def index_version(self) -> int:
+        """Naik setiap kali chunk ditambahkan di akhir index/chunks (chunk id lama tidak bergeser)"""
+        return int(self.get_meta(INDEX_VERSION_KEY) or 0)
+
+    # === Baca ===
+    def get(self, doc_id: str) -> Optional[Dict]:
+        row = self._connect().execute("SELECT * FROM documents WHERE id = ?", (doc_id,)).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def find(self, name: str, source: Optional[str] = None) -> Optional[Dict]:
+        """
+        Cari dokumen berdasarkan nama simpanan, id, lalu nama asli (hanya jika unik).
+        """
+        conn = self._connect()
+        source_clause, params = ("AND source = ?", (source,)) if source else ("", ())
+        row = conn.execute(f"SELECT * FROM documents WHERE stored_name = ? {source_clause} LIMIT 1",
+                           (name, *params)).fetchone()
+        if row is None:
+            row = conn.execute(f"SELECT * FROM documents WHERE id = ? {source_clause}", (name, *params)).fetchone()
+        if row is None:
+            rows = conn.execute(f"SELECT * FROM documents WHERE original_name = ? {source_clause} LIMIT 2",
+                                (name, *params)).fetchall()
+            row = rows[0] if len(rows) == 1 else None
+        return self._row_to_dict(row) if row else None
+
+    def list(self, limit: int = 50, offset: int = 0, owner: Optional[str] = None,
+             query: Optional[str] = None, status: Optional[str] = None, source: Optional[str] = None,
+             sort: str = "uploaded_at", descending: bool = True) -> Tuple[List[Dict], int]:
+        """
+        Satu halaman dokumen (filter owner persis, query = potongan nama asli, status, source).
+
+        Returns:
+            (dokumen di halaman ini, total dokumen yang cocok dengan filter)
+        """
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"sort harus salah satu dari {sorted(SORT_COLUMNS)}")
+        clauses, params = [], []
+        if owner:
+            clauses.append("owner = ?")
+            params.append(owner)
+        if query:
+            clauses.append("original_name LIKE ? ESCAPE '\\'")
+            escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            params.append(f"%{escaped}%")
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if source:
+            clauses.append("source = ?")
+            params.append(source)
+
+        conn = self._connect()
+        if clauses:
+            where = "WHERE " + " AND ".join(clauses)
+            total = conn.execute(f"SELECT COUNT(*) FROM documents {where}", params).fetchone()[0]
+        else:
+            where = ""
+            total = self.stats()["documents"]
+        order = "DESC" if descending else "ASC"
+        rows = conn.execute(f"SELECT * FROM documents {where} ORDER BY {sort} {order}, id {order} "
+                            f"LIMIT ? OFFSET ?", (*params, limit, offset)).fetchall()
+        return [self._row_to_dict(row) for row in rows], total
+
+    def stats(self) -> Dict[str, int]:
+        """Counter yang dijaga trigger: O(1), tidak memuat index maupun chunk"""
+        rows = self._connect().execute("SELECT key, value FROM catalog_stats").fetchall()
+        return {row["key"]: row["value"] for row in rows}
+
+    # === Adopsi data lama ===
+    def adopt_upload_dir(self, upload_dir: str) -> int:
+        """
+        Sekali saja (katalog baru): catat PDF yang sudah ada di folder upload sebelum katalog dipakai.
+        Nama "<uuid>_<nama asli>" dipecah menjadi id dan nama asli.
+
+        Returns:
+            Jumlah file yang dicatat
+        """
+        if self.get_meta("adopted_upload_dir") or not os.path.isdir(upload_dir):
+            return 0
+        adopted = 0
+        with self._transaction():
+            for name in sorted(os.listdir(upload_dir)):
+                path = os.path.join(upload_dir, name)
+                if not name.lower().endswith(".pdf") or not os.path.isfile(path):
+                    continue
+                doc_id, sep, original_name = name.partition("_")
+                if not sep or len(doc_id) != 36:
+                    doc_id, original_name = name, name
+                if self.get(doc_id) is not None:
+                    continue
+                size, sha256 = hash_file(path)
+                uploaded_at = datetime.fromtimestamp(os.path.getmtime(path)).isoformat()
+                self.register(doc_id, name, original_name, size, sha256, pdf_page_count(path),
+                              uploaded_at=uploaded_at)
+                adopted += 1
+            self.set_meta("adopted_upload_dir", _now_iso())
+        return adopted
@@ -1,9 +1,9 @@
 # embedder.py
-from sentence_transformers import SentenceTransformer
+from embedding_backend import load_embedding_model
 import faiss
 import numpy as np
 
-model = SentenceTransformer("all-MiniLM-L6-v2")
+model = load_embedding_model()
 
 def embed_chunks(chunks):
     print(f"[EMBEDDER] Jumlah chunks untuk di-embed: {len(chunks)}")
@@ -0,0 +1,223 @@
+# embedding_backend.py
+"""
+Backend embedding yang bisa dipilih lewat EMBEDDING_BACKEND:
+
+    torch      SentenceTransformer("all-MiniLM-L6-v2") (default)
+    onnx       Model yang sama, diekspor ke ONNX dan dijalankan dengan ONNX Runtime
+    onnx-int8  Versi ONNX yang di-quantize dinamis ke int8
+
+Model ONNX dan tokenizer dimuat dari folder lokal (EMBEDDING_ONNX_DIR), tanpa akses network.
+
+    python embedding_backend.py export              # ekspor + quantize (sekali, butuh torch)
+    python embedding_backend.py parity --threshold 0.99
+    python embedding_backend.py bench
+"""
+import argparse
+import inspect
+import os
+import pickle
+import sys
+import time
+from typing import List, Optional
+
+import numpy as np
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", os.path.join("models", "all-MiniLM-L6-v2-onnx"))
+ONNX_FILES = {"onnx": "model.onnx", "onnx-int8": "model_int8.onnx"}
+BACKENDS = ["torch", *ONNX_FILES]
+
+
+class OnnxEmbedder:
+    """
+    Pengganti SentenceTransformer.encode untuk model ekspor ONNX:
+    tokenisasi → ONNX Runtime → mean pooling (attention mask) → normalisasi L2,
+    sama dengan pipeline all-MiniLM-L6-v2 (Transformer, Pooling mean, Normalize).
+    """
+
+    def __init__(self, model_dir: str = ONNX_DIR, quantized: bool = False,
+                 max_seq_length: int = 256, num_threads: Optional[int] = None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_path = os.path.join(model_dir, ONNX_FILES["onnx-int8" if quantized else "onnx"])
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Model ONNX '{model_path}' tidak ditemukan, "
+                                    f"jalankan: python embedding_backend.py export")
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir, local_files_only=True)
+        self.max_seq_length = max_seq_length
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        threads = num_threads if num_threads is not None else int(os.getenv("EMBEDDING_THREADS", "0"))
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {node.name for node in self.session.get_inputs()}
+        self.dimension = self.session.get_outputs()[0].shape[-1]
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(texts, padding=True, truncation=True,
+                                 max_length=self.max_seq_length, return_tensors="np")
+        feeds = {name: encoded[name].astype(np.int64) for name in encoded if name in self.input_names}
+        token_embeddings = self.session.run(None, feeds)[0]
+
+        mask = encoded["attention_mask"][..., None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def encode(self, sentences, batch_size: int = 32, show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+
+        # Urutkan berdasarkan panjang agar padding per batch minimal, lalu kembalikan ke urutan awal
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            batch_ids = order[start:start + batch_size]
+            embeddings[batch_ids] = self._encode_batch([texts[i] for i in batch_ids])
+        return embeddings[0] if single else embeddings
+
+
+def load_embedding_model(backend: Optional[str] = None):
+    """Model embedding sesuai EMBEDDING_BACKEND (torch | onnx | onnx-int8)"""
+    backend = backend or os.getenv("EMBEDDING_BACKEND", "torch")
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(EMBEDDING_MODEL)
+    if backend in ONNX_FILES:
+        print(f"[EMBEDDING] Memakai backend {backend} dari '{ONNX_DIR}'")
+        return OnnxEmbedder(ONNX_DIR, quantized=backend == "onnx-int8")
+    raise ValueError(f"EMBEDDING_BACKEND tidak dikenal: {backend} (pilihan: {', '.join(BACKENDS)})")
+
+
+def export_onnx(model_dir: str = ONNX_DIR, quantize: bool = True, opset: int = 14):
+    """Ekspor transformer dari SentenceTransformer ke ONNX (+ versi int8) beserta tokenizer"""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    os.makedirs(model_dir, exist_ok=True)
+    st_model = SentenceTransformer(EMBEDDING_MODEL, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+    tokenizer.save_pretrained(model_dir)
+
+    sample = tokenizer(["contoh kalimat untuk ekspor"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["token_embeddings"] = {0: "batch", 1: "sequence"}
+
+    # torch >= 2.5 default ke exporter dynamo (butuh onnxscript); exporter TorchScript cukup untuk BERT
+    export_kwargs = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+
+    class TokenEmbeddings(torch.nn.Module):
+        # Input diteruskan sebagai keyword agar tidak bergantung urutan argumen forward() tiap versi transformers
+        def __init__(self):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, *inputs):
+            return self.transformer(**dict(zip(input_names, inputs)))[0]
+
+    onnx_path = os.path.join(model_dir, ONNX_FILES["onnx"])
+    with torch.no_grad():
+        torch.onnx.export(
+            TokenEmbeddings().eval(),
+            tuple(sample[name] for name in input_names),
+            onnx_path,
+            input_names=input_names,
+            output_names=["token_embeddings"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            **export_kwargs
+        )
+    print(f"[EMBEDDING] ONNX disimpan ke '{onnx_path}'")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        int8_path = os.path.join(model_dir, ONNX_FILES["onnx-int8"])
+        quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QInt8)
+        print(f"[EMBEDDING] ONNX int8 disimpan ke '{int8_path}'")
+
+
+def _sample_texts(limit: int) -> List[str]:
+    """Chunk dokumen asli dari doc_chunks.pkl sebagai data parity/benchmark"""
+    with open("doc_chunks.pkl", "rb") as f:
+        texts = pickle.load(f)["chunks"]
+    return texts[:limit]
+
+
+def parity(backends: List[str], threshold: float, limit: int = 256) -> bool:
+    """Cosine embedding tiap backend ONNX terhadap backend torch harus >= threshold untuk setiap teks"""
+    texts = _sample_texts(limit)
+    reference = np.asarray(load_embedding_model("torch").encode(texts), dtype=np.float32)
+    reference /= np.linalg.norm(reference, axis=1, keepdims=True)
+
+    passed = True
+    for backend in backends:
+        if backend == "torch":
+            continue
+        embeddings = load_embedding_model(backend).encode(texts)
+        cosine = np.sum(reference * embeddings, axis=1)
+        ok = bool(cosine.min() >= threshold)
+        passed &= ok
+        print(f"{backend:10s} cosine min={cosine.min():.5f} mean={cosine.mean():.5f} "
+              f"({'OK' if ok else 'GAGAL'}, threshold {threshold})")
+    return passed
+
+
+def bench(backends: List[str], limit: int = 512, queries: int = 100, batch_size: int = 32):
+    """Throughput encode chunk (kalimat/detik) dan latency satu query per backend"""
+    texts = _sample_texts(limit)
+    query_texts = [" ".join(text.split()[:12]) for text in texts[:queries]]
+    print(f"{'backend':10s} {'sent/s':>9s} {'query p50':>10s} {'query p95':>10s}")
+    for backend in backends:
+        model = load_embedding_model(backend)
+        model.encode(texts[:batch_size], batch_size=batch_size)  # warmup
+
+        started = time.perf_counter()
+        model.encode(texts, batch_size=batch_size)
+        throughput = len(texts) / (time.perf_counter() - started)
+
+        latencies = []
+        for query in query_texts:
+            started = time.perf_counter()
+            model.encode([query])
+            latencies.append((time.perf_counter() - started) * 1000)
+        p50, p95 = np.percentile(latencies, [50, 95])
+        print(f"{backend:10s} {throughput:9.1f} {p50:8.2f}ms {p95:8.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embedding backend: export ONNX, parity check, benchmark")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export")
+    export_parser.add_argument("--output", default=ONNX_DIR)
+    export_parser.add_argument("--no-quantize", action="store_true")
+
+    parity_parser = subparsers.add_parser("parity")
+    parity_parser.add_argument("--backends", nargs="+", default=list(ONNX_FILES), choices=BACKENDS)
+    parity_parser.add_argument("--threshold", type=float, default=0.99)
+    parity_parser.add_argument("--limit", type=int, default=256)
+
+    bench_parser = subparsers.add_parser("bench")
+    bench_parser.add_argument("--backends", nargs="+", default=BACKENDS, choices=BACKENDS)
+    bench_parser.add_argument("--limit", type=int, default=512)
+    bench_parser.add_argument("--queries", type=int, default=100)
+    bench_parser.add_argument("--batch-size", type=int, default=32)
+
+    args = parser.parse_args()
+    if args.command == "export":
+        export_onnx(args.output, quantize=not args.no_quantize)
+    elif args.command == "parity":
+        sys.exit(0 if parity(args.backends, args.threshold, args.limit) else 1)
+    else:
+        bench(args.backends, args.limit, args.queries, args.batch_size)
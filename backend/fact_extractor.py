@@ -0,0 +1,242 @@
+# fact_extractor.py
+import os
+import pickle
+import re
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from json_store import JsonStore
+
+FACT_STORE_PATH = "doc_facts.json"
+
+# Fakta dengan confidence di bawah ini tetap dijawab oleh LLM
+MIN_CONFIDENCE = float(os.getenv("FACT_MIN_CONFIDENCE", "0.8"))
+
+MONTHS = {
+    "januari": "Januari", "january": "Januari",
+    "februari": "Februari", "february": "Februari",
+    "maret": "Maret", "march": "Maret",
+    "april": "April",
+    "mei": "Mei", "may": "Mei",
+    "juni": "Juni", "june": "Juni",
+    "juli": "Juli", "july": "Juli",
+    "agustus": "Agustus", "august": "Agustus",
+    "september": "September",
+    "oktober": "Oktober", "october": "Oktober",
+    "november": "November", "nopember": "November",
+    "desember": "Desember", "december": "Desember",
+}
+
+DAYS = {"senin", "selasa", "rabu", "kamis", "jumat", "jum'at", "sabtu", "minggu"}
+
+SIGNING_DATE_PATTERN = re.compile(
+    r"Pada hari ini,?\s*(?P<hari>[\w']+),?\s*tanggal\s+(?P<tanggal>\d{1,2})\s+bulan\s+"
+    r"(?P<bulan>[A-Za-z]+)\s+tahun\s+(?P<tahun>\d{4})",
+    flags=re.IGNORECASE
+)
+
+# "seluas ± 166 m2 di Lokasi Jalan Ronggowarsito Persil #92 (“Properti”)"
+AREA_PATTERN = r"seluas\s*±?\s*(?P<luas>\d[\d.,]*)\s*m\s*(?:2|²)\s+di\s+Lokasi\s+(?P<lokasi>[^()]{3,120}?)\s*\(\s*[“\"']?"
+PROPERTY_PATTERN = re.compile(AREA_PATTERN + r"Properti", flags=re.IGNORECASE)
+RAMBAH_PATTERN = re.compile(AREA_PATTERN + r"Area\s+Dirambah", flags=re.IGNORECASE)
+
+# Jenis pertanyaan (ask.detect_question_type) -> nama fakta
+QUESTION_FACTS = {
+    "define_tanggal": "tanggal",
+    "define_luas_lokasi": "properti",
+    "define_luas_area_rambah": "rambah",
+}
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def extract_signing_date(text: str) -> Optional[Dict]:
+    """Tanggal perjanjian dari kalimat 'Pada hari ini, <hari>, tanggal <d> bulan <m> tahun <y>'"""
+    match = SIGNING_DATE_PATTERN.search(text)
+    if not match:
+        return None
+
+    hari = match.group("hari").strip(",").capitalize()
+    bulan = MONTHS.get(match.group("bulan").lower())
+    confidence = 1.0
+    if bulan is None:
+        bulan = match.group("bulan")
+        confidence -= 0.4
+    if hari.lower() not in DAYS:
+        confidence -= 0.2
+    if not 1 <= int(match.group("tanggal")) <= 31:
+        confidence -= 0.4
+
+    return {
+        "hari": hari,
+        "tanggal": int(match.group("tanggal")),
+        "bulan": bulan,
+        "tahun": int(match.group("tahun")),
+        "confidence": round(confidence, 2),
+        "source": match.group(0)
+    }
+
+
+def _extract_area(pattern, text: str) -> Optional[Dict]:
+    matches = list(pattern.finditer(text))
+    if not matches:
+        return None
+
+    match = matches[0]
+    lokasi = match.group("lokasi").strip(" ,")
+    confidence = 1.0
+    # Lebih dari satu kandidat berbeda → ambigu
+    if len({(m.group("luas"), m.group("lokasi")) for m in matches}) > 1:
+        confidence -= 0.3
+    if "persil" not in lokasi.lower():
+        confidence -= 0.1
+
+    return {
+        "luas": match.group("luas").rstrip(".,"),
+        "lokasi": lokasi,
+        "confidence": round(confidence, 2),
+        "source": match.group(0)
+    }
+
+
+def extract_property(text: str) -> Optional[Dict]:
+    """Luas dan lokasi properti utama ("Properti")"""
+    return _extract_area(PROPERTY_PATTERN, text)
+
+
+def extract_rambah(text: str) -> Optional[Dict]:
+    """Luas dan lokasi area rambah ("Area Dirambah")"""
+    return _extract_area(RAMBAH_PATTERN, text)
+
+
+EXTRACTORS = {
+    "tanggal": extract_signing_date,
+    "properti": extract_property,
+    "rambah": extract_rambah,
+}
+
+
+def extract_facts(text: str) -> Dict[str, Dict]:
+    """Jalankan semua extractor pada teks dokumen"""
+    normalized = _normalize(text)
+    facts = {}
+    for name, extractor in EXTRACTORS.items():
+        fact = extractor(normalized)
+        if fact:
+            facts[name] = fact
+    return facts
+
+
+def format_fact_answer(fact_name: str, fact: Dict) -> str:
+    """Format jawaban sama dengan format yang diminta dari LLM di ask_question"""
+    if fact_name == "tanggal":
+        return (f"Dokumen perjanjian ini dibuat pada {fact['hari']}, tanggal {fact['tanggal']} "
+                f"bulan {fact['bulan']} tahun {fact['tahun']}.")
+    if fact_name == "properti":
+        return f"Luas lahan properti: {fact['luas']} m². Lokasi properti: {fact['lokasi']}."
+    if fact_name == "rambah":
+        return f"Luas area rambah: {fact['luas']} m2. Lokasi area rambah: {fact['lokasi']}."
+    raise ValueError(f"Fakta tidak dikenal: {fact_name}")
+
+
+class FactStore:
+    """
+    Tabel fakta per owner (JSON) beserta statistik hit-rate. Pakai FactStore.shared(): satu instance
+    per file dalam satu proses (statistik lookup ikut terkumpul di satu tempat); antar proses
+    disamakan lewat JsonStore.
+    """
+
+    _shared: Dict[str, "FactStore"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, path: str = FACT_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._store = JsonStore(path, "FACTS")
+        self._stats = defaultdict(lambda: {"hits": 0, "low_confidence": 0, "misses": 0})
+
+    @classmethod
+    def shared(cls, path: str = FACT_STORE_PATH) -> "FactStore":
+        with cls._shared_lock:
+            key = os.path.abspath(path)
+            store = cls._shared.get(key)
+            if store is None:
+                store = cls._shared[key] = cls(path)
+            return store
+
+    def has_owner(self, owner: str) -> bool:
+        return owner.lower() in self._store.snapshot()
+
+    def put(self, owner: str, facts: Dict[str, Dict]):
+        self._store.set(owner.lower(), {
+            "owner": owner,
+            "facts": facts,
+            "extracted_at": datetime.now().isoformat()
+        })
+
+    def remove(self, owner: str):
+        self._store.set(owner.lower(), None)
+
+    def lookup(self, owner: str, fact_name: str, min_confidence: float = MIN_CONFIDENCE) -> Optional[Dict]:
+        """Ambil fakta jika confidence cukup; hit/miss dicatat untuk statistik"""
+        entry = self._store.get(owner.lower())
+        fact = entry["facts"].get(fact_name) if entry else None
+        with self._lock:
+            if fact is None:
+                self._stats[fact_name]["misses"] += 1
+                return None
+            if fact["confidence"] < min_confidence:
+                self._stats[fact_name]["low_confidence"] += 1
+                return None
+            self._stats[fact_name]["hits"] += 1
+        return fact
+
+    def stats(self) -> Dict:
+        """Hit-rate per jenis fakta dan total"""
+        with self._lock:
+            per_fact = {}
+            totals = {"hits": 0, "low_confidence": 0, "misses": 0}
+            for name, counts in self._stats.items():
+                lookups = sum(counts.values())
+                per_fact[name] = {**counts, "lookups": lookups,
+                                  "hit_rate": counts["hits"] / lookups if lookups else 0.0}
+                for key in totals:
+                    totals[key] += counts[key]
+        lookups = sum(totals.values())
+        return {
+            "owners": len(self._store.snapshot()),
+            "facts": per_fact,
+            "total": {**totals, "lookups": lookups, "hit_rate": totals["hits"] / lookups if lookups else 0.0}
+        }
+
+
+def extract_owner_facts(owner: str, chunks: List[str], metadatas: List[Dict]) -> Dict[str, Dict]:
+    """Ekstrak fakta dari chunk milik owner yang sudah ter-index (untuk backfill)"""
+    owner_text = "\n".join(chunk for chunk, meta in zip(chunks, metadatas)
+                           if meta.get("owner", "").lower() == owner.lower())
+    return extract_facts(owner_text)
+
+
+if __name__ == "__main__":
+    # Backfill tabel fakta untuk semua dokumen di doc_chunks.pkl
+    with open("doc_chunks.pkl", "rb") as f:
+        data = pickle.load(f)
+    chunks, metadatas = data["chunks"], data["metadatas"]
+
+    store = FactStore.shared()
+    owners = sorted(set(meta["owner"] for meta in metadatas if "owner" in meta))
+    coverage = defaultdict(int)
+    for owner in owners:
+        facts = extract_owner_facts(owner, chunks, metadatas)
+        store.put(owner, facts)
+        for name, fact in facts.items():
+            if fact["confidence"] >= MIN_CONFIDENCE:
+                coverage[name] += 1
+
+    print(f"Fakta diekstrak untuk {len(owners)} dokumen → '{FACT_STORE_PATH}'")
+    for name in EXTRACTORS:
+        print(f"  {name}: {coverage[name]}/{len(owners)} dokumen dengan confidence >= {MIN_CONFIDENCE}")
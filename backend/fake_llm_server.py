@@ -0,0 +1,124 @@
+# fake_llm_server.py
+"""
+Server lokal yang meniru endpoint OpenAI-compatible /chat/completions,
+untuk menguji LLM gateway dan load test tanpa network.
+
+Latency dan error bisa diinjeksi:
+    python fake_llm_server.py --port 8089 --latency-ms 300 --distribution lognormal --error-rate 0.05
+
+Lalu arahkan backend ke server ini:
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+@dataclass
+class FakeLLMConfig:
+    latency_ms: float = 200.0
+    # fixed | uniform | exponential | lognormal
+    distribution: str = "lognormal"
+    # Untuk lognormal: sigma; untuk uniform: +/- jitter relatif terhadap latency_ms
+    spread: float = 0.5
+    error_rate: float = 0.0
+    error_status: int = 500
+    # Jika True semua request gagal (simulasi provider down)
+    down: bool = False
+    stats: Dict[str, int] = field(default_factory=lambda: {"requests": 0, "errors": 0})
+
+    def sample_latency(self) -> float:
+        """Latency dalam detik sesuai distribusi"""
+        base = self.latency_ms / 1000.0
+        if self.distribution == "fixed":
+            return base
+        if self.distribution == "uniform":
+            return max(0.0, random.uniform(base * (1 - self.spread), base * (1 + self.spread)))
+        if self.distribution == "exponential":
+            return random.expovariate(1.0 / base) if base > 0 else 0.0
+        # lognormal dengan median = latency_ms
+        return base * random.lognormvariate(0.0, self.spread)
+
+
+def create_fake_llm_app(config: FakeLLMConfig) -> FastAPI:
+    app = FastAPI(title="Fake OpenAI-compatible LLM")
+
+    @app.post("/v1/chat/completions")
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        config.stats["requests"] += 1
+        await asyncio.sleep(config.sample_latency())
+
+        if config.down or random.random() < config.error_rate:
+            config.stats["errors"] += 1
+            return JSONResponse(status_code=config.error_status,
+                                content={"error": {"message": "injected error", "type": "server_error"}})
+
+        messages = payload.get("messages", [])
+        user_content = messages[-1]["content"] if messages else ""
+        answer = " ".join(user_content.split()[:40]) or "OK"
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "fake-model"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": sum(len(m.get("content", "").split()) for m in messages),
+                "completion_tokens": len(answer.split()),
+                "total_tokens": 0
+            }
+        }
+
+    @app.post("/admin/config")
+    async def update_config(update: Dict):
+        """Ubah latency/error secara runtime (misalnya untuk mensimulasikan provider down)"""
+        for key, value in update.items():
+            if hasattr(config, key) and key != "stats":
+                current = getattr(config, key)
+                if isinstance(current, bool):
+                    value = value in (True, 1, "1", "true", "True")
+                setattr(config, key, type(current)(value))
+        return {"status": "ok"}
+
+    @app.get("/admin/stats")
+    async def get_stats():
+        return config.stats
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--distribution", default="lognormal",
+                        choices=["fixed", "uniform", "exponential", "lognormal"])
+    parser.add_argument("--spread", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    args = parser.parse_args()
+
+    fake_config = FakeLLMConfig(
+        latency_ms=args.latency_ms,
+        distribution=args.distribution,
+        spread=args.spread,
+        error_rate=args.error_rate,
+        error_status=args.error_status
+    )
+    uvicorn.run(create_fake_llm_app(fake_config), host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,481 @@
+# ingest.py
+"""
+Bulk ingest PDF secara incremental dan resumable (pengganti chunk_all_pdfs + build_index.py).
+
+Manifest (ingest_manifest.json) mencatat path, size, mtime, sha256 dan rentang chunk id per file,
+sehingga hanya PDF baru/berubah yang diproses. Ekstraksi teks + chunking berjalan paralel
+(process pool), embedding dibuat per batch, dan progres di-checkpoint per kelompok file:
+run yang terputus dilanjutkan dari checkpoint terakhir. Katalog dokumen (doc_catalog.py)
+disamakan dengan manifest setiap checkpoint.
+
+    python ingest.py --pdf-dir pdf --workers 4 --batch-size 64
+    python ingest.py --dry-run      # tampilkan rencana tanpa memproses
+    python ingest.py --prune        # hapus chunk milik PDF yang sudah tidak ada
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import faiss
+
+from doc_catalog import DocumentCatalog, pdf_page_count
+from embedding_backend import load_embedding_model
+from fact_extractor import FactStore, extract_facts
+from keyword_index import InvertedIndex, KEYWORD_INDEX_PATH, load_or_build_keyword_index
+from summarizer import SummaryStore
+from token_windows import encode_chunks, fit_chunks
+
+MANIFEST_PATH = "ingest_manifest.json"
+INDEX_PATH = "doc_index.faiss"
+CHUNKS_PATH = "doc_chunks.pkl"
+# Batas process ekstraksi untuk CHUNKING_MODE=semantic (satu salinan model embedding per process)
+SEMANTIC_EXTRACT_WORKERS = int(os.getenv("SEMANTIC_EXTRACT_WORKERS", "2"))
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _atomic_pickle(obj, path: str):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(obj, f)
+    os.replace(tmp_path, path)
+
+
+def _atomic_write_index(index, path: str):
+    tmp_path = f"{path}.tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+
+
+class IngestManifest:
+    """
+    Status ingest per file. chunk_count adalah titik commit: chunk/vektor di luar chunk_count
+    berasal dari checkpoint yang tidak selesai dan dibuang saat recovery.
+    pending_removal adalah write-ahead log untuk penghapusan rentang chunk.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: str = MANIFEST_PATH):
+        self.path = path
+        self.files: Dict[str, Dict] = {}
+        self.chunk_count: Optional[int] = None
+        self.pending_removal: Optional[Dict] = None
+        # Id compaction terakhir (compaction.py) yang sudah diterapkan ke rentang chunk manifest
+        self.applied_compaction: Optional[str] = None
+
+    @classmethod
+    def load(cls, path: str = MANIFEST_PATH) -> "IngestManifest":
+        manifest = cls(path)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != cls.VERSION:
+                raise ValueError(f"Versi manifest '{path}' tidak didukung: {data.get('version')}")
+            manifest.files = data["files"]
+            manifest.chunk_count = data["chunk_count"]
+            manifest.pending_removal = data.get("pending_removal")
+            manifest.applied_compaction = data.get("applied_compaction")
+        return manifest
+
+    @property
+    def exists(self) -> bool:
+        return self.chunk_count is not None
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": self.VERSION,
+                "chunk_count": self.chunk_count,
+                "pending_removal": self.pending_removal,
+                "applied_compaction": self.applied_compaction,
+                "files": self.files
+            }, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def remove_ranges(self, ranges: List[Tuple[int, int]]):
+        """Geser chunk range file lain setelah rentang [start, end) dihapus"""
+        for start, end in sorted(ranges, reverse=True):
+            removed = end - start
+            for entry in self.files.values():
+                if entry["chunk_start"] >= end:
+                    entry["chunk_start"] -= removed
+                    entry["chunk_end"] -= removed
+            self.chunk_count -= removed
+
+    def apply_compaction(self, ranges: List[Tuple[int, int]], compaction_id: str) -> bool:
+        """
+        Ikuti compaction (rentang bertombstone dibuang dari index/chunks): file yang rentangnya ikut
+        dibuang dilepas dari manifest (di-ingest ulang jika masih ada di folder), rentang file lain
+        digeser. Idempotent per compaction_id, karena bisa dipanggil lagi saat recovery.
+
+        Returns:
+            False jika manifest belum ada atau compaction ini sudah diterapkan
+        """
+        if not self.exists or self.applied_compaction == compaction_id:
+            return False
+        for name, entry in list(self.files.items()):
+            if any(start <= entry["chunk_start"] and entry["chunk_end"] <= end for start, end in ranges):
+                del self.files[name]
+        # Chunk di luar chunk_count bukan milik manifest (mis. upload lewat API)
+        committed = self.chunk_count - sum(max(0, min(end, self.chunk_count) - start) for start, end in ranges)
+        self.remove_ranges(ranges)
+        self.chunk_count = committed
+        self.applied_compaction = compaction_id
+        return True
+
+
+def _remove_ranges_from_index(index, ranges: List[Tuple[int, int]]):
+    # IndexFlat memadatkan id setelah remove_ids, jadi hapus dari rentang paling belakang
+    for start, end in sorted(ranges, reverse=True):
+        index.remove_ids(faiss.IDSelectorRange(start, end))
+
+
+def _remove_ranges_from_list(items: List, ranges: List[Tuple[int, int]]):
+    for start, end in sorted(ranges, reverse=True):
+        del items[start:end]
+
+
+def _extract_pdf(path: str, source_name: str) -> Tuple[List[str], List[Dict], Dict]:
+    """Dijalankan di worker process: ekstraksi teks, chunking dan fakta satu PDF"""
+    from semantic_chunker import load_pdf_text, split_into_chunks
+
+    text = load_pdf_text(path)
+    if not text:
+        return [], [], {}
+    # CHUNK_FIT=pack dijalankan di proses utama (fit_chunks), jadi mode tokens tidak memuat model di worker;
+    # CHUNKING_MODE=semantic memuat model embedding sekali per worker (jumlah worker dibatasi, lihat BulkIngester)
+    chunks, metadatas = split_into_chunks(text, source_name, fit="off")
+    return chunks, metadatas, extract_facts(text)
+
+
+def _owner_runs(metadatas: List[Dict]) -> Dict[str, List[Tuple[int, int]]]:
+    """Rentang chunk [start, end) berurutan per owner"""
+    runs: Dict[str, List[Tuple[int, int]]] = {}
+    for i, meta in enumerate(metadatas):
+        owner = meta.get("owner", "")
+        owner_runs = runs.setdefault(owner, [])
+        if owner_runs and owner_runs[-1][1] == i:
+            owner_runs[-1] = (owner_runs[-1][0], i + 1)
+        else:
+            owner_runs.append((i, i + 1))
+    return runs
+
+
+class BulkIngester:
+    def __init__(self, pdf_dir: str, workers: int = 4, batch_size: int = 64,
+                 checkpoint_files: int = 10, prune: bool = False, rebuild: bool = False):
+        self.pdf_dir = pdf_dir
+        self.workers = workers
+        from semantic_chunker import CHUNKING_MODE
+        if CHUNKING_MODE == "semantic" and workers > SEMANTIC_EXTRACT_WORKERS:
+            # Setiap worker memuat model embedding sendiri untuk encode kalimat
+            print(f"[INGEST] CHUNKING_MODE=semantic: worker dibatasi {workers} → {SEMANTIC_EXTRACT_WORKERS} "
+                  f"(SEMANTIC_EXTRACT_WORKERS)")
+            self.workers = SEMANTIC_EXTRACT_WORKERS
+        self.batch_size = batch_size
+        self.checkpoint_files = checkpoint_files
+        self.prune = prune
+        self.rebuild = rebuild
+
+        self.model = None
+        self.manifest = IngestManifest() if rebuild else IngestManifest.load()
+        self.index = None
+        self.chunks: List[str] = []
+        self.metadatas: List[Dict] = []
+        self.keyword_index: Optional[InvertedIndex] = None
+        self.fact_store = FactStore.shared()
+        self.summary_store = SummaryStore.shared()
+        self.catalog = DocumentCatalog()
+
+    # === Load & recovery ===
+    def _get_model(self):
+        if self.model is None:
+            self.model = load_embedding_model()
+        return self.model
+
+    def load(self):
+        if not self.rebuild and os.path.exists(INDEX_PATH) and os.path.exists(CHUNKS_PATH):
+            self.index = faiss.read_index(INDEX_PATH)
+            with open(CHUNKS_PATH, "rb") as f:
+                data = pickle.load(f)
+            self.chunks = data["chunks"]
+            self.metadatas = data["metadatas"]
+        else:
+            self.index = faiss.IndexFlatL2(self._get_model().get_sentence_embedding_dimension())
+            self.chunks, self.metadatas = [], []
+
+        if self.manifest.exists:
+            self._recover()
+        else:
+            self.manifest.chunk_count = len(self.chunks)
+            self._adopt_existing()
+
+        if self.index.ntotal != len(self.chunks):
+            raise RuntimeError(f"Index ({self.index.ntotal} vektor) tidak sejajar dengan chunks "
+                               f"({len(self.chunks)}); jalankan ulang dengan --rebuild")
+        self.keyword_index = load_or_build_keyword_index(self.chunks)
+
+    def _recover(self):
+        """Selesaikan penghapusan yang terputus dan buang append yang belum di-commit"""
+        pending = self.manifest.pending_removal
+        if pending:
+            ranges = [tuple(r) for r in pending["ranges"]]
+            if self.index.ntotal == pending["chunk_count_before"]:
+                _remove_ranges_from_index(self.index, ranges)
+                _atomic_write_index(self.index, INDEX_PATH)
+            if len(self.chunks) == pending["chunk_count_before"]:
+                _remove_ranges_from_list(self.chunks, ranges)
+                _remove_ranges_from_list(self.metadatas, ranges)
+                _atomic_pickle({"chunks": self.chunks, "metadatas": self.metadatas}, CHUNKS_PATH)
+            self.manifest.pending_removal = None
+            self.manifest.save()
+            print(f"[INGEST] Recovery: penghapusan {len(ranges)} rentang chunk diselesaikan")
+
+        # Chunk upload (/upload/background) ditambahkan tanpa menyentuh manifest: yang sudah tercatat
+        # di katalog ikut dihitung sebagai committed
+        committed = max(self.manifest.chunk_count, self.catalog.max_chunk_end(exclude_source="pdf_dir"))
+        self.manifest.chunk_count = committed
+        if len(self.chunks) > committed:
+            print(f"[INGEST] Recovery: {len(self.chunks) - committed} chunk dari checkpoint yang terputus dibuang")
+            del self.chunks[committed:]
+            del self.metadatas[committed:]
+        if self.index.ntotal > committed:
+            self.index.remove_ids(faiss.IDSelectorRange(committed, self.index.ntotal))
+
+    def _adopt_existing(self):
+        """
+        Run pertama tanpa manifest: PDF yang owner-nya sudah ada di doc_chunks.pkl (dalam satu
+        rentang berurutan) dicatat apa adanya agar tidak di-embed ulang.
+        """
+        if not self.chunks:
+            return
+        runs = _owner_runs(self.metadatas)
+        adopted = 0
+        for name in self._scan():
+            owner_runs = runs.get(os.path.splitext(name)[0].strip())
+            if owner_runs and len(owner_runs) == 1:
+                self.manifest.files[name] = self._file_entry(name, *owner_runs[0])
+                adopted += 1
+        print(f"[INGEST] Manifest baru: {adopted} file diadopsi dari index yang sudah ada")
+
+    def _sync_catalog(self):
+        """Katalog dokumen (source pdf_dir) mengikuti manifest yang sudah di-commit"""
+        changed = self.catalog.sync_indexed(
+            "pdf_dir", self.manifest.files, lambda name: pdf_page_count(os.path.join(self.pdf_dir, name)))
+        if changed:
+            print(f"[INGEST] Katalog dokumen: {changed} baris diperbarui")
+
+    # === Perencanaan ===
+    def _scan(self) -> List[str]:
+        if not os.path.isdir(self.pdf_dir):
+            raise FileNotFoundError(f"Folder '{self.pdf_dir}' tidak ditemukan")
+        return sorted(name for name in os.listdir(self.pdf_dir) if name.lower().endswith(".pdf"))
+
+    def _file_entry(self, name: str, chunk_start: int, chunk_end: int, sha256: Optional[str] = None) -> Dict:
+        path = os.path.join(self.pdf_dir, name)
+        stat = os.stat(path)
+        return {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": sha256 or file_sha256(path),
+            "owner": os.path.splitext(name)[0].strip(),
+            "chunk_start": chunk_start,
+            "chunk_end": chunk_end,
+            "ingested_at": datetime.now().isoformat()
+        }
+
+    def plan(self) -> Tuple[List[str], List[str], List[str]]:
+        """
+        Returns:
+            (file baru/berubah, file yang hilang dari folder, file tidak berubah)
+        """
+        todo, unchanged = [], []
+        names = self._scan()
+        for name in names:
+            entry = self.manifest.files.get(name)
+            if entry is None:
+                todo.append(name)
+                continue
+            stat = os.stat(os.path.join(self.pdf_dir, name))
+            if stat.st_size == entry["size"] and stat.st_mtime_ns == entry["mtime_ns"]:
+                unchanged.append(name)
+                continue
+            # size/mtime berubah: cek isi sebelum memproses ulang
+            sha256 = file_sha256(os.path.join(self.pdf_dir, name))
+            if sha256 == entry["sha256"]:
+                entry["mtime_ns"] = stat.st_mtime_ns
+                unchanged.append(name)
+            else:
+                todo.append(name)
+        missing = sorted(set(self.manifest.files) - set(names))
+        return todo, missing, unchanged
+
+    # === Penghapusan & commit ===
+    def _begin_removal(self, ranges: List[Tuple[int, int]]):
+        """Write-ahead log penghapusan rentang (ikut tersimpan di manifest.save() berikutnya)"""
+        self.manifest.pending_removal = {"ranges": ranges, "chunk_count_before": len(self.chunks)}
+        self.manifest.remove_ranges(ranges)
+
+    def _finish_removal(self, ranges: List[Tuple[int, int]]):
+        """Buang rentang dari index/chunks setelah _begin_removal tersimpan, lalu tutup log"""
+        _remove_ranges_from_index(self.index, ranges)
+        _atomic_write_index(self.index, INDEX_PATH)
+        _remove_ranges_from_list(self.chunks, ranges)
+        _remove_ranges_from_list(self.metadatas, ranges)
+        _atomic_pickle({"chunks": self.chunks, "metadatas": self.metadatas}, CHUNKS_PATH)
+
+        self.manifest.pending_removal = None
+        self.manifest.save()
+        # Rentang chunk dokumen upload ikut bergeser; baris pdf_dir disamakan dengan manifest
+        self.catalog.remove_chunk_ranges(ranges)
+        self._sync_catalog()
+
+        # Doc id keyword index ikut bergeser → bangun ulang
+        self.keyword_index = InvertedIndex.build(self.chunks)
+        self.keyword_index.save(KEYWORD_INDEX_PATH)
+
+    def remove_files(self, names: List[str]):
+        """Hapus chunk milik file yang hilang dari folder, dengan write-ahead log di manifest"""
+        entries = [(name, self.manifest.files[name]) for name in names if name in self.manifest.files]
+        if not entries:
+            return
+        ranges = [(entry["chunk_start"], entry["chunk_end"]) for _, entry in entries]
+
+        for name, _ in entries:
+            del self.manifest.files[name]
+        self._begin_removal(ranges)
+        self.manifest.save()
+        self._finish_removal(ranges)
+
+        # Rangkuman/fakta lama tidak berlaku lagi
+        for _, entry in entries:
+            self.summary_store.remove(entry["owner"])
+            self.fact_store.remove(entry["owner"])
+        print(f"[INGEST] {sum(end - start for start, end in ranges)} chunk dari {len(entries)} file dihapus")
+
+    def commit(self, results: List[Tuple[str, List[str], List[Dict], Dict]]):
+        """
+        Embed chunk hasil ekstraksi (per batch) lalu simpan sebagai satu checkpoint. Chunk lama file
+        yang berubah dibuang di checkpoint yang sama, setelah penggantinya tersimpan: manifest dengan
+        entry baru + write-ahead log penghapusan adalah satu titik commit.
+        """
+        texts = [chunk for _, file_chunks, _, _ in results for chunk in file_chunks]
+        if not texts:
+            return
+        embeddings = encode_chunks(self._get_model(), texts, batch_size=self.batch_size)
+        start_id = len(self.chunks)
+        replaced = [(name, self.manifest.files[name]) for name, _, _, _ in results if name in self.manifest.files]
+        ranges = [(entry["chunk_start"], entry["chunk_end"]) for _, entry in replaced]
+
+        self.index.add(embeddings)
+        self.keyword_index.add_documents(texts, start_id=start_id)
+        offset = start_id
+        for name, file_chunks, file_metadatas, facts in results:
+            self.chunks.extend(file_chunks)
+            self.metadatas.extend(file_metadatas)
+            self.manifest.files[name] = self._file_entry(name, offset, offset + len(file_chunks))
+            if file_metadatas:
+                self.fact_store.put(file_metadatas[0]["owner"], facts)
+            offset += len(file_chunks)
+
+        # Urutan tulis: index → chunks → manifest (titik commit)
+        _atomic_write_index(self.index, INDEX_PATH)
+        _atomic_pickle({"chunks": self.chunks, "metadatas": self.metadatas}, CHUNKS_PATH)
+        self.keyword_index.save(KEYWORD_INDEX_PATH)
+        self.manifest.chunk_count = len(self.chunks)
+        if ranges:
+            self._begin_removal(ranges)
+        self.manifest.save()
+        if ranges:
+            self._finish_removal(ranges)  # termasuk sinkronisasi katalog
+            for _, entry in replaced:
+                self.summary_store.remove(entry["owner"])
+        else:
+            self._sync_catalog()
+        # Server yang sedang berjalan memuat chunk baru (main.py: sinkronisasi corpus)
+        self.catalog.bump_index_version()
+        print(f"[INGEST] Checkpoint: {len(results)} file, {len(texts)} chunk (total {len(self.chunks)}"
+              f"{f', {len(replaced)} file diganti' if replaced else ''})")
+
+    # === Main ===
+    def run(self, dry_run: bool = False) -> Dict:
+        started = time.perf_counter()
+        self.load()
+        todo, missing, unchanged = self.plan()
+        changed = [name for name in todo if name in self.manifest.files]
+        print(f"[INGEST] {len(todo) - len(changed)} baru, {len(changed)} berubah, "
+              f"{len(unchanged)} tidak berubah, {len(missing)} hilang dari folder")
+        if dry_run:
+            return {"new": len(todo) - len(changed), "changed": len(changed),
+                    "unchanged": len(unchanged), "missing": len(missing)}
+
+        self._sync_catalog()  # termasuk hasil recovery/adopsi saat load
+        # Chunk lama file yang berubah baru dibuang saat penggantinya di-commit (lihat commit)
+        self.remove_files(missing if self.prune else [])
+        self.manifest.save()  # mtime file yang isinya tidak berubah
+
+        stats = {"processed": 0, "failed": 0, "skipped": 0, "chunks_added": 0}
+        pending = []
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(_extract_pdf, os.path.join(self.pdf_dir, name), name): name
+                       for name in todo}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    file_chunks, file_metadatas, facts = future.result()
+                    file_chunks, file_metadatas = fit_chunks(file_chunks, file_metadatas, self._get_model())
+                except Exception as e:
+                    print(f"[INGEST] Gagal memproses '{name}': {e}")
+                    stats["failed"] += 1
+                    continue
+                if not file_chunks:
+                    print(f"[INGEST] SKIP: '{name}' tidak menghasilkan chunk")
+                    stats["skipped"] += 1
+                    continue
+
+                pending.append((name, file_chunks, file_metadatas, facts))
+                stats["processed"] += 1
+                stats["chunks_added"] += len(file_chunks)
+                if len(pending) >= self.checkpoint_files:
+                    self.commit(pending)
+                    pending = []
+        self.commit(pending)
+
+        stats["elapsed_seconds"] = round(time.perf_counter() - started, 2)
+        stats["total_chunks"] = len(self.chunks)
+        return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk ingest PDF (incremental, resumable)")
+    parser.add_argument("--pdf-dir", default="pdf")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4,
+                        help="Jumlah process untuk ekstraksi + chunking")
+    parser.add_argument("--batch-size", type=int, default=64, help="Batch size embedding")
+    parser.add_argument("--checkpoint-files", type=int, default=10,
+                        help="Simpan checkpoint setiap N file selesai")
+    parser.add_argument("--prune", action="store_true", help="Hapus chunk milik PDF yang sudah tidak ada")
+    parser.add_argument("--rebuild", action="store_true", help="Abaikan manifest/index lama dan proses semua PDF")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    ingester = BulkIngester(args.pdf_dir, workers=args.workers, batch_size=args.batch_size,
+                            checkpoint_files=args.checkpoint_files, prune=args.prune, rebuild=args.rebuild)
+    result = ingester.run(dry_run=args.dry_run)
+    print(json.dumps(result, indent=2))
+    if not args.dry_run and result.get("chunks_added"):
+        print("Restart backend agar ask.py memuat index terbaru.")
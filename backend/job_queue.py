@@ -0,0 +1,420 @@
+# job_queue.py
+"""
+Job queue persisten di SQLite (WAL) untuk ingest dokumen.
+
+- Claim atomik: BEGIN IMMEDIATE → pilih job siap → set processing + lease, sehingga beberapa
+  worker (thread atau proses) tidak pernah mengambil job yang sama
+- Lease diperpanjang lewat heartbeat; job dengan lease kedaluwarsa (proses mati) dijadwalkan ulang,
+  dan job milik proses mati di host yang sama langsung dilepas saat start
+- Gagal, lease habis atau worker mati → dicoba lagi dengan exponential backoff sampai max_attempts,
+  lalu failed (PDF yang membuat worker crash tidak diulang terus-menerus)
+- complete/fail hanya berlaku untuk worker yang masih memegang job
+- Riwayat job selesai/gagal dibatasi (JOB_HISTORY_LIMIT)
+- Setiap perubahan status/progress dicatat di job_events (id naik monoton) untuk stream SSE
+  yang bisa dilanjutkan dari event id terakhir; listener in-process dibangunkan tiap event baru
+"""
+import json
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+import weakref
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "ingest_jobs.db")
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_BACKOFF_SECONDS = float(os.getenv("JOB_BACKOFF_SECONDS", "5"))
+JOB_BACKOFF_MAX_SECONDS = float(os.getenv("JOB_BACKOFF_MAX_SECONDS", "300"))
+JOB_HISTORY_LIMIT = int(os.getenv("JOB_HISTORY_LIMIT", "1000"))
+
+
+class JobStatus:
+    PENDING = "pending"
+    PROCESSING = "processing"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class PermanentJobError(Exception):
+    """Error yang tidak akan hilang dengan retry (misalnya PDF tanpa teks)"""
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    result TEXT,
+    progress INTEGER NOT NULL DEFAULT 0,
+    message TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_after REAL NOT NULL,
+    locked_by TEXT,
+    locked_until REAL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    completed_at TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, run_after);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (status, updated_at);
+CREATE TABLE IF NOT EXISTS job_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT,
+    progress INTEGER NOT NULL,
+    message TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS job_events_job ON job_events (job_id, id);
+"""
+
+
+def _now_iso() -> str:
+    return datetime.now().isoformat()
+
+
+def worker_identity() -> str:
+    """host:pid:acak, dipakai sebagai locked_by"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def _backoff_delay(attempts: int) -> float:
+    delay = min(JOB_BACKOFF_MAX_SECONDS, JOB_BACKOFF_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+# Koneksi sqlite tidak boleh dipakai lintas fork (serve.py): proses anak membuka koneksi sendiri
+_queues = weakref.WeakSet()
+
+
+def _forget_connections_after_fork():
+    for queue in list(_queues):
+        queue._local = threading.local()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_connections_after_fork)
+
+
+class JobQueue:
+    def __init__(self, path: str = JOB_DB_PATH, max_attempts: int = JOB_MAX_ATTEMPTS,
+                 lease_seconds: float = JOB_LEASE_SECONDS, history_limit: int = JOB_HISTORY_LIMIT):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.history_limit = history_limit
+        self._local = threading.local()
+        # Dibangunkan saat ada job baru agar worker tidak perlu menunggu interval polling
+        self.wakeup = threading.Event()
+        self._listeners: List[Callable[[], None]] = []
+        self._listeners_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+        _queues.add(self)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Satu koneksi per thread (sqlite3 tidak aman dibagi antar thread)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    # === Event progress ===
+    def subscribe(self, listener: Callable[[], None]):
+        """listener() dipanggil (dari thread worker) setiap ada event baru; harus cepat dan thread-safe"""
+        with self._listeners_lock:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[], None]):
+        with self._listeners_lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def _notify(self):
+        with self._listeners_lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener()
+            except Exception:
+                pass
+
+    @staticmethod
+    def _record_event(conn: sqlite3.Connection, job_id: str, status: str, progress: int,
+                      message: str, stage: Optional[str] = None):
+        conn.execute(
+            "INSERT INTO job_events (job_id, status, stage, progress, message, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, status, stage, progress, message, _now_iso()))
+
+    def events_since(self, after_id: int = 0, job_id: Optional[str] = None, limit: int = 500) -> List[Dict]:
+        if job_id:
+            rows = self._connect().execute(
+                "SELECT * FROM job_events WHERE job_id = ? AND id > ? ORDER BY id LIMIT ?", (job_id, after_id, limit))
+        else:
+            rows = self._connect().execute(
+                "SELECT * FROM job_events WHERE id > ? ORDER BY id LIMIT ?", (after_id, limit))
+        return [dict(row, task_id=row["job_id"]) for row in rows.fetchall()]
+
+    def last_event_id(self) -> int:
+        row = self._connect().execute("SELECT MAX(id) AS id FROM job_events").fetchone()
+        return row["id"] or 0
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        if job["status"] == JobStatus.PENDING and job["attempts"]:
+            job["next_attempt_at"] = datetime.fromtimestamp(job["run_after"]).isoformat()
+        # Field payload di level atas agar bentuk respons sama dengan task lama (filename, file_path)
+        for key, value in job["payload"].items():
+            job.setdefault(key, value)
+        return job
+
+    def enqueue(self, job_type: str, payload: Dict, job_id: Optional[str] = None) -> str:
+        job_id = job_id or str(uuid.uuid4())
+        now = _now_iso()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, type, status, payload, message, max_attempts, run_after, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, job_type, JobStatus.PENDING, json.dumps(payload), "Task created",
+                 self.max_attempts, time.time(), now, now))
+            self._record_event(conn, job_id, JobStatus.PENDING, 0, "Task created", "queued")
+        self.wakeup.set()
+        self._notify()
+        return job_id
+
+    def _requeue_or_fail(self, conn: sqlite3.Connection, job_id: str, reason: str) -> str:
+        """
+        Job processing yang worker-nya hilang (lease habis / proses mati): dijadwalkan ulang dengan
+        backoff seperti fail(), atau failed jika attempt sudah habis
+        """
+        row = conn.execute("SELECT attempts, max_attempts, progress FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        now = _now_iso()
+        if row["attempts"] < row["max_attempts"]:
+            delay = _backoff_delay(row["attempts"])
+            status, message, stage = JobStatus.PENDING, f"{reason}, retrying in {delay:.0f}s", "retry"
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, message = ?, run_after = ?, locked_by = NULL, "
+                "locked_until = NULL, updated_at = ? WHERE id = ?",
+                (status, reason, message, time.time() + delay, now, job_id))
+        else:
+            status, message, stage = JobStatus.FAILED, f"Failed: {reason}", "failed"
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, message = ?, locked_by = NULL, locked_until = NULL, "
+                "updated_at = ?, completed_at = ? WHERE id = ?",
+                (status, reason, message, now, now, job_id))
+        self._record_event(conn, job_id, status, row["progress"], message, stage)
+        return status
+
+    def claim(self, worker_id: str, job_types: Optional[List[str]] = None) -> Optional[Dict]:
+        """
+        Ambil satu job pending yang sudah lewat run_after. Job processing dengan lease habis lebih dulu
+        dijadwalkan ulang (dengan backoff) atau dibuat failed jika attempt sudah habis.
+        """
+        now = time.time()
+        type_filter = ""
+        params: List = [JobStatus.PENDING, now]
+        if job_types:
+            type_filter = f" AND type IN ({','.join('?' * len(job_types))})"
+            params += job_types
+
+        with self._transaction() as conn:
+            expired = conn.execute("SELECT id, attempts FROM jobs WHERE status = ? AND locked_until < ?",
+                                   (JobStatus.PROCESSING, now)).fetchall()
+            failed = [row["id"] for row in expired
+                      if self._requeue_or_fail(conn, row["id"], f"Lease expired during attempt {row['attempts']}")
+                      == JobStatus.FAILED]
+            row = conn.execute(
+                f"SELECT id FROM jobs WHERE status = ? AND run_after <= ?{type_filter} "
+                "ORDER BY run_after, created_at LIMIT 1", params).fetchone()
+            job = None
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, locked_by = ?, locked_until = ?, "
+                    "error = NULL, updated_at = ? WHERE id = ?",
+                    (JobStatus.PROCESSING, worker_id, now + self.lease_seconds, _now_iso(), row["id"]))
+                job = conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+                self._record_event(conn, job["id"], JobStatus.PROCESSING, job["progress"],
+                                   f"Attempt {job['attempts']} started", "started")
+        if expired or job is not None:
+            self._notify()
+        if failed:
+            self.trim_history()
+        return self._to_dict(job) if job is not None else None
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """Perpanjang lease; False jika job sudah tidak dipegang worker ini"""
+        cursor = self._connect().execute(
+            "UPDATE jobs SET locked_until = ? WHERE id = ? AND locked_by = ? AND status = ?",
+            (time.time() + self.lease_seconds, job_id, worker_id, JobStatus.PROCESSING))
+        return cursor.rowcount == 1
+
+    def update_progress(self, job_id: str, progress: int, message: str, stage: Optional[str] = None):
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET progress = ?, message = ?, updated_at = ? WHERE id = ?",
+                (progress, message, _now_iso(), job_id))
+            self._record_event(conn, job_id, JobStatus.PROCESSING, progress, message, stage)
+        self._notify()
+
+    def complete(self, job_id: str, worker_id: str, result: Optional[Dict] = None,
+                 message: str = "Completed") -> bool:
+        """
+        Returns:
+            False jika job sudah tidak dipegang worker_id (lease habis dan diambil alih): hasil diabaikan
+        """
+        now = _now_iso()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, progress = 100, message = ?, result = ?, locked_by = NULL, "
+                "locked_until = NULL, updated_at = ?, completed_at = ? WHERE id = ? AND locked_by = ? AND status = ?",
+                (JobStatus.COMPLETED, message, json.dumps(result) if result is not None else None, now, now, job_id,
+                 worker_id, JobStatus.PROCESSING))
+            if not cursor.rowcount:
+                return False
+            self._record_event(conn, job_id, JobStatus.COMPLETED, 100, message, "completed")
+        self._notify()
+        self.trim_history()
+        return True
+
+    def fail(self, job_id: str, worker_id: str, error: str, retry: bool = True) -> Optional[str]:
+        """
+        Catat kegagalan. Dijadwalkan ulang dengan backoff jika masih ada sisa attempt.
+
+        Returns:
+            Status baru (pending atau failed), atau None jika job sudah tidak dipegang worker_id
+        """
+        with self._transaction() as conn:
+            row = conn.execute("SELECT attempts, max_attempts, progress FROM jobs WHERE id = ? AND locked_by = ? "
+                               "AND status = ?", (job_id, worker_id, JobStatus.PROCESSING)).fetchone()
+            if row is None:
+                return None
+            now = _now_iso()
+            if retry and row["attempts"] < row["max_attempts"]:
+                delay = _backoff_delay(row["attempts"])
+                status, message, stage = (JobStatus.PENDING,
+                                          f"Attempt {row['attempts']} failed, retrying in {delay:.0f}s", "retry")
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, message = ?, run_after = ?, locked_by = NULL, "
+                    "locked_until = NULL, updated_at = ? WHERE id = ?",
+                    (status, error, message, time.time() + delay, now, job_id))
+            else:
+                status, message, stage = JobStatus.FAILED, f"Failed: {error}", "failed"
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, message = ?, locked_by = NULL, locked_until = NULL, "
+                    "updated_at = ?, completed_at = ? WHERE id = ?",
+                    (status, error, message, now, now, job_id))
+            self._record_event(conn, job_id, status, row["progress"], message, stage)
+        self._notify()
+        if status == JobStatus.FAILED:
+            self.trim_history()
+        return status
+
+    def release_dead_workers(self) -> int:
+        """
+        Job processing milik proses yang sudah mati di host ini dijadwalkan ulang (dengan backoff,
+        attempt yang crash ikut dihitung) atau dibuat failed jika attempt sudah habis
+        """
+        conn = self._connect()
+        host = socket.gethostname()
+        released = 0
+        failed = False
+        for row in conn.execute("SELECT id, locked_by FROM jobs WHERE status = ?", (JobStatus.PROCESSING,)).fetchall():
+            parts = (row["locked_by"] or "").split(":")
+            if len(parts) >= 2 and parts[0] == host and parts[1].isdigit() and not _pid_alive(int(parts[1])):
+                with self._transaction() as tx:
+                    current = tx.execute("SELECT locked_by FROM jobs WHERE id = ? AND status = ?",
+                                         (row["id"], JobStatus.PROCESSING)).fetchone()
+                    if current is None or current["locked_by"] != row["locked_by"]:
+                        continue
+                    status = self._requeue_or_fail(tx, row["id"], "Worker process died (resumed after restart)")
+                    failed = failed or status == JobStatus.FAILED
+                    released += 1
+        if released:
+            self.wakeup.set()
+            self._notify()
+        if failed:
+            self.trim_history()
+        return released
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, limit: int = 100, status: Optional[str] = None) -> List[Dict]:
+        if status:
+            rows = self._connect().execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY created_at DESC LIMIT ?", (status, limit))
+        else:
+            rows = self._connect().execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,))
+        return [self._to_dict(row) for row in rows.fetchall()]
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._connect().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        counts = {status: 0 for status in (JobStatus.PENDING, JobStatus.PROCESSING,
+                                           JobStatus.COMPLETED, JobStatus.FAILED)}
+        counts.update({row["status"]: row["n"] for row in rows})
+        return counts
+
+    @staticmethod
+    def _delete_orphan_events(conn: sqlite3.Connection):
+        conn.execute("DELETE FROM job_events WHERE job_id NOT IN (SELECT id FROM jobs)")
+
+    def trim_history(self) -> int:
+        """Hapus job selesai/gagal tertua (beserta event-nya) di atas history_limit"""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "DELETE FROM jobs WHERE id IN (SELECT id FROM jobs WHERE status IN (?, ?) "
+                "ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (JobStatus.COMPLETED, JobStatus.FAILED, self.history_limit))
+            if cursor.rowcount:
+                self._delete_orphan_events(conn)
+        return cursor.rowcount
+
+    def prune(self, max_age_hours: float = 24) -> int:
+        """Hapus job selesai/gagal (beserta event-nya) yang lebih tua dari max_age_hours"""
+        cutoff = datetime.fromtimestamp(time.time() - max_age_hours * 3600).isoformat()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (JobStatus.COMPLETED, JobStatus.FAILED, cutoff))
+            self._delete_orphan_events(conn)
+        return cursor.rowcount
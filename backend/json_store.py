@@ -0,0 +1,96 @@
+# json_store.py
+"""
+Dict key → entry yang disimpan sebagai satu file JSON dan dipakai bersama oleh beberapa proses
+(ask.py, worker ingest, ingest.py CLI, worker serve.py).
+
+- Sebelum dibaca, isi file dimuat ulang jika file diganti proses lain (mtime/ukuran/inode)
+- Tulis = muat ulang file, ubah satu key, tulis atomic; dijalankan di bawah flock pada
+  '<path>.lock' sehingga entry yang ditulis proses lain tidak tertimpa
+"""
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: hanya lock antar thread
+    fcntl = None
+
+
+class JsonStore:
+    def __init__(self, path: str, label: str = "STORE"):
+        self.path = path
+        self.label = label
+        self._lock = threading.Lock()
+        self._data: Dict[str, Dict] = {}
+        self._signature = None
+        with self._lock:
+            self._refresh()
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def _refresh(self):
+        """Muat ulang file jika berubah sejak terakhir dibaca/ditulis (self._lock dipegang)"""
+        signature = self._file_signature()
+        if signature == self._signature:
+            return
+        data = {}
+        if signature is not None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except Exception as e:
+                print(f"[{self.label}] Gagal memuat '{self.path}': {e}")
+                return
+        self._data, self._signature = data, signature
+
+    @contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Isi terbaru (dict tidak pernah diubah di tempat, aman dibaca tanpa lock)"""
+        with self._lock:
+            self._refresh()
+            return self._data
+
+    def get(self, key: str) -> Optional[Dict]:
+        return self.snapshot().get(key)
+
+    def set(self, key: str, entry: Optional[Dict]) -> bool:
+        """
+        Tulis (atau hapus jika entry None) satu key, digabung dengan isi file terbaru
+
+        Returns:
+            False jika tidak ada yang berubah (hapus key yang tidak ada)
+        """
+        with self._lock, self._file_lock():
+            self._refresh()
+            if entry is None and key not in self._data:
+                return False
+            data = dict(self._data)
+            if entry is None:
+                del data[key]
+            else:
+                data[key] = entry
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self._data, self._signature = data, self._file_signature()
+        return True
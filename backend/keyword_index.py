@@ -0,0 +1,328 @@
+# keyword_index.py
+import heapq
+import math
+import os
+import pickle
+import re
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+KEYWORD_INDEX_PATH = "doc_keyword_index.pkl"
+
+# Sama dengan token_pattern default TfidfVectorizer
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+Term = Union[str, int]
+
+
+class InvertedIndex:
+    """
+    Inverted index untuk keyword search yang bisa di-update secara incremental.
+
+    - Tidak ada batas vocabulary; opsional hashed features (n_features) untuk menghemat memori
+    - Bobot chunk memakai skema lnc (log tf + cosine normalization) yang tidak bergantung
+      pada statistik global, jadi add/delete tidak mengubah impact chunk lain
+    - Bobot query memakai ltc (log tf x idf + cosine normalization); idf dihitung dari
+      document frequency yang disimpan bersama index
+
+    Top-k dihitung dengan threshold algorithm (gaya MaxScore): postings dibaca secara
+    round-robin dari impact terbesar, skor lengkap kandidat dihitung lewat random access,
+    dan pencarian berhenti begitu skor ke-k >= batas atas skor chunk yang belum terlihat.
+    Biaya query tumbuh dengan jumlah term query, bukan jumlah chunk.
+    """
+
+    VERSION = 1
+
+    def __init__(self, ngram_range: Tuple[int, int] = (1, 2), n_features: Optional[int] = None):
+        self.ngram_range = ngram_range
+        self.n_features = n_features
+        # term -> {doc_id: impact}
+        self.postings: Dict[Term, Dict[int, float]] = {}
+        # term -> jumlah chunk yang mengandung term
+        self.doc_freq: Dict[Term, int] = {}
+        # doc_id -> daftar term unik (untuk delete dan exact-match coverage)
+        self.doc_terms: Dict[int, List[Term]] = {}
+        # Cache postings terurut impact menurun, dibangun ulang lazily per term
+        self._sorted: Dict[Term, Tuple[np.ndarray, np.ndarray]] = {}
+
+    @property
+    def num_docs(self) -> int:
+        return len(self.doc_terms)
+
+    # === Analisis teks ===
+    def analyze(self, text: str) -> List[Term]:
+        """Tokenisasi (lowercase, unigram..n-gram), dengan hashing jika n_features diset"""
+        tokens = TOKEN_PATTERN.findall(text.lower())
+        min_n, max_n = self.ngram_range
+        terms = []
+        for n in range(min_n, max_n + 1):
+            for i in range(len(tokens) - n + 1):
+                terms.append(" ".join(tokens[i:i + n]))
+        return self._hash_terms(terms)
+
+    def tokens(self, text: str) -> List[Term]:
+        """Unigram saja, dalam bentuk key yang sama dengan postings"""
+        return self._hash_terms(TOKEN_PATTERN.findall(text.lower()))
+
+    def _hash_terms(self, terms: List[str]) -> List[Term]:
+        if self.n_features:
+            return [zlib.crc32(term.encode("utf-8")) % self.n_features for term in terms]
+        return terms
+
+    # === Update incremental ===
+    def add_document(self, doc_id: int, text: str):
+        """Tambah (atau ganti) satu chunk ke index"""
+        if doc_id in self.doc_terms:
+            self.remove_document(doc_id)
+
+        counts = Counter(self.analyze(text))
+        weights = {term: 1.0 + math.log(tf) for term, tf in counts.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+
+        for term, weight in weights.items():
+            self.postings.setdefault(term, {})[doc_id] = weight / norm
+            self.doc_freq[term] = self.doc_freq.get(term, 0) + 1
+            self._sorted.pop(term, None)
+        self.doc_terms[doc_id] = list(weights.keys())
+
+    def add_documents(self, texts: Iterable[str], start_id: int = 0):
+        """Tambah banyak chunk dengan doc_id berurutan mulai dari start_id"""
+        for offset, text in enumerate(texts):
+            self.add_document(start_id + offset, text)
+
+    def remove_document(self, doc_id: int) -> bool:
+        """Hapus chunk dari index, document frequency ikut diperbarui"""
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return False
+
+        for term in terms:
+            term_postings = self.postings.get(term)
+            if term_postings is not None:
+                term_postings.pop(doc_id, None)
+                if not term_postings:
+                    del self.postings[term]
+            df = self.doc_freq.get(term, 0) - 1
+            if df > 0:
+                self.doc_freq[term] = df
+            else:
+                self.doc_freq.pop(term, None)
+            self._sorted.pop(term, None)
+        return True
+
+    # === Query ===
+    def idf(self, term: Term) -> float:
+        """Smooth idf seperti TfidfVectorizer: ln((1 + N) / (1 + df)) + 1"""
+        return math.log((1 + self.num_docs) / (1 + self.doc_freq.get(term, 0))) + 1.0
+
+    def term_stats(self, terms: Iterable[Term]) -> Dict[Term, int]:
+        """Document frequency term yang ada di index (dijumlahkan router antar shard)"""
+        return {term: self.doc_freq[term] for term in terms if self.doc_freq.get(term)}
+
+    def query_weights(self, query: str, doc_freq: Optional[Dict[Term, int]] = None,
+                      num_docs: Optional[int] = None) -> Dict[Term, float]:
+        """
+        Bobot ltc untuk query: (1 + ln tf) x idf, dinormalisasi cosine
+
+        Args:
+            doc_freq, num_docs: Statistik dari luar (total semua shard) sebagai pengganti milik index ini;
+                bobot chunk (lnc) tidak bergantung statistik global, jadi skor shard tetap sebanding
+        """
+        if doc_freq is None:
+            counts = Counter(term for term in self.analyze(query) if term in self.postings)
+            weights = {term: (1.0 + math.log(tf)) * self.idf(term) for term, tf in counts.items()}
+        else:
+            counts = Counter(term for term in self.analyze(query) if doc_freq.get(term))
+            weights = {term: (1.0 + math.log(tf)) * (math.log((1 + num_docs) / (1 + doc_freq[term])) + 1.0)
+                       for term, tf in counts.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+        return {term: w / norm for term, w in weights.items()}
+
+    def _sorted_postings(self, term: Term) -> Tuple[np.ndarray, np.ndarray]:
+        cached = self._sorted.get(term)
+        if cached is None:
+            term_postings = self.postings[term]
+            doc_ids = np.fromiter(term_postings.keys(), dtype=np.int64, count=len(term_postings))
+            impacts = np.fromiter(term_postings.values(), dtype=np.float64, count=len(term_postings))
+            order = np.argsort(-impacts, kind="stable")
+            cached = (doc_ids[order], impacts[order])
+            self._sorted[term] = cached
+        return cached
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[int, float]]:
+        """
+        Cari top-k chunk untuk query
+
+        Returns:
+            List of (chunk_index, score) tuples, urut dari skor tertinggi
+        """
+        return self.search_weights(self.query_weights(query), top_k)
+
+    def search_weights(self, query_weights: Dict[Term, float], top_k: int = 10) -> List[Tuple[int, float]]:
+        """
+        Cari top-k chunk untuk query berbobot {term: weight}
+
+        Returns:
+            List of (chunk_index, score) tuples, urut dari skor tertinggi
+        """
+        terms = [(term, weight) for term, weight in query_weights.items()
+                 if weight > 0 and term in self.postings]
+        if not terms or top_k <= 0:
+            return []
+
+        lists = {term: self._sorted_postings(term) for term, _ in terms}
+
+        # Term dengan kontribusi maksimum terbesar dibaca lebih dulu
+        terms.sort(key=lambda tw: tw[1] * lists[tw[0]][1][0], reverse=True)
+
+        cursors = [0] * len(terms)
+        # Min-heap (score, -doc_id) berukuran top_k: skor seri dimenangkan chunk id terkecil, jadi
+        # top-k tidak bergantung urutan baca postings (shard dan satu index memilih chunk yang sama)
+        heap: List[Tuple[float, int]] = []
+        seen = set()
+
+        while True:
+            progressed = False
+            for i, (term, _) in enumerate(terms):
+                doc_ids, _ = lists[term]
+                if cursors[i] >= len(doc_ids):
+                    continue
+                doc_id = int(doc_ids[cursors[i]])
+                cursors[i] += 1
+                progressed = True
+
+                if doc_id in seen:
+                    continue
+                seen.add(doc_id)
+
+                score = sum(weight * self.postings[t].get(doc_id, 0.0) for t, weight in terms)
+                if len(heap) < top_k:
+                    heapq.heappush(heap, (score, -doc_id))
+                elif (score, -doc_id) > heap[0]:
+                    heapq.heapreplace(heap, (score, -doc_id))
+
+            if not progressed:
+                break
+
+            # Batas atas skor untuk chunk yang belum pernah terlihat
+            threshold = 0.0
+            for i, (term, weight) in enumerate(terms):
+                _, impacts = lists[term]
+                if cursors[i] < len(impacts):
+                    threshold += weight * impacts[cursors[i]]
+
+            # Chunk yang belum terlihat dengan skor == threshold masih bisa menang seri
+            if len(heap) == top_k and heap[0][0] > threshold:
+                break
+
+        return sorted(((-neg_id, score) for score, neg_id in heap if score > 0),
+                      key=lambda x: (-x[1], x[0]))
+
+    # === Persistence ===
+    def save(self, path: str = KEYWORD_INDEX_PATH):
+        """Simpan index (postings + document frequency) ke file pickle secara atomic"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({
+                "version": self.VERSION,
+                "ngram_range": self.ngram_range,
+                "n_features": self.n_features,
+                "postings": self.postings,
+                "doc_freq": self.doc_freq,
+                "doc_terms": self.doc_terms
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = KEYWORD_INDEX_PATH) -> "InvertedIndex":
+        """Load index dari file pickle"""
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+        if data.get("version") != cls.VERSION:
+            raise ValueError(f"Versi keyword index tidak didukung: {data.get('version')}")
+        index = cls(ngram_range=tuple(data["ngram_range"]), n_features=data["n_features"])
+        index.postings = data["postings"]
+        index.doc_freq = data["doc_freq"]
+        index.doc_terms = data["doc_terms"]
+        return index
+
+    @classmethod
+    def build(cls, chunks: List[str], **kwargs) -> "InvertedIndex":
+        """Bangun index baru dari seluruh chunks"""
+        index = cls(**kwargs)
+        index.add_documents(chunks)
+        return index
+
+    def stats(self) -> Dict:
+        """Statistik ukuran index"""
+        return {
+            "num_docs": self.num_docs,
+            "num_terms": len(self.postings),
+            "num_postings": sum(len(p) for p in self.postings.values()),
+            "hashed": bool(self.n_features)
+        }
+
+
+def load_or_build_keyword_index(chunks: List[str], path: str = KEYWORD_INDEX_PATH,
+                                n_features: Optional[int] = None) -> InvertedIndex:
+    """
+    Load keyword index dari disk jika konsisten dengan chunks, kalau tidak bangun ulang dan simpan.
+    Chunk baru (doc_id >= jumlah chunk di index) ditambahkan secara incremental.
+    """
+    index = None
+    if os.path.exists(path):
+        try:
+            index = InvertedIndex.load(path)
+            if index.doc_terms and max(index.doc_terms) >= len(chunks):
+                print(f"[KEYWORD] Index '{path}' tidak cocok dengan chunks, dibangun ulang")
+                index = None
+        except Exception as e:
+            print(f"[KEYWORD] Gagal memuat '{path}': {e}")
+            index = None
+
+    if index is None:
+        index = InvertedIndex(n_features=n_features)
+
+    next_id = max(index.doc_terms) + 1 if index.doc_terms else 0
+    if next_id < len(chunks):
+        index.add_documents(chunks[next_id:], start_id=next_id)
+        index.save(path)
+        print(f"[KEYWORD] {len(chunks) - next_id} chunk ditambahkan ke keyword index")
+
+    return index
+
+
+def load_keyword_index(chunks: List[str], path: str = KEYWORD_INDEX_PATH, samples: int = 3) -> InvertedIndex:
+    """
+    Keyword index untuk snapshot chunks di sisi query (hanya membaca, tidak pernah menyimpan).
+
+    Index ingest dibatasi ke id chunk snapshot (chunk yang di-index setelah snapshot dibuang,
+    chunk yang belum ada di file ditambahkan di memori). Jika beberapa chunk contoh tidak cocok
+    dengan term di file (mis. file dari compaction lain), index dibangun ulang dari chunks.
+    """
+    index = None
+    if os.path.exists(path):
+        try:
+            index = InvertedIndex.load(path)
+        except Exception as e:
+            print(f"[KEYWORD] Gagal memuat '{path}': {e}")
+
+    if index is not None:
+        for doc_id in [doc_id for doc_id in index.doc_terms if doc_id >= len(chunks)]:
+            index.remove_document(doc_id)
+        doc_ids = sorted(index.doc_terms)
+        picks = {doc_ids[int(i * (len(doc_ids) - 1) / max(samples - 1, 1))] for i in range(samples)} \
+            if doc_ids else set()
+        if any(set(index.analyze(chunks[doc_id])) != set(index.doc_terms[doc_id]) for doc_id in picks):
+            print(f"[KEYWORD] Index '{path}' tidak cocok dengan chunks, dibangun di memori")
+            index = None
+
+    if index is None:
+        return InvertedIndex.build(chunks)
+
+    next_id = max(index.doc_terms) + 1 if index.doc_terms else 0
+    index.add_documents(chunks[next_id:], start_id=next_id)
+    return index
@@ -0,0 +1,377 @@
+# llm.py
+import asyncio
+import concurrent.futures
+import os
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Dict, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MODEL_NAME = os.getenv("MODEL_NAME", "deepseek/deepseek-chat-v3-0324:free")
+EXTRA_HEADERS = {
+    "HTTP-Referer": "https://aiPintar.local",
+    "X-Title": "AI Pintar Document QA System",
+}
+
+# Status HTTP yang layak di-retry
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """Gagal mendapatkan respons dari LLM"""
+
+
+class LLMRetryableError(LLMError):
+    """Error sementara (timeout, koneksi, 429/5xx)"""
+
+
+class CircuitOpenError(LLMError):
+    """Circuit breaker terbuka: provider dianggap down, request langsung ditolak"""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker sederhana: closed -> open setelah failure_threshold kegagalan berturut-turut,
+    open -> half_open setelah reset_timeout, half_open -> closed jika satu request percobaan berhasil.
+    Request percobaan yang dibatalkan melepas slotnya (release); percobaan yang tidak pernah selesai
+    dianggap hilang setelah reset_timeout sehingga breaker tidak terkunci di half_open.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._half_open_in_flight = False
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    return False
+                self.state = "half_open"
+                self._half_open_in_flight = False
+            if self.state == "half_open":
+                now = time.monotonic()
+                if self._half_open_in_flight and now - self._probe_started < self.reset_timeout:
+                    self.rejected += 1
+                    return False
+                self._half_open_in_flight = True
+                self._probe_started = now
+            return True
+
+    def release(self):
+        """Request dibatalkan sebelum ada hasil: slot percobaan half_open dilepas, state tidak berubah"""
+        with self._lock:
+            self._half_open_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._half_open_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+            self._half_open_in_flight = False
+
+
+class LatencyTracker:
+    """Menyimpan latency terakhir (sliding window) untuk persentil"""
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class LLMGateway:
+    """
+    Gateway ke provider OpenAI-compatible (OpenRouter):
+    - satu httpx.AsyncClient dengan connection pool dan keep-alive, di event loop sendiri
+    - retry terbatas dengan exponential backoff + jitter
+    - hedged request opsional: duplikat dikirim jika primary belum selesai setelah p95 latency
+    - circuit breaker agar gagal cepat saat provider down
+    - metrik latency per attempt
+    """
+
+    def __init__(self, base_url: str, api_key: str, model: str = MODEL_NAME,
+                 timeout: float = 30.0, max_retries: int = 2,
+                 backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 hedge: bool = True, hedge_min_samples: int = 20, hedge_min_delay: float = 0.2,
+                 max_connections: int = 32, breaker: Optional[CircuitBreaker] = None):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.max_connections = max_connections
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyTracker()
+
+        self._attempt_latency = defaultdict(LatencyTracker)
+        self._counters = defaultdict(int)
+        self._metrics_lock = threading.Lock()
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+
+    # === Event loop & connection pool ===
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            with self._loop_lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    thread = threading.Thread(target=loop.run_forever, name="llm-gateway", daemon=True)
+                    thread.start()
+                    self._loop = loop
+        return self._loop
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(self.timeout, connect=min(5.0, self.timeout)),
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections,
+                                    keepalive_expiry=60.0),
+                headers={"Authorization": f"Bearer {self.api_key}", **EXTRA_HEADERS}
+            )
+        return self._client
+
+    # === API ===
+    def complete(self, system_prompt: str, user_prompt: str, max_tokens: Optional[int] = None) -> str:
+        """Versi sinkron (dipakai dari thread biasa, misalnya ask_question)"""
+        return self.submit(system_prompt, user_prompt, max_tokens).result()
+
+    def submit(self, system_prompt: str, user_prompt: str,
+               max_tokens: Optional[int] = None) -> concurrent.futures.Future:
+        """Jadwalkan completion di event loop gateway (bisa di-await dari loop lain via asyncio.wrap_future)"""
+        return asyncio.run_coroutine_threadsafe(
+            self.acomplete(system_prompt, user_prompt, max_tokens), self._ensure_loop())
+
+    async def acomplete(self, system_prompt: str, user_prompt: str, max_tokens: Optional[int] = None) -> str:
+        """Chat completion dengan retry, hedging dan circuit breaker"""
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ]
+        }
+        if max_tokens:
+            payload["max_tokens"] = max_tokens
+
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                self._count("circuit_rejected")
+                raise CircuitOpenError("Circuit breaker terbuka: provider LLM sedang tidak tersedia")
+            try:
+                content = await self._hedged(payload)
+                self.breaker.record_success()
+                return content
+            except LLMRetryableError as e:
+                self.breaker.record_failure()
+                if attempt >= self.max_retries:
+                    raise LLMError(f"LLM gagal setelah {attempt + 1} percobaan: {e}") from e
+                self._count("retries")
+                # Exponential backoff dengan full jitter
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+                await asyncio.sleep(delay)
+            except LLMError:
+                self.breaker.record_success()  # Error 4xx: provider hidup, request yang salah
+                raise
+            except asyncio.CancelledError:
+                # Mis. client /ask/batch disconnect: bukan bukti provider hidup atau mati
+                self.breaker.release()
+                raise
+            except Exception as e:
+                self.breaker.record_failure()
+                raise LLMError(f"Respons LLM tidak valid: {e}") from e
+
+    async def _hedged(self, payload: Dict) -> str:
+        primary = asyncio.ensure_future(self._attempt(payload, "primary"))
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is None:
+            return await primary
+
+        done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+        if done:
+            return primary.result()
+
+        self._count("hedges_launched")
+        hedge = asyncio.ensure_future(self._attempt(payload, "hedge"))
+        pending = {primary, hedge}
+        last_error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._count("hedges_won")
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _hedge_delay(self) -> Optional[float]:
+        if not self.hedge or len(self.latency.samples) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, self.latency.percentile(0.95))
+
+    async def _attempt(self, payload: Dict, kind: str) -> str:
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            response = await self._get_client().post("/chat/completions", json=payload)
+            if response.status_code in RETRYABLE_STATUS:
+                outcome = f"http_{response.status_code}"
+                raise LLMRetryableError(f"HTTP {response.status_code}: {response.text[:200]}")
+            if response.status_code >= 400:
+                outcome = f"http_{response.status_code}"
+                raise LLMError(f"HTTP {response.status_code}: {response.text[:200]}")
+            content = response.json()["choices"][0]["message"]["content"]
+            outcome = "ok"
+            self.latency.record(time.perf_counter() - start)
+            return content
+        except httpx.TimeoutException as e:
+            outcome = "timeout"
+            raise LLMRetryableError(f"Timeout: {e}") from e
+        except httpx.TransportError as e:
+            outcome = "connection_error"
+            raise LLMRetryableError(f"Koneksi gagal: {e}") from e
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._metrics_lock:
+                self._attempt_latency[f"{kind}:{outcome}"].record(elapsed)
+                self._counters[f"attempts_{kind}"] += 1
+                self._counters[f"outcome_{outcome}"] += 1
+
+    def _count(self, name: str):
+        with self._metrics_lock:
+            self._counters[name] += 1
+
+    def metrics(self) -> Dict:
+        """Counter dan latency per attempt (p50/p95/p99 dalam ms)"""
+        with self._metrics_lock:
+            latencies = {
+                key: {
+                    "count": len(tracker.samples),
+                    "p50_ms": tracker.percentile(0.50) * 1000,
+                    "p95_ms": tracker.percentile(0.95) * 1000,
+                    "p99_ms": tracker.percentile(0.99) * 1000
+                }
+                for key, tracker in self._attempt_latency.items() if tracker.samples
+            }
+            counters = dict(self._counters)
+        return {
+            "counters": counters,
+            "attempt_latency": latencies,
+            "circuit_breaker": {
+                "state": self.breaker.state,
+                "consecutive_failures": self.breaker.consecutive_failures,
+                "rejected": self.breaker.rejected
+            }
+        }
+
+    def close(self):
+        if self._loop is not None and self._client is not None:
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+            self._client = None
+
+
+_gateway: Optional[LLMGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway() -> LLMGateway:
+    """LLMGateway bersama, dikonfigurasi dari environment"""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = LLMGateway(
+                    base_url=os.getenv("OPENAI_BASE_URL", "https://openrouter.ai/api/v1"),
+                    api_key=os.getenv("OPENAI_API_KEY", "Your API key here"),
+                    timeout=float(os.getenv("LLM_TIMEOUT", "30")),
+                    max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+                    hedge=os.getenv("LLM_HEDGE", "true").lower() == "true",
+                    max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "32")),
+                    breaker=CircuitBreaker(
+                        failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+                        reset_timeout=float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+                    )
+                )
+    return _gateway
+
+
+class StubLLM:
+    """
+    LLM lokal deterministik untuk testing dan benchmark (tanpa network).
+    Mengembalikan potongan awal user prompt dan menghitung jumlah panggilan.
+    """
+
+    def __init__(self, max_words: int = 40):
+        self.max_words = max_words
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, system_prompt: str, user_prompt: str, max_tokens: Optional[int] = None) -> str:
+        with self._lock:
+            self.calls += 1
+        words = user_prompt.split()
+        return " ".join(words[:self.max_words])
+
+
+_stub_llm = StubLLM()
+
+
+def chat_completion(system_prompt: str, user_prompt: str, max_tokens: Optional[int] = None) -> str:
+    """
+    Kirim satu chat completion (system + user) lewat LLMGateway dan kembalikan teks jawaban.
+    Set LLM_BACKEND=stub untuk memakai StubLLM lokal.
+    """
+    if os.getenv("LLM_BACKEND", "openai") == "stub":
+        return _stub_llm(system_prompt, user_prompt, max_tokens)
+    return get_gateway().complete(system_prompt, user_prompt, max_tokens)
+
+
+async def achat_completion(system_prompt: str, user_prompt: str, max_tokens: Optional[int] = None) -> str:
+    """Versi async chat_completion untuk dipanggil dari event loop lain (misalnya endpoint FastAPI)"""
+    if os.getenv("LLM_BACKEND", "openai") == "stub":
+        return _stub_llm(system_prompt, user_prompt, max_tokens)
+    return await asyncio.wrap_future(get_gateway().submit(system_prompt, user_prompt, max_tokens))
@@ -0,0 +1,411 @@
+# loadtest.py
+"""
+Load test HTTP untuk backend FastAPI, sepenuhnya lokal (tanpa network).
+
+Default-nya menyiapkan semuanya sendiri di satu mesin:
+1. Korpus perjanjian sintetis + index di folder kerja (synthetic_corpus.py / benchmark.py)
+2. fake_llm_server.py dengan distribusi latency yang bisa diatur
+3. Backend (uvicorn main:app) dengan CWD folder kerja dan OPENAI_BASE_URL ke fake LLM
+
+Lalu menjalankan closed-loop user virtual bertahap (--users 1,4,16,...) dengan campuran jenis
+pertanyaan dan upload, dan melaporkan throughput, latency p50/p90/p99, error rate, serta lag
+event loop (generator sendiri dan server, dari histogram /metrics).
+
+    python loadtest.py --users 1,4,16,64 --duration 30 --llm-latency-ms 800
+    python loadtest.py --target http://127.0.0.1:8000 --owners-from doc_chunks.pkl
+"""
+import argparse
+import asyncio
+import json
+import os
+import pickle
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+from benchmark import QUESTION_TEMPLATES, _git_commit, bench_ingestion
+from synthetic_corpus import contract_lines, generate_corpus, write_contract_pdf
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MIX = ("define_tanggal=3,define_luas_lokasi=2,define_luas_area_rambah=1,define_pasal=2,"
+               "define_rangkuman=1,free=3,upload=0,search=0,search_global=0")
+# Retrieval tanpa LLM (/search): per owner dan di seluruh corpus
+SEARCH_KINDS = ("search", "search_global")
+LAG_METRIC = "docqa_event_loop_lag_seconds"
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """'define_tanggal=3,free=1,upload=0.5' → bobot per jenis request"""
+    mix = {}
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind != "upload" and kind not in QUESTION_TEMPLATES and kind not in SEARCH_KINDS:
+            raise ValueError(f"Jenis request tidak dikenal: '{kind}' "
+                             f"(pilihan: {', '.join([*QUESTION_TEMPLATES, 'upload', *SEARCH_KINDS])})")
+        if float(weight or 1) > 0:
+            mix[kind] = float(weight or 1)
+    if not mix:
+        raise ValueError("Mix kosong, minimal satu jenis harus berbobot > 0")
+    return mix
+
+
+def load_owners(chunks_path: str) -> List[str]:
+    with open(chunks_path, "rb") as f:
+        metadatas = pickle.load(f)["metadatas"]
+    return sorted({meta["owner"] for meta in metadatas if isinstance(meta, dict) and "owner" in meta})
+
+
+def percentiles_ms(samples: List[float]) -> Dict:
+    if not samples:
+        return {"count": 0}
+    values = np.asarray(samples) * 1000
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {"count": len(samples), "mean_ms": round(float(values.mean()), 2), "p50_ms": round(float(p50), 2),
+            "p90_ms": round(float(p90), 2), "p99_ms": round(float(p99), 2),
+            "max_ms": round(float(values.max()), 2)}
+
+
+# === Lag event loop server (histogram dari /metrics) ===
+def parse_lag_histogram(text: str) -> Tuple[Dict[float, float], float, float]:
+    buckets, total, count = {}, 0.0, 0.0
+    for line in text.splitlines():
+        if not line.startswith(LAG_METRIC):
+            continue
+        name, value = line.rsplit(" ", 1)
+        if name.startswith(f"{LAG_METRIC}_bucket"):
+            le = re.search(r'le="([^"]+)"', name).group(1)
+            buckets[float("inf") if le == "+Inf" else float(le)] = float(value)
+        elif name.startswith(f"{LAG_METRIC}_sum"):
+            total = float(value)
+        elif name.startswith(f"{LAG_METRIC}_count"):
+            count = float(value)
+    return buckets, total, count
+
+
+def lag_between(before: str, after: str) -> Optional[Dict]:
+    """Mean dan batas atas bucket p99 lag server untuk observasi di antara dua scrape"""
+    buckets_before, sum_before, count_before = parse_lag_histogram(before)
+    buckets_after, sum_after, count_after = parse_lag_histogram(after)
+    count = count_after - count_before
+    if count <= 0:
+        return None
+    p99_le = None
+    for bound in sorted(buckets_after):
+        if buckets_after[bound] - buckets_before.get(bound, 0.0) >= 0.99 * count:
+            p99_le = bound
+            break
+    return {"samples": int(count), "mean_ms": round((sum_after - sum_before) / count * 1000, 2),
+            "p99_le_ms": None if p99_le in (None, float("inf")) else p99_le * 1000}
+
+
+async def scrape_metrics(client: httpx.AsyncClient) -> str:
+    try:
+        response = await client.get("/metrics")
+        return response.text if response.status_code == 200 else ""
+    except httpx.HTTPError:
+        return ""
+
+
+# === Generator ===
+class StepStats:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, Dict[str, int]] = {}
+        self.uploaded: List[str] = []
+
+    def record(self, kind: str, latency: float, error: Optional[str] = None):
+        if error is None:
+            self.latencies.setdefault(kind, []).append(latency)
+        else:
+            per_kind = self.errors.setdefault(kind, {})
+            per_kind[error] = per_kind.get(error, 0) + 1
+
+
+class LoadGenerator:
+    def __init__(self, base_url: str, owners: List[str], mix: Dict[str, float], upload_pdfs: List[bytes],
+                 timeout: float = 60.0, think_time: float = 0.0, seed: int = 42):
+        self.base_url = base_url.rstrip("/")
+        self.owners = owners
+        self.kinds = list(mix)
+        self.weights = [mix[kind] for kind in self.kinds]
+        self.upload_pdfs = upload_pdfs
+        self.timeout = timeout
+        self.think_time = think_time
+        self.rng = random.Random(seed)
+        self.upload_counter = 0
+
+    def _question(self, kind: str) -> str:
+        return QUESTION_TEMPLATES[kind].format(owner=self.rng.choice(self.owners), pasal=self.rng.randint(1, 12))
+
+    async def _one_request(self, client: httpx.AsyncClient, kind: str, stats: StepStats):
+        started = time.perf_counter()
+        try:
+            if kind == "upload":
+                self.upload_counter += 1
+                pdf = self.upload_pdfs[self.upload_counter % len(self.upload_pdfs)]
+                files = {"file": (f"loadtest_{self.upload_counter}.pdf", pdf, "application/pdf")}
+                response = await client.post("/upload", files=files)
+            elif kind in SEARCH_KINDS:
+                owner = self.rng.choice(self.owners) if kind == "search" else None
+                response = await client.post("/search", json={"query": self._question("free"), "owner": owner})
+            else:
+                response = await client.post("/ask", json={"question": self._question(kind)})
+        except httpx.TimeoutException:
+            stats.record(kind, 0.0, "timeout")
+            return
+        except httpx.HTTPError as e:
+            stats.record(kind, 0.0, type(e).__name__)
+            return
+
+        latency = time.perf_counter() - started
+        if response.status_code != 200:
+            stats.record(kind, latency, str(response.status_code))
+            return
+        if kind == "upload":
+            body = response.json()
+            stats.uploaded.append(f"{body['file_id']}_{body['filename']}")
+        stats.record(kind, latency)
+
+    async def _virtual_user(self, client: httpx.AsyncClient, deadline: float, stats: StepStats):
+        while time.perf_counter() < deadline:
+            kind = self.rng.choices(self.kinds, self.weights)[0]
+            await self._one_request(client, kind, stats)
+            if self.think_time:
+                await asyncio.sleep(self.rng.expovariate(1.0 / self.think_time))
+
+    @staticmethod
+    async def _loop_lag_probe(samples: List[float], interval: float = 0.01):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            samples.append(max(0.0, time.perf_counter() - started - interval))
+
+    async def run_step(self, users: int, duration: float, warmup: float = 0.0) -> Dict:
+        limits = httpx.Limits(max_connections=users + 2, max_keepalive_connections=users + 2)
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=limits) as client:
+            warmup_stats = StepStats()
+            if warmup:
+                await asyncio.gather(*(self._virtual_user(client, time.perf_counter() + warmup, warmup_stats)
+                                       for _ in range(users)))
+
+            metrics_before = await scrape_metrics(client)
+            stats = StepStats()
+            client_lag: List[float] = []
+            probe = asyncio.create_task(self._loop_lag_probe(client_lag))
+            started = time.perf_counter()
+            await asyncio.gather(*(self._virtual_user(client, started + duration, stats) for _ in range(users)))
+            elapsed = time.perf_counter() - started
+            probe.cancel()
+            metrics_after = await scrape_metrics(client)
+
+            # Upload load test tidak ikut menumpuk di folder uploads server
+            for filename in warmup_stats.uploaded + stats.uploaded:
+                try:
+                    await client.delete(f"/files/{filename}")
+                except httpx.HTTPError:
+                    pass
+
+        completed = sum(len(values) for values in stats.latencies.values())
+        failed = sum(sum(per_kind.values()) for per_kind in stats.errors.values())
+        all_latencies = [value for values in stats.latencies.values() for value in values]
+        return {
+            "users": users,
+            "duration_seconds": round(elapsed, 2),
+            "requests": completed + failed,
+            "throughput_rps": round(completed / elapsed, 2),
+            "error_rate": round(failed / (completed + failed), 4) if completed + failed else 0.0,
+            "latency": percentiles_ms(all_latencies),
+            "per_kind": {kind: percentiles_ms(values) for kind, values in stats.latencies.items()},
+            "errors": stats.errors,
+            "client_loop_lag": percentiles_ms(client_lag),
+            "server_loop_lag": lag_between(metrics_before, metrics_after) if metrics_after else None,
+        }
+
+
+# === Stack lokal: korpus + fake LLM + backend ===
+def prepare_workdir(workdir: str, docs: int, seed: int) -> List[str]:
+    """Korpus + index sintetis di workdir (dipakai ulang jika sudah ada); return daftar owner"""
+    chunks_path = os.path.join(workdir, "doc_chunks.pkl")
+    if not os.path.exists(chunks_path):
+        pdf_dir = os.path.join(workdir, "pdf")
+        generate_corpus(pdf_dir, docs=docs, seed=seed)
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            bench_ingestion(pdf_dir, batch_size=64, trace_memory=False)
+        finally:
+            os.chdir(cwd)
+        print(f"[LOADTEST] Korpus {docs} dokumen dan index dibuat di '{workdir}'")
+    return load_owners(chunks_path)
+
+
+def wait_until_ready(url: str, process: subprocess.Popen, timeout: float):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Proses untuk {url} berhenti (exit {process.returncode})")
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    raise TimeoutError(f"{url} tidak siap dalam {timeout:.0f} detik")
+
+
+def _stop_process(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+@contextmanager
+def fake_llm_process(args, log):
+    """fake_llm_server.py di args.llm_port; dihentikan saat keluar"""
+    fake_llm = subprocess.Popen(
+        [sys.executable, os.path.join(BACKEND_DIR, "fake_llm_server.py"), "--port", str(args.llm_port),
+         "--latency-ms", str(args.llm_latency_ms), "--distribution", args.llm_distribution,
+         "--spread", str(args.llm_spread), "--error-rate", str(args.llm_error_rate)],
+        stdout=log, stderr=subprocess.STDOUT)
+    try:
+        wait_until_ready(f"http://127.0.0.1:{args.llm_port}/admin/stats", fake_llm, 30)
+        yield fake_llm
+    finally:
+        _stop_process(fake_llm)
+
+
+@contextmanager
+def backend_process(workdir: str, args, log, command: Optional[List[str]] = None,
+                    extra_env: Optional[Dict[str, str]] = None):
+    """
+    Backend dengan CWD workdir dan OPENAI_BASE_URL ke fake LLM; dihentikan saat keluar.
+
+    Args:
+        command: Default uvicorn main:app satu proses (serve.py untuk multi-worker)
+    """
+    env = {**os.environ,
+           "OPENAI_BASE_URL": f"http://127.0.0.1:{args.llm_port}/v1",
+           "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "loadtest"),
+           "LLM_BACKEND": "openai",
+           "PYTHONPATH": os.pathsep.join(filter(None, [BACKEND_DIR, os.getenv("PYTHONPATH")])),
+           **(extra_env or {})}
+    command = command or [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+                          "--port", str(args.port), "--log-level", "warning"]
+    backend = subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        wait_until_ready(f"http://127.0.0.1:{args.port}/", backend, args.startup_timeout)
+        yield backend
+    finally:
+        _stop_process(backend)
+
+
+@contextmanager
+def local_stack(workdir: str, args):
+    """Jalankan fake LLM dan backend sebagai subprocess; dihentikan saat keluar"""
+    with open(os.path.join(workdir, "loadtest_server.log"), "ab") as log, \
+            fake_llm_process(args, log), backend_process(workdir, args, log):
+        yield f"http://127.0.0.1:{args.port}"
+
+
+def upload_payloads(count: int = 4, seed: int = 7) -> List[bytes]:
+    rng = random.Random(seed)
+    payloads = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(count):
+            lines, _ = contract_lines(f"Loadtest Owner {i}", rng, num_pasal=6)
+            path = os.path.join(tmp, f"{i}.pdf")
+            write_contract_pdf(path, lines, rng)
+            with open(path, "rb") as f:
+                payloads.append(f.read())
+    return payloads
+
+
+def run_ramp(base_url: str, owners: List[str], args) -> List[Dict]:
+    mix = parse_mix(args.mix)
+    generator = LoadGenerator(base_url, owners, mix, upload_payloads() if "upload" in mix else [],
+                              timeout=args.timeout, think_time=args.think_time, seed=args.seed)
+    steps = []
+    for users in [int(value) for value in args.users.split(",")]:
+        step = asyncio.run(generator.run_step(users, args.duration, args.warmup))
+        steps.append(step)
+        server_lag = step["server_loop_lag"] or {}
+        print(f"[LOADTEST] users={users:4d} rps={step['throughput_rps']:8.2f} "
+              f"p50={step['latency'].get('p50_ms', 0):8.1f}ms p99={step['latency'].get('p99_ms', 0):8.1f}ms "
+              f"err={step['error_rate']:.2%} "
+              f"lag client p99={step['client_loop_lag'].get('p99_ms', 0):.1f}ms "
+              f"server mean={server_lag.get('mean_ms', '-')}ms")
+        if step["client_loop_lag"].get("p99_ms", 0) > 50:
+            print("[LOADTEST] Peringatan: event loop generator lambat, hasil step ini dibatasi oleh client")
+    return steps
+
+
+def max_users_within_slo(steps: List[Dict], p99_ms: float, max_error_rate: float) -> Optional[int]:
+    best = None
+    for step in steps:
+        if step["latency"].get("p99_ms", float("inf")) > p99_ms or step["error_rate"] > max_error_rate:
+            break
+        best = step["users"]
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test HTTP backend dengan fake LLM lokal")
+    parser.add_argument("--target", default=None,
+                        help="URL backend yang sudah berjalan; default: jalankan stack lokal sendiri")
+    parser.add_argument("--owners-from", default="doc_chunks.pkl", help="Sumber nama owner untuk --target")
+    parser.add_argument("--users", default="1,2,4,8,16,32", help="Jumlah user virtual per step")
+    parser.add_argument("--duration", type=float, default=20.0, help="Detik per step")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Detik warmup per step (tidak diukur)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Bobot jenis request, termasuk 'upload'")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Rata-rata jeda antar request per user")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--slo-p99-ms", type=float, default=5000.0)
+    parser.add_argument("--slo-error-rate", type=float, default=0.01)
+    parser.add_argument("--output", default="loadtest_results.json")
+    # Stack lokal
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "docqa_loadtest"))
+    parser.add_argument("--docs", type=int, default=50)
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--startup-timeout", type=float, default=180.0)
+    parser.add_argument("--llm-port", type=int, default=8089)
+    parser.add_argument("--llm-latency-ms", type=float, default=500.0)
+    parser.add_argument("--llm-distribution", default="lognormal",
+                        choices=["fixed", "uniform", "exponential", "lognormal"])
+    parser.add_argument("--llm-spread", type=float, default=0.5)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    if args.target:
+        steps = run_ramp(args.target, load_owners(args.owners_from), args)
+    else:
+        os.makedirs(args.workdir, exist_ok=True)
+        owners = prepare_workdir(args.workdir, args.docs, args.seed)
+        with local_stack(args.workdir, args) as base_url:
+            steps = run_ramp(base_url, owners, args)
+
+    results = {
+        "meta": {"timestamp": datetime.now().isoformat(), "git_commit": _git_commit(),
+                 "python": platform.python_version(), "platform": platform.platform(),
+                 "params": {key: value for key, value in vars(args).items() if key != "output"}},
+        "max_users_within_slo": max_users_within_slo(steps, args.slo_p99_ms, args.slo_error_rate),
+        "steps": steps,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"[LOADTEST] Maks user dalam SLO (p99 <= {args.slo_p99_ms:.0f}ms, error <= {args.slo_error_rate:.0%}): "
+          f"{results['max_users_within_slo']}")
+    print(f"[LOADTEST] Hasil disimpan ke '{args.output}'")
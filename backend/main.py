@@ -1,6 +1,6 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from pydantic import BaseModel
 from typing import List, Optional
 import os
@@ -9,17 +9,49 @@ import shutil
 from pathlib import Path
 import logging
 import uuid
+import json
+import asyncio
+import time
+from datetime import datetime
 
-# Import fungsi dari ask.py
-from ask import ask_question
+from starlette.concurrency import run_in_threadpool
 
-# Import background task manager
+# Import background task manager (lebih dulu: compaction yang terputus diselesaikan sebelum ask.py memuat index)
 from background_tasks import task_manager, TaskStatus
 
+# Import fungsi dari ask.py
+import ask
+from ask import ask_question, ask_batch, fact_store, llm_gateway, inflight_questions
+from doc_catalog import HashingReader, pdf_page_count
+import serialization
+from metrics import REGISTRY, REQUESTS_TOTAL, CONTENT_TYPE, monitor_event_loop_lag
+from tracing import run_traced, should_profile
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Worker ingest + compactor hanya di satu proses (serve.py: worker pertama); worker lain hanya query
+RUN_BACKGROUND_WORKERS = os.getenv("RUN_BACKGROUND_WORKERS", "1").lower() in ("1", "true", "yes")
+# Interval cek tombstone/compaction dari proses lain (0 = mati; serve.py mengaktifkan saat workers > 1)
+CORPUS_SYNC_SECONDS = float(os.getenv("CORPUS_SYNC_SECONDS", "0"))
+
+def _reload_query_corpus(ranges=None):
+    ask.reload_corpus(task_manager.catalog.tombstone_ranges())
+
+def _append_query_corpus(start, new_chunks, new_metadatas, embeddings):
+    # Index di-mmap atau snapshot tidak sejajar dengan chunk id worker: muat ulang dari disk
+    if not ask.append_chunks(start, new_chunks, new_metadatas, embeddings):
+        _reload_query_corpus()
+
+# Chunk dokumen yang dihapus (tombstone) langsung disembunyikan dari query; compaction mengganti snapshot
+ask.mark_deleted(task_manager.catalog.tombstone_ranges())
+task_manager.tombstone_listeners.append(ask.mark_deleted)
+# Dengan FAISS_MMAP index hasil compaction dibaca ulang dari file (tetap di-mmap), bukan disalin di heap
+task_manager.compaction_listeners.append(_reload_query_corpus if ask.FAISS_MMAP else ask.apply_compaction)
+# Upload yang selesai di-index langsung bisa ditanyakan/dicari tanpa restart
+task_manager.index_listeners.append(_append_query_corpus)
+
 app = FastAPI(
     title="DocumentAI Backend",
     description="Backend API untuk sistem tanya jawab dokumen",
@@ -43,13 +75,142 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def start_event_loop_monitor():
+    # Simpan referensi task agar tidak di-garbage-collect
+    app.state.loop_lag_monitor = asyncio.create_task(
+        monitor_event_loop_lag(float(os.getenv("EVENT_LOOP_LAG_INTERVAL", "0.05"))))
+
+@app.on_event("startup")
+async def start_background_workers():
+    # Di startup (bukan saat import) agar serve.py bisa fork setelah import tanpa thread yang hidup
+    if RUN_BACKGROUND_WORKERS:
+        await run_in_threadpool(task_manager.start)
+    elif CORPUS_SYNC_SECONDS > 0:
+        app.state.corpus_sync = asyncio.create_task(_sync_query_corpus(CORPUS_SYNC_SECONDS))
+
+def _catalog_versions():
+    return task_manager.catalog.corpus_version(), task_manager.catalog.index_version()
+
+async def _sync_query_corpus(interval: float):
+    """
+    Ikuti perubahan dari proses yang menjalankan worker: tombstone baru disembunyikan,
+    chunk id yang bergeser (compaction/prune) atau upload yang selesai di-index (index_version)
+    → index dan chunks dimuat ulang dari disk.
+    """
+    versions = await run_in_threadpool(_catalog_versions)
+    tombstones = None
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            current = await run_in_threadpool(_catalog_versions)
+            if current != versions:
+                await run_in_threadpool(_reload_query_corpus)
+                versions, tombstones = current, None
+                logger.info(f"Query corpus reloaded (corpus version {current[0]}, index version {current[1]}, "
+                            f"{len(ask.chunks)} chunks)")
+                continue
+            ranges = await run_in_threadpool(task_manager.catalog.tombstone_ranges)
+            if ranges != tombstones:
+                await run_in_threadpool(ask.mark_deleted, ranges)
+                tombstones = ranges
+        except Exception as e:
+            # Mis. file sedang ditulis ulang (index/chunks belum sejajar): dicoba lagi interval berikutnya
+            logger.warning(f"Corpus sync failed: {e}")
+
+@app.middleware("http")
+async def count_requests(request: Request, call_next):
+    response = await call_next(request)
+    # Pakai path template route (bukan path mentah) agar label tidak meledak per filename/task id
+    route = request.scope.get("route")
+    REQUESTS_TOTAL.inc(getattr(route, "path", "unmatched"), str(response.status_code))
+    return response
+
+# === Metrik yang dihitung saat /metrics di-scrape ===
+def _cache_requests():
+    facts = fact_store.stats()["total"]
+    flights = inflight_questions.stats()
+    owner_cache = ask.get_owner_retrieval.cache_info()
+    return {
+        ("facts", "hit"): facts["hits"],
+        ("facts", "miss"): facts["misses"] + facts["low_confidence"],
+        ("singleflight", "hit"): flights["coalesced"],
+        ("singleflight", "miss"): flights["leaders"],
+        ("owner_retrieval", "hit"): owner_cache.hits,
+        ("owner_retrieval", "miss"): owner_cache.misses,
+    }
+
+def _ingest_tasks():
+    counts = task_manager.queue.counts()
+    return {(status,): counts[status] for status in (TaskStatus.PENDING, TaskStatus.PROCESSING)}
+
+def _index_sizes():
+    return {
+        ("query_vectors",): ask.index.ntotal,
+        ("query_chunks",): len(ask.chunks),
+        ("owners",): len(ask.all_owners),
+        ("ingest_vectors",): task_manager.index.ntotal if task_manager.index is not None else 0,
+        ("keyword_terms",): len(task_manager.keyword_index.postings),
+        ("summaries",): len(ask.summary_store),
+        ("fact_owners",): fact_store.stats()["owners"],
+        ("catalog_documents",): task_manager.catalog.stats()["documents"],
+        ("tombstoned_chunks",): len(ask.corpus.deleted),
+    }
+
+REGISTRY.callback("docqa_cache_requests_total", "Lookup cache per hasil (hit/miss)",
+                  _cache_requests, ["cache", "result"], metric_type="counter")
+REGISTRY.callback("docqa_queue_depth", "Task ingest yang menunggu/sedang diproses", _ingest_tasks, ["status"])
+REGISTRY.callback("docqa_inflight_questions", "Pertanyaan unik yang sedang diproses (single-flight)",
+                  lambda: inflight_questions.stats()["in_flight"])
+REGISTRY.callback("docqa_index_size", "Ukuran index dan store", _index_sizes, ["component"])
+REGISTRY.callback("docqa_llm_events_total", "Event LLM gateway (request, retry, hedge, error, ...)",
+                  lambda: {(event,): count for event, count in llm_gateway.metrics()["counters"].items()},
+                  ["event"], metric_type="counter")
+REGISTRY.callback("docqa_llm_circuit_open", "1 jika circuit breaker LLM tidak closed",
+                  lambda: 0 if llm_gateway.breaker.state == "closed" else 1)
+
 # Pydantic models
 class QuestionRequest(BaseModel):
     question: str
+    debug: bool = False  # True: sertakan breakdown waktu per tahap dan kandidat chunk
 
 class QuestionResponse(BaseModel):
     answer: str
     status: str
+    debug: Optional[dict] = None
+
+class BatchQuestionItem(BaseModel):
+    question: str
+    owner: Optional[str] = None  # default: dideteksi dari pertanyaan
+    id: Optional[str] = None
+
+class BatchQuestionRequest(BaseModel):
+    questions: List[BatchQuestionItem]
+    max_concurrency: Optional[int] = None  # default: BATCH_LLM_CONCURRENCY
+
+class SearchRequest(BaseModel):
+    query: str
+    owner: Optional[str] = None  # None = cari di seluruh corpus
+    top_k: int = 5
+    type: Optional[str] = None  # filter metadata type: tanggal | pasal | umum
+    pasal: Optional[int] = None  # filter nomor pasal
+    include_text: bool = True
+    expand: bool = False  # True: query diperluas (QueryExpander) lalu digabung RRF; hanya pencarian global tanpa shard
+    stream: bool = False  # True: satu hit per item stream (NDJSON / msgpack berurutan)
+
+class BatchSearchItem(BaseModel):
+    query: str
+    owner: Optional[str] = None
+    id: Optional[str] = None
+
+class BatchSearchRequest(BaseModel):
+    queries: List[BatchSearchItem]
+    top_k: int = 5
+    type: Optional[str] = None
+    pasal: Optional[int] = None
+    include_text: bool = True
+    expand: bool = False
+    stream: bool = False  # True: satu hasil query per item stream, dikirim begitu grupnya selesai
 
 class HealthResponse(BaseModel):
     status: str
@@ -58,6 +219,10 @@ class HealthResponse(BaseModel):
 # Directory untuk file uploads
 UPLOAD_DIR = Path("uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
+# File yang sudah ada sebelum katalog dokumen dipakai dicatat sekali saat start
+_adopted = task_manager.catalog.adopt_upload_dir(str(UPLOAD_DIR))
+if _adopted:
+    logger.info(f"Document catalog: adopted {_adopted} existing upload(s)")
 
 @app.get("/", response_model=HealthResponse)
 async def health_check():
@@ -87,9 +252,8 @@ async def upload_file(file: UploadFile = File(...)):
         filename = f"{file_id}_{file.filename}"
         file_path = UPLOAD_DIR / filename
         
-        # Save file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Save file (+ catat di katalog dokumen)
+        await run_in_threadpool(_store_upload, file.file, file_path, file_id, file.filename)
         
         logger.info(f"File uploaded successfully: {filename}")
         
@@ -100,6 +264,8 @@ async def upload_file(file: UploadFile = File(...)):
             "file_path": str(file_path)
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error uploading file: {e}")
         raise HTTPException(
@@ -107,18 +273,27 @@ async def upload_file(file: UploadFile = File(...)):
             detail=f"Error uploading file: {str(e)}"
         )
 
-@app.post("/ask", response_model=QuestionResponse)
-async def ask_question_endpoint(request: QuestionRequest):
+@app.post("/ask", response_model=QuestionResponse, response_model_exclude_none=True)
+async def ask_question_endpoint(request: QuestionRequest, http_request: Request):
     """
-    Ask question about uploaded documents
+    Ask question about uploaded documents.
+    Header X-Profile: 1 (atau sampling PROFILE_SAMPLE_RATE) menyimpan profile cProfile ke PROFILE_DIR.
     """
     try:
-        # Gunakan fungsi ask_question dari ask.py
-        answer = ask_question(request.question)
+        profile = should_profile(http_request.headers.get("X-Profile"))
+        debug = None
+        # Gunakan fungsi ask_question dari ask.py (di threadpool agar event loop tidak terblokir)
+        if request.debug or profile:
+            answer, trace = await run_in_threadpool(run_traced, ask_question, request.question, profile=profile)
+            if request.debug:
+                debug = trace.to_dict()
+        else:
+            answer = await run_in_threadpool(ask_question, request.question)
         
         return QuestionResponse(
             answer=answer,
-            status="success"
+            status="success",
+            debug=debug
         )
         
     except Exception as e:
@@ -128,22 +303,199 @@ async def ask_question_endpoint(request: QuestionRequest):
             detail=f"Error processing question: {str(e)}"
         )
 
+@app.post("/ask/batch")
+async def ask_batch_endpoint(request: BatchQuestionRequest):
+    """
+    Tanya banyak pertanyaan sekaligus (dikelompokkan per owner).
+    Hasil di-stream sebagai NDJSON (satu baris JSON per pertanyaan) sesuai urutan selesai.
+    """
+    if not request.questions:
+        raise HTTPException(status_code=400, detail="questions tidak boleh kosong")
+    if request.max_concurrency is not None and request.max_concurrency < 1:
+        raise HTTPException(status_code=400, detail="max_concurrency minimal 1")
+
+    items = [
+        {"id": item.id or str(i), "question": item.question, "owner": item.owner}
+        for i, item in enumerate(request.questions)
+    ]
+
+    async def stream():
+        try:
+            async for result in ask_batch(items, max_concurrency=request.max_concurrency):
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+        except Exception as e:
+            logger.error(f"Error processing batch: {e}")
+            yield json.dumps({"status": "error", "answer": f"Error processing batch: {str(e)}"}) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+# === /search: retrieval saja (tanpa LLM) ===
+SEARCH_MAX_TOP_K = int(os.getenv("SEARCH_MAX_TOP_K", "100"))
+SEARCH_MAX_BATCH = int(os.getenv("SEARCH_MAX_BATCH", "1000"))
+# Query per panggilan search_chunks saat streaming /search/batch (satu encode per grup)
+SEARCH_STREAM_GROUP = int(os.getenv("SEARCH_STREAM_GROUP", "32"))
+
+def _search_format(http_request: Request, top_k: int) -> str:
+    if top_k < 1 or top_k > SEARCH_MAX_TOP_K:
+        raise HTTPException(status_code=400, detail=f"top_k harus 1..{SEARCH_MAX_TOP_K}")
+    fmt = serialization.negotiate(http_request.headers.get("accept"))
+    if fmt is None:
+        raise HTTPException(status_code=406, detail="Format yang didukung: application/json, application/msgpack"
+                                                    f" (msgpack terpasang: {serialization.backends()['msgpack']})")
+    return fmt
+
+def _search_groups(items, request):
+    """
+    Item batch dikelompokkan per owner (satu encode per kelompok), dipotong per SEARCH_STREAM_GROUP.
+    Yield (posisi di request, hasil)
+    """
+    groups = {}
+    for i, item in enumerate(items):
+        groups.setdefault(item.owner, []).append((i, item.id or str(i), item.query))
+    for owner, group in groups.items():
+        for start in range(0, len(group), SEARCH_STREAM_GROUP):
+            part = group[start:start + SEARCH_STREAM_GROUP]
+            hits, failed = ask.search_chunks([query for _, _, query in part], owner, request.top_k, request.type,
+                                             request.pasal, request.include_text, request.expand)
+            for (position, item_id, query), query_hits in zip(part, hits):
+                result = {"id": item_id, "query": query, "owner": owner, "hits": query_hits}
+                if failed:
+                    result["failed_shards"] = failed
+                yield position, result
+
+@app.post("/search")
+async def search_endpoint(request: SearchRequest, http_request: Request):
+    """
+    Chunk teratas untuk satu query tanpa LLM: id, skor, metadata dan (opsional) teks.
+    Dengan owner: ranking yang sama dengan /ask; tanpa owner: hybrid search di seluruh corpus.
+    Header Accept: application/msgpack untuk msgpack, selain itu JSON.
+    """
+    fmt = _search_format(http_request, request.top_k)
+    started = time.perf_counter()
+    try:
+        hits, failed = await run_in_threadpool(ask.search_chunks, [request.query], request.owner, request.top_k,
+                                               request.type, request.pasal, request.include_text, request.expand)
+    except Exception as e:
+        logger.error(f"Error searching: {e}")
+        raise HTTPException(status_code=500, detail=f"Error searching: {str(e)}")
+    took_ms = round((time.perf_counter() - started) * 1000, 2)
+    headers = {"X-Search-Time-Ms": str(took_ms)}
+
+    if request.stream:
+        def stream():
+            for hit in hits[0]:
+                yield serialization.encode_stream_item(hit, fmt)
+        return StreamingResponse(stream(), media_type=serialization.media_type(fmt, stream=True), headers=headers)
+
+    body = {"query": request.query, "owner": request.owner, "hits": hits[0], "took_ms": took_ms}
+    if failed:
+        body["failed_shards"] = failed
+    return Response(content=serialization.encode(body, fmt), media_type=serialization.media_type(fmt),
+                    headers=headers)
+
+@app.post("/search/batch")
+async def search_batch_endpoint(request: BatchSearchRequest, http_request: Request):
+    """
+    /search untuk banyak query sekaligus: query dikelompokkan per owner (satu encode per kelompok).
+    stream=true mengirim hasil per query begitu kelompoknya selesai (NDJSON / msgpack berurutan),
+    urutan mengikuti kelompok owner; cocokkan lewat id.
+    """
+    fmt = _search_format(http_request, request.top_k)
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="queries tidak boleh kosong")
+    if len(request.queries) > SEARCH_MAX_BATCH:
+        raise HTTPException(status_code=400, detail=f"Maksimal {SEARCH_MAX_BATCH} query per batch")
+
+    if request.stream:
+        # Generator sync: StreamingResponse menjalankannya di threadpool
+        def stream():
+            try:
+                for _, result in _search_groups(request.queries, request):
+                    yield serialization.encode_stream_item(result, fmt)
+            except Exception as e:
+                logger.error(f"Error searching batch: {e}")
+                yield serialization.encode_stream_item({"status": "error", "detail": str(e)}, fmt)
+        return StreamingResponse(stream(), media_type=serialization.media_type(fmt, stream=True))
+
+    started = time.perf_counter()
+    try:
+        results = [result for _, result in sorted(
+            await run_in_threadpool(lambda: list(_search_groups(request.queries, request))), key=lambda x: x[0])]
+    except Exception as e:
+        logger.error(f"Error searching batch: {e}")
+        raise HTTPException(status_code=500, detail=f"Error searching batch: {str(e)}")
+    took_ms = round((time.perf_counter() - started) * 1000, 2)
+    return Response(content=serialization.encode({"results": results, "took_ms": took_ms}, fmt),
+                    media_type=serialization.media_type(fmt), headers={"X-Search-Time-Ms": str(took_ms)})
+
+@app.get("/facts/stats")
+async def get_fact_stats():
+    """
+    Hit-rate tabel fakta (pertanyaan tanggal/luas/lokasi yang dijawab tanpa LLM)
+    """
+    return fact_store.stats()
+
+@app.get("/ask/stats")
+async def get_ask_stats():
+    """
+    Statistik coalescing: berapa request /ask yang memakai hasil request identik yang sedang berjalan
+    """
+    return {"singleflight": inflight_questions.stats()}
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Metrik format Prometheus: histogram per tahap /ask dan ingest, queue depth, cache hit, ukuran index
+    """
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.get("/llm/metrics")
+async def get_llm_metrics():
+    """
+    Metrik LLM gateway: latency per attempt, retry, hedging dan status circuit breaker
+    """
+    return llm_gateway.metrics()
+
+def _file_info(doc: dict) -> dict:
+    """Baris katalog → item /files (filename = nama simpanan, dipakai DELETE /files/{filename})"""
+    return {
+        "id": doc["id"],
+        "filename": doc["stored_name"],
+        "original_name": doc["original_name"],
+        "owner": doc["owner"],
+        "size": doc["size"],
+        "pages": doc["pages"],
+        "sha256": doc["sha256"],
+        "status": doc["status"],
+        "chunk_start": doc["chunk_start"],
+        "chunk_end": doc["chunk_end"],
+        "chunks": doc["chunks"],
+        "upload_time": datetime.fromisoformat(doc["uploaded_at"]).timestamp(),
+        "uploaded_at": doc["uploaded_at"],
+        "indexed_at": doc["indexed_at"],
+    }
+
 @app.get("/files")
-async def list_uploaded_files():
+async def list_uploaded_files(
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    owner: Optional[str] = None,
+    q: Optional[str] = None,
+    status: Optional[str] = None,
+    source: str = "upload",
+    sort: str = "uploaded_at",
+    order: str = Query("desc", pattern="^(asc|desc)$")
+):
     """
-    List all uploaded files
+    List uploaded files dari katalog dokumen (paginasi + filter owner/nama/status)
     """
     try:
-        files = []
-        for file_path in UPLOAD_DIR.glob("*.pdf"):
-            files.append({
-                "filename": file_path.name,
-                "size": file_path.stat().st_size,
-                "upload_time": file_path.stat().st_mtime
-            })
-        
-        return {"files": files}
+        docs, total = task_manager.catalog.list(limit, offset, owner=owner, query=q, status=status,
+                                                source=source or None, sort=sort, descending=order == "desc")
+        return {"files": [_file_info(doc) for doc in docs], "total": total, "limit": limit, "offset": offset}
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error listing files: {e}")
         raise HTTPException(
@@ -151,25 +503,69 @@ async def list_uploaded_files():
             detail=f"Error listing files: {str(e)}"
         )
 
+@app.get("/files/stats")
+async def get_file_stats():
+    """
+    Statistik dokumen dari counter katalog (O(1), tanpa memuat index/chunk)
+    """
+    return task_manager.catalog.stats()
+
+@app.post("/files/compact")
+async def compact_index():
+    """
+    Buang chunk dokumen yang sudah dihapus dari index/chunks sekarang (tanpa menunggu ambang).
+    Di worker tanpa compactor (serve.py) permintaan diteruskan lewat katalog → 202.
+    """
+    try:
+        if not RUN_BACKGROUND_WORKERS:
+            await run_in_threadpool(task_manager.catalog.request_compaction)
+            return JSONResponse(status_code=202, content={
+                "compacted": False,
+                "reason": f"scheduled on background worker (within {task_manager.compactor.check_seconds:g}s)"})
+        return await run_in_threadpool(task_manager.compactor.compact, True)
+    except Exception as e:
+        logger.error(f"Error compacting index: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error compacting index: {str(e)}"
+        )
+
 @app.delete("/files/{filename}")
 async def delete_file(filename: str):
     """
-    Delete uploaded file
+    Delete uploaded file (nama simpanan, id dokumen, atau nama asli jika unik)
     """
     try:
-        file_path = UPLOAD_DIR / filename
-        
-        if not file_path.exists():
-            raise HTTPException(
-                status_code=404,
-                detail="File not found"
-            )
-        
-        file_path.unlink()
-        logger.info(f"File deleted: {filename}")
+        doc = task_manager.catalog.find(filename, source="upload")
+        tombstoned = 0
+        if doc is None:
+            # File lama yang tidak tercatat di katalog
+            file_path = UPLOAD_DIR / filename
+            if not file_path.is_file():
+                raise HTTPException(
+                    status_code=404,
+                    detail="File not found"
+                )
+            file_path.unlink()
+        else:
+            # Baris katalog + tombstone chunk hanya tercatat jika unlink berhasil (satu transaksi);
+            # chunk langsung tidak ikut retrieval, vektor/teksnya dibuang compactor
+            doc = await run_in_threadpool(
+                task_manager.delete_document, doc["id"],
+                lambda d: (UPLOAD_DIR / d["stored_name"]).unlink(missing_ok=True))
+            if doc is None:
+                raise HTTPException(
+                    status_code=404,
+                    detail="File not found"
+                )
+            filename = doc["stored_name"]
+            tombstoned = doc["chunks"]
+        logger.info(f"File deleted: {filename} ({tombstoned} chunks tombstoned)")
         
-        return {"message": f"File {filename} deleted successfully"}
+        return {"message": f"File {filename} deleted successfully", "chunks_tombstoned": tombstoned}
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error deleting file: {e}")
         raise HTTPException(
@@ -178,6 +574,22 @@ async def delete_file(filename: str):
         )
 
 # Background task endpoints
+def _store_upload_durably(source, file_path: Path):
+    """tmp + fsync + rename; sha256 dan ukuran dihitung sambil menyalin"""
+    reader = HashingReader(source)
+    tmp_path = file_path.with_name(file_path.name + ".part")
+    with open(tmp_path, "wb") as buffer:
+        shutil.copyfileobj(reader, buffer)
+        buffer.flush()
+        os.fsync(buffer.fileno())
+    os.replace(tmp_path, file_path)
+    return reader
+
+def _store_upload(source, file_path: Path, doc_id: str, original_name: str) -> dict:
+    reader = _store_upload_durably(source, file_path)
+    return task_manager.catalog.register(doc_id, file_path.name, original_name, reader.size,
+                                         reader.hexdigest(), pdf_page_count(str(file_path)))
+
 @app.post("/upload/background")
 async def upload_file_background(file: UploadFile = File(...)):
     """
@@ -191,39 +603,23 @@ async def upload_file_background(file: UploadFile = File(...)):
                 detail="Only PDF files are allowed"
             )
         
-        # Create task
-        task_id = task_manager.create_task(
-            task_type="upload",
-            description=f"Processing {file.filename}"
-        )
-        
-        # Start background processing
-        # This would be implemented with actual background processing
-        # For now, we'll simulate it
-        task_manager.update_task_status(task_id, TaskStatus.PROCESSING)
+        # Simpan file secara durable (tmp + fsync + rename) sebelum task dibuat,
+        # sehingga task di queue selalu menunjuk ke file yang utuh
+        task_id = str(uuid.uuid4())
+        file_path = UPLOAD_DIR / f"{task_id}_{file.filename}"
+        await run_in_threadpool(_store_upload, file.file, file_path, task_id, file.filename)
         
-        # Save file
-        file_id = str(uuid.uuid4())
-        filename = f"{file_id}_{file.filename}"
-        file_path = UPLOAD_DIR / filename
-        
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Update task as completed
-        task_manager.update_task_status(task_id, TaskStatus.COMPLETED)
-        task_manager.update_task_result(task_id, {
-            "file_id": file_id,
-            "filename": file.filename,
-            "file_path": str(file_path)
-        })
+        # Index dikerjakan worker job queue; endpoint langsung kembali
+        task_manager.create_task(task_id, "index_pdf", str(file_path), filename=file.filename)
         
         return {
             "task_id": task_id,
-            "message": "File upload started in background",
-            "status": "processing"
+            "message": "File stored, indexing queued",
+            "status": TaskStatus.PENDING
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in background upload: {e}")
         raise HTTPException(
@@ -231,6 +627,80 @@ async def upload_file_background(file: UploadFile = File(...)):
             detail=f"Error in background upload: {str(e)}"
         )
 
+# === Progress task via Server-Sent Events ===
+SSE_RECHECK_SECONDS = float(os.getenv("SSE_RECHECK_SECONDS", "2"))
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+
+def _parse_event_id(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value not in (None, "") else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Last-Event-ID must be an integer")
+
+async def _task_event_stream(request: Request, after_id: int, task_id: Optional[str] = None):
+    """
+    Stream event job_events dengan id > after_id. Worker di proses ini membangunkan stream
+    lewat listener; cek ulang berkala (SSE_RECHECK_SECONDS) menangkap event dari proses lain.
+    Stream satu task berhenti setelah event completed/failed.
+    """
+    loop = asyncio.get_running_loop()
+    changed = asyncio.Event()
+    listener = lambda: loop.call_soon_threadsafe(changed.set)
+    task_manager.queue.subscribe(listener)
+    last_sent = time.monotonic()
+    try:
+        while True:
+            changed.clear()
+            events = await run_in_threadpool(task_manager.queue.events_since, after_id, task_id)
+            for event in events:
+                after_id = event["id"]
+                yield f"id: {event['id']}\nevent: progress\ndata: {json.dumps(event)}\n\n"
+                if task_id and event["status"] in (TaskStatus.COMPLETED, TaskStatus.FAILED):
+                    return
+            if events:
+                last_sent = time.monotonic()
+                continue
+            if task_id:
+                task = await run_in_threadpool(task_manager.get_task, task_id)
+                if task is None or task["status"] in (TaskStatus.COMPLETED, TaskStatus.FAILED):
+                    return
+            if await request.is_disconnected():
+                return
+            try:
+                await asyncio.wait_for(changed.wait(), SSE_RECHECK_SECONDS)
+            except asyncio.TimeoutError:
+                if time.monotonic() - last_sent >= SSE_KEEPALIVE_SECONDS:
+                    last_sent = time.monotonic()
+                    yield ": keepalive\n\n"
+    finally:
+        task_manager.queue.unsubscribe(listener)
+
+def _sse_response(stream) -> StreamingResponse:
+    return StreamingResponse(stream, media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/upload/tasks/events")
+async def stream_all_task_events(request: Request, last_event_id: Optional[str] = None):
+    """
+    Progress semua task (SSE). Tanpa Last-Event-ID hanya event baru yang dikirim;
+    dengan Last-Event-ID (header atau query) stream dilanjutkan setelah event tersebut.
+    """
+    after_id = _parse_event_id(request.headers.get("Last-Event-ID") or last_event_id)
+    if after_id is None:
+        after_id = await run_in_threadpool(task_manager.queue.last_event_id)
+    return _sse_response(_task_event_stream(request, after_id))
+
+@app.get("/upload/tasks/{task_id}/events")
+async def stream_task_events(task_id: str, request: Request, last_event_id: Optional[str] = None):
+    """
+    Progress satu task (SSE): semua event task dari awal (atau setelah Last-Event-ID),
+    lalu event baru sampai task completed/failed.
+    """
+    after_id = _parse_event_id(request.headers.get("Last-Event-ID") or last_event_id) or 0
+    if await run_in_threadpool(task_manager.get_task, task_id) is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return _sse_response(_task_event_stream(request, after_id, task_id))
+
 @app.get("/upload/tasks/{task_id}")
 async def get_upload_task_status(task_id: str):
     """
@@ -246,6 +716,8 @@ async def get_upload_task_status(task_id: str):
         
         return task
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting task status: {e}")
         raise HTTPException(
@@ -275,8 +747,8 @@ async def cleanup_upload_tasks():
     Clean up old upload tasks
     """
     try:
-        task_manager.cleanup_old_tasks()
-        return {"message": "Old upload tasks cleaned up successfully"}
+        removed = task_manager.cleanup_old_tasks()
+        return {"message": "Old upload tasks cleaned up successfully", "removed": removed}
         
     except Exception as e:
         logger.error(f"Error cleaning up upload tasks: {e}")
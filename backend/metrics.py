@@ -0,0 +1,211 @@
+# metrics.py
+"""
+Metrik format Prometheus (text exposition 0.0.4) tanpa dependency tambahan.
+
+Histogram/counter di jalur request hanya melakukan bisect + increment di bawah lock.
+Nilai yang mahal atau milik komponen lain (ukuran index, kedalaman queue, hit-rate cache)
+didaftarkan sebagai callback dan baru dihitung saat /metrics di-scrape.
+"""
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from tracing import current_trace
+
+# Detik; mencakup tahap sub-milidetik (klasifikasi) sampai panggilan LLM puluhan detik
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                # [count per bucket (+Inf terakhir), sum]
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, *labelvalues: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labelvalues)
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for labels, counts, total in sorted(snapshot):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = sorted(self._values.items())
+        for labels, value in snapshot:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class CallbackMetric:
+    """
+    Gauge/counter yang nilainya diambil dari callback saat scrape.
+    Callback mengembalikan angka (tanpa label) atau dict {tuple label: angka}.
+    """
+
+    def __init__(self, name: str, documentation: str, callback: Callable,
+                 labelnames: Sequence[str] = (), metric_type: str = "gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.labelnames = tuple(labelnames)
+        self.metric_type = metric_type
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        try:
+            values = self.callback()
+        except Exception as e:
+            print(f"[METRICS] Callback '{self.name}' gagal: {e}")
+            return lines
+        if not isinstance(values, dict):
+            values = {(): values}
+        for labels, value in sorted(values.items()):
+            if value is not None:
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            # Nama sama menggantikan metrik lama (misalnya modul di-reload)
+            self._metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def callback(self, name: str, documentation: str, callback: Callable,
+                 labelnames: Sequence[str] = (), metric_type: str = "gauge") -> CallbackMetric:
+        return self.register(CallbackMetric(name, documentation, callback, labelnames, metric_type))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# === Metrik bersama ===
+ASK_STAGE_SECONDS = REGISTRY.histogram(
+    "docqa_ask_stage_seconds", "Durasi per tahap pemrosesan pertanyaan", ["stage"])
+ASK_SECONDS = REGISTRY.histogram(
+    "docqa_ask_seconds", "Durasi total menjawab satu pertanyaan", ["question_type"])
+SEARCH_SECONDS = REGISTRY.histogram(
+    "docqa_search_seconds", "Durasi retrieval /search per query (tanpa LLM)", ["scope"])
+INGEST_STAGE_SECONDS = REGISTRY.histogram(
+    "docqa_ingest_stage_seconds", "Durasi per tahap ingest dokumen", ["stage"])
+INGEST_TASKS_TOTAL = REGISTRY.counter(
+    "docqa_ingest_tasks_total", "Jumlah task ingest yang selesai per status", ["status"])
+REQUESTS_TOTAL = REGISTRY.counter(
+    "docqa_requests_total", "Jumlah request per endpoint dan status", ["endpoint", "status"])
+EVENT_LOOP_LAG_SECONDS = REGISTRY.histogram(
+    "docqa_event_loop_lag_seconds", "Keterlambatan event loop terhadap jadwal tick monitor")
+
+
+def stage_timer(stage: str, histogram: Optional[Histogram] = None):
+    """
+    Context manager untuk mencatat durasi satu tahap (default: docqa_ask_stage_seconds).
+    Jika ada trace request aktif (tracing.run_traced), durasi juga dicatat ke trace.
+    """
+    trace = current_trace()
+    if trace is None:
+        return (histogram or ASK_STAGE_SECONDS).time(stage)
+    return trace.stage(stage, histogram or ASK_STAGE_SECONDS)
+
+
+def observe_stage(stage: str, seconds: float, histogram: Optional[Histogram] = None):
+    """Seperti stage_timer untuk durasi yang diukur sendiri"""
+    trace = current_trace()
+    if trace is None:
+        (histogram or ASK_STAGE_SECONDS).observe(seconds, stage)
+    else:
+        trace.record_stage(stage, seconds, histogram or ASK_STAGE_SECONDS)
+
+
+async def monitor_event_loop_lag(interval: float = 0.05):
+    """Tick setiap interval detik; keterlambatan bangun dari sleep = waktu loop terblokir kode lain"""
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG_SECONDS.observe(max(0.0, time.perf_counter() - started - interval))
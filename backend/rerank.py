@@ -0,0 +1,138 @@
+# rerank.py
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from keyword_index import InvertedIndex
+
+Candidates = List[Tuple[int, float]]
+
+
+class RerankBudgetExceeded(Exception):
+    """Dilempar oleh reranker saat time budget request sudah habis"""
+
+
+class ExactMatchReranker:
+    """
+    Boost skor berdasarkan coverage term query di chunk.
+    Membership dicek lewat postings keyword index (O(1) per term per kandidat),
+    bukan substring scan pada teks chunk.
+    """
+
+    name = "exact_match"
+
+    def __init__(self, keyword_index: InvertedIndex, boost: float = 0.2):
+        self.keyword_index = keyword_index
+        self.boost = boost
+
+    def rerank(self, query: str, candidates: Candidates, deadline: float) -> Candidates:
+        query_terms = set(self.keyword_index.tokens(query))
+        if not query_terms or not candidates:
+            return list(candidates)
+
+        chunk_ids = [chunk_idx for chunk_idx, _ in candidates]
+        scores = np.fromiter((score for _, score in candidates), dtype=np.float64, count=len(candidates))
+
+        matches = np.zeros(len(candidates), dtype=np.float64)
+        for term in query_terms:
+            term_postings = self.keyword_index.postings.get(term)
+            if term_postings:
+                matches += np.fromiter((chunk_idx in term_postings for chunk_idx in chunk_ids),
+                                       dtype=np.float64, count=len(chunk_ids))
+
+        # Boost score berdasarkan coverage (20% boost maksimal)
+        boosted = scores + (matches / len(query_terms)) * self.boost
+        order = np.argsort(-boosted, kind="stable")
+        return [(chunk_ids[i], float(boosted[i])) for i in order]
+
+
+class CrossEncoderReranker:
+    """
+    Reranking dengan cross-encoder kecil yang dijalankan di CPU, dalam batch.
+    Model dimuat dari file lokal (tanpa akses network).
+    """
+
+    name = "cross_encoder"
+
+    def __init__(self, model_path: str, chunks: List[str], batch_size: int = 16, max_length: int = 256):
+        os.environ.setdefault("HF_HUB_OFFLINE", "1")
+        from sentence_transformers import CrossEncoder
+
+        self.model = CrossEncoder(model_path, device="cpu", max_length=max_length)
+        self.chunks = chunks
+        self.batch_size = batch_size
+
+    def rerank(self, query: str, candidates: Candidates, deadline: float) -> Candidates:
+        chunk_ids = [chunk_idx for chunk_idx, _ in candidates]
+        scores = []
+        for start in range(0, len(chunk_ids), self.batch_size):
+            if time.perf_counter() >= deadline:
+                raise RerankBudgetExceeded(self.name)
+            batch = chunk_ids[start:start + self.batch_size]
+            pairs = [(query, self.chunks[chunk_idx]) for chunk_idx in batch]
+            scores.extend(self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False))
+
+        order = np.argsort(-np.asarray(scores, dtype=np.float64), kind="stable")
+        return [(chunk_ids[i], float(scores[i])) for i in order]
+
+
+class RerankPipeline:
+    """
+    Menjalankan beberapa reranker berurutan dengan time budget per request.
+    Jika budget habis, urutan hasil fusion (input) dikembalikan apa adanya.
+    """
+
+    def __init__(self, rerankers: List, budget_ms: float = 50.0):
+        self.rerankers = rerankers
+        self.budget_ms = budget_ms
+
+    def run(self, query: str, candidates: Candidates, final_k: int) -> Tuple[Candidates, Dict]:
+        """
+        Returns:
+            (reranked candidates, report) dimana report berisi waktu per reranker (ms)
+        """
+        start = time.perf_counter()
+        deadline = start + self.budget_ms / 1000.0
+        report = {"timings_ms": {}, "budget_ms": self.budget_ms, "budget_exhausted": False}
+
+        reranked = list(candidates)
+        for reranker in self.rerankers:
+            stage_start = time.perf_counter()
+            try:
+                if stage_start >= deadline:
+                    raise RerankBudgetExceeded(reranker.name)
+                reranked = reranker.rerank(query, reranked, deadline)
+            except RerankBudgetExceeded:
+                report["budget_exhausted"] = True
+            finally:
+                report["timings_ms"][reranker.name] = (time.perf_counter() - stage_start) * 1000
+
+            if report["budget_exhausted"] or time.perf_counter() > deadline:
+                report["budget_exhausted"] = True
+                reranked = list(candidates)
+                break
+
+        report["total_ms"] = (time.perf_counter() - start) * 1000
+        return reranked[:final_k], report
+
+
+def build_default_reranker(keyword_index: Optional[InvertedIndex], chunks: List[str]) -> RerankPipeline:
+    """
+    Pipeline default: exact-match coverage, ditambah cross-encoder jika
+    RERANK_CROSS_ENCODER menunjuk ke model lokal
+    """
+    rerankers = []
+    if keyword_index is not None:
+        rerankers.append(ExactMatchReranker(keyword_index))
+
+    cross_encoder_path = os.getenv("RERANK_CROSS_ENCODER")
+    if cross_encoder_path:
+        try:
+            rerankers.append(CrossEncoderReranker(cross_encoder_path, chunks))
+            print(f"[RERANK] Cross-encoder dimuat dari '{cross_encoder_path}'")
+        except Exception as e:
+            print(f"[RERANK] Gagal memuat cross-encoder: {e}")
+
+    return RerankPipeline(rerankers, budget_ms=float(os.getenv("RERANK_BUDGET_MS", "50")))
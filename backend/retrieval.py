@@ -2,11 +2,117 @@
 import numpy as np
 import faiss
 from typing import List, Dict, Tuple, Optional
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import re
+import string
 from collections import defaultdict
 import heapq
+import threading
+import nltk
+from nltk.corpus import stopwords
+from nltk.tokenize import word_tokenize
+from rank_bm25 import BM25Okapi
+
+from keyword_index import InvertedIndex
+from rerank import RerankPipeline, build_default_reranker
+from metrics import stage_timer
+
+# === Retrieval per owner (jalur ask.py dan shard, lihat sharding.py) ===
+# Semua chunk owner ada di satu tempat (satu proses atau satu shard), jadi skor BM25 dan
+# normalisasi min-max dihitung atas chunk owner itu saja.
+
+def preprocess_text(text):
+    """
+    Preprocessing text: lowercase, tokenisasi, hapus stopwords dan punctuation
+    """
+    if not text:
+        return []
+    
+    try:
+        # Download nltk data jika belum ada
+        try:
+            stopwords.words('indonesian')
+        except LookupError:
+            nltk.download('stopwords', quiet=True)
+            nltk.download('punkt', quiet=True)
+    except:
+        pass
+    
+    # Lowercase
+    text = text.lower()
+    
+    # Tokenize
+    tokens = word_tokenize(text)
+    
+    # Remove punctuation and stopwords
+    try:
+        stop_words = set(stopwords.words('english')) | set(stopwords.words('indonesian'))
+    except:
+        stop_words = set(stopwords.words('english'))
+    
+    tokens = [token for token in tokens if token not in string.punctuation and token not in stop_words and len(token) > 2]
+    
+    return tokens
+
+def normalize_rows(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def minmax_scores(scores):
+    """Normalisasi skor ke 0-1 (semua 1 jika skor seragam)"""
+    if len(scores) > 1 and np.max(scores) > np.min(scores):
+        return (scores - np.min(scores)) / (np.max(scores) - np.min(scores))
+    return np.ones_like(scores)
+
+def owner_bm25(texts: List[str]) -> BM25Okapi:
+    return BM25Okapi([preprocess_text(text) for text in texts])
+
+def rank_owner_chunks(owner_chunks: List[Dict], bm25: BM25Okapi, chunk_embeddings: np.ndarray,
+                      queries: List[str], query_embeddings: np.ndarray, top_k: int = 5,
+                      dead: Optional[np.ndarray] = None) -> List[List[Dict]]:
+    """
+    Hybrid 40% BM25 + 60% cosine untuk chunk satu owner, semua pertanyaan sekaligus.
+
+    Args:
+        chunk_embeddings, query_embeddings: Sudah dinormalisasi (normalize_rows)
+        dead: Mask chunk yang tidak boleh terpilih (tombstone)
+
+    Returns:
+        List hasil per pertanyaan: salinan owner_chunks + bm25_score, faiss_score, combined_score
+    """
+    live_count = len(owner_chunks) - (int(dead.sum()) if dead is not None else 0)
+    if not live_count:
+        return [[] for _ in queries]
+
+    # Cosine similarity semua pertanyaan x semua chunk dalam satu perkalian matriks
+    with stage_timer("faiss_search"):
+        faiss_matrix = query_embeddings @ chunk_embeddings.T
+
+    results = []
+    for query, faiss_scores in zip(queries, faiss_matrix):
+        with stage_timer("bm25"):
+            bm25_scores = bm25.get_scores(preprocess_text(query))
+
+        # Gabungkan skor (weighted average: 40% BM25 + 60% FAISS)
+        combined_scores = 0.4 * minmax_scores(bm25_scores) + 0.6 * minmax_scores(faiss_scores)
+        if dead is not None:
+            combined_scores[dead] = -np.inf
+
+        # Ambil top_k chunks dengan skor tertinggi (argpartition, lalu urutkan top_k saja)
+        k = min(top_k, live_count)
+        top_indices = np.argpartition(-combined_scores, k - 1)[:k]
+        top_indices = top_indices[np.argsort(-combined_scores[top_indices])]
+
+        result_chunks = []
+        for idx in top_indices:
+            chunk_data = owner_chunks[idx].copy()
+            chunk_data['bm25_score'] = float(bm25_scores[idx])
+            chunk_data['faiss_score'] = float(faiss_scores[idx])
+            chunk_data['combined_score'] = float(combined_scores[idx])
+            result_chunks.append(chunk_data)
+        results.append(result_chunks)
+    return results
+
 
 class HybridRetriever:
     """
@@ -14,28 +120,30 @@ class HybridRetriever:
     """
     
     def __init__(self, model, chunks: List[str], metadata: List[Dict], 
-                 semantic_weight: float = 0.7, keyword_weight: float = 0.3):
+                 semantic_weight: float = 0.7, keyword_weight: float = 0.3,
+                 keyword_index: Optional[InvertedIndex] = None,
+                 reranker: Optional[RerankPipeline] = None):
         self.model = model
         self.chunks = chunks
         self.metadata = metadata
         self.semantic_weight = semantic_weight
         self.keyword_weight = keyword_weight
         
-        # Initialize TF-IDF untuk keyword search
-        print(" [RETRIEVAL] Inisialisasi TF-IDF vectorizer...")
-        self.tfidf_vectorizer = TfidfVectorizer(
-            stop_words=None,  # sudah handle stopwords di preprocessing
-            ngram_range=(1, 2),  # Unigram dan bigram
-            max_features=5000,
-            lowercase=True
-        )
-        
-        # Fit TF-IDF dengan chunks
-        if chunks:
-            self.tfidf_matrix = self.tfidf_vectorizer.fit_transform(chunks)
-            print(f" [RETRIEVAL] TF-IDF matrix dibuat: {self.tfidf_matrix.shape}")
-        else:
-            self.tfidf_matrix = None
+        # Keyword index incremental (unigram + bigram, tanpa batas vocabulary).
+        # Jika tidak diberikan, dibangun di memori dari chunks ini saja: chunks bisa berupa subset
+        # (owner, shard), jadi doc_keyword_index.pkl milik ingest tidak dibaca atau ditimpa di sini.
+        if keyword_index is None and chunks:
+            print(" [RETRIEVAL] Membangun keyword index...")
+            keyword_index = InvertedIndex.build(chunks)
+        self.keyword_index = keyword_index
+        # add_chunks bisa berjalan bersamaan dengan query (/search di thread lain)
+        self._keyword_lock = threading.Lock()
+        if self.keyword_index is not None:
+            print(f" [RETRIEVAL] Keyword index siap: {self.keyword_index.stats()}")
+        
+        # Reranking stage (pluggable), default dari environment
+        self.reranker = reranker or build_default_reranker(self.keyword_index, self.chunks)
+        self.last_rerank_report: Optional[Dict] = None
         
         # FAISS index akan diset dari luar
         self.faiss_index = None
@@ -45,27 +153,44 @@ class HybridRetriever:
         self.faiss_index = faiss_index
         print(f"[RETRIEVAL] FAISS index diset: {faiss_index.ntotal if faiss_index else 0} vektor")
     
+    def add_chunks(self, new_chunks: List[str], new_metadata: List[Dict]):
+        """
+        Tambah chunk baru ke keyword index secara incremental (tanpa refit).
+        Vektor FAISS ditambahkan oleh pemilik index (set_faiss_index untuk index baru).
+        Chunks/metadata diperpanjang lebih dulu, jadi query yang berjalan bersamaan tidak pernah
+        mendapat chunk id dari keyword index yang belum ada di self.chunks.
+        """
+        start_id = len(self.chunks)
+        self.chunks.extend(new_chunks)
+        self.metadata.extend(new_metadata)
+        with self._keyword_lock:
+            if self.keyword_index is None:
+                self.keyword_index = InvertedIndex()
+                self.reranker = build_default_reranker(self.keyword_index, self.chunks)
+            self.keyword_index.add_documents(new_chunks, start_id=start_id)
+    
     def keyword_search(self, query: str, top_k: int = 10) -> List[Tuple[int, float]]:
         """
-        Keyword-based search menggunakan TF-IDF cosine similarity
+        Keyword-based search menggunakan TF-IDF (lnc.ltc) lewat inverted index
         
         Returns:
             List of (chunk_index, score) tuples
         """
-        if self.tfidf_matrix is None:
-            return []
-        
-        # Transform query dengan TF-IDF
-        query_vec = self.tfidf_vectorizer.transform([query])
-        
-        # Hitung cosine similarity
-        similarities = cosine_similarity(query_vec, self.tfidf_matrix).flatten()
+        return self.keyword_search_batch([query], top_k)[0]
+    
+    def keyword_search_batch(self, queries: List[str], top_k: int = 10) -> List[List[Tuple[int, float]]]:
+        """
+        Keyword search untuk banyak query sekaligus.
+        Skor hanya dihitung pada postings dari term yang ada di query.
         
-        # Get top-k results
-        top_indices = np.argsort(similarities)[::-1][:top_k]
-        results = [(int(idx), float(similarities[idx])) for idx in top_indices if similarities[idx] > 0]
+        Returns:
+            List per query berisi (chunk_index, score) tuples
+        """
+        if self.keyword_index is None or not queries:
+            return [[] for _ in queries]
         
-        return results
+        with stage_timer("bm25"), self._keyword_lock:
+            return [self.keyword_index.search(query, top_k) for query in queries]
     
     def semantic_search(self, query: str, top_k: int = 10) -> List[Tuple[int, float]]:
         """
@@ -74,24 +199,47 @@ class HybridRetriever:
         Returns:
             List of (chunk_index, similarity_distance) tuples
         """
-        if self.faiss_index is None:
-            return []
+        return self.semantic_search_batch([query], top_k)[0]
+    
+    def semantic_search_batch(self, queries: List[str], top_k: int = 10) -> List[List[Tuple[int, float]]]:
+        """
+        Semantic search untuk banyak query sekaligus.
+        Semua query di-encode dalam satu batch dan FAISS dicari dengan matrix query.
         
-        # Embed query
-        query_vec = self.model.encode([query])
+        Returns:
+            List per query berisi (chunk_index, similarity_distance) tuples
+        """
+        if self.faiss_index is None or not queries:
+            return [[] for _ in queries]
         
-        # Search dengan FAISS
-        distances, indices = self.faiss_index.search(np.array(query_vec), top_k)
+        # Embed semua query dalam satu batch
+        with stage_timer("embedding"):
+            query_vecs = np.asarray(self.model.encode(queries), dtype="float32")
         
-        # Convert distances ke similarity scores (lower distance = higher similarity)
-        # Normalize distances ke range 0-1
-        max_distance = np.max(distances[0]) if len(distances[0]) > 0 else 1.0
-        similarities = 1.0 - (distances[0] / max_distance) if max_distance > 0 else distances[0]
+        batch_results = []
+        for row in self.semantic_candidates(query_vecs, top_k):
+            similarities = distances_to_similarities(np.array([distance for _, distance in row]))
+            batch_results.append([(chunk_idx, float(similarity))
+                                  for (chunk_idx, _), similarity in zip(row, similarities)])
         
-        results = [(int(indices[0][i]), float(similarities[i])) 
-                  for i in range(len(indices[0])) if indices[0][i] != -1]
+        return batch_results
+    
+    def semantic_candidates(self, query_vecs: np.ndarray, top_k: int = 10) -> List[List[Tuple[int, float]]]:
+        """
+        FAISS search dengan vektor query yang sudah di-encode (mis. dari router shard).
         
-        return results
+        Returns:
+            List per query berisi (chunk_index, jarak L2 mentah) — bisa dibandingkan antar shard
+        """
+        if self.faiss_index is None or not len(query_vecs):
+            return [[] for _ in range(len(query_vecs))]
+        
+        # Search dengan FAISS (satu panggilan untuk seluruh matrix query)
+        with stage_timer("faiss_search"):
+            distances, indices = self.faiss_index.search(np.asarray(query_vecs, dtype="float32"), top_k)
+        return [[(int(chunk_idx), float(distance)) for chunk_idx, distance in zip(row_indices, row_distances)
+                 if chunk_idx != -1]
+                for row_distances, row_indices in zip(distances, indices)]
     
     def hybrid_search(self, query: str, top_k: int = 5, 
                      rerank: bool = True) -> List[Dict]:
@@ -122,21 +270,10 @@ class HybridRetriever:
         semantic_results = self.semantic_search(query, expanded_k)
         print(f" [HYBRID] Semantic results: {len(semantic_results)} chunks")
         
-        # Combine scores
+        # Combine scores (sort by combined score)
         print(f" [HYBRID] TAHAP 3: Menggabungkan scores...")
-        combined_scores = defaultdict(float)
-        
-        # Add keyword scores
-        for chunk_idx, score in keyword_results:
-            combined_scores[chunk_idx] += self.keyword_weight * score
-        
-        # Add semantic scores  
-        for chunk_idx, score in semantic_results:
-            combined_scores[chunk_idx] += self.semantic_weight * score
-        
-        # Sort by combined score
-        sorted_results = sorted(combined_scores.items(), 
-                              key=lambda x: x[1], reverse=True)[:top_k * 2]
+        sorted_results = combine_hybrid_scores(keyword_results, semantic_results,
+                                               self.keyword_weight, self.semantic_weight, top_k * 2)
         
         print(f" [HYBRID] Combined results: {len(sorted_results)} chunks")
         
@@ -148,47 +285,134 @@ class HybridRetriever:
         else:
             sorted_results = sorted_results[:top_k]
         
-        # Build final results dengan metadata
+        final_results = self._build_results(sorted_results, keyword_results, semantic_results)
+        print(f"[HYBRID] Hybrid search selesai: {len(final_results)} hasil")
+        return final_results
+    
+    def hybrid_search_batch(self, queries: List[str], top_k: int = 5, query_vecs: Optional[np.ndarray] = None,
+                            exclude=frozenset()) -> List[List[Dict]]:
+        """
+        hybrid_search tanpa rerank untuk banyak query sekaligus (endpoint /search):
+        satu encode untuk semua query dan satu panggilan FAISS dengan matrix query.
+        
+        Args:
+            query_vecs: Vektor query yang sudah di-encode (None = encode dengan self.model)
+            exclude: Chunk id yang tidak boleh muncul (tombstone)
+        
+        Returns:
+            List hasil per query, format sama dengan hybrid_search
+        """
+        if not queries:
+            return []
+        expanded_k = max(min(top_k * 3, 50), top_k)
+        if query_vecs is None and self.faiss_index is not None:
+            with stage_timer("embedding"):
+                query_vecs = np.asarray(self.model.encode(queries), dtype="float32")
+        keyword_lists = self.keyword_search_batch(queries, expanded_k)
+        semantic_lists = self.semantic_candidates(query_vecs, expanded_k) if query_vecs is not None \
+            else [[] for _ in queries]
+        
+        batch_results = []
+        for keyword_results, semantic in zip(keyword_lists, semantic_lists):
+            # Similarity dinormalisasi atas semua kandidat FAISS, baru chunk bertombstone dibuang
+            similarities = distances_to_similarities(np.array([distance for _, distance in semantic]))
+            semantic_results = [(chunk_idx, float(similarity)) for (chunk_idx, _), similarity
+                                in zip(semantic, similarities) if chunk_idx not in exclude]
+            keyword_results = [(chunk_idx, score) for chunk_idx, score in keyword_results if chunk_idx not in exclude]
+            ranked = combine_hybrid_scores(keyword_results, semantic_results,
+                                           self.keyword_weight, self.semantic_weight, top_k * 2)[:top_k]
+            batch_results.append(self._build_results(ranked, keyword_results, semantic_results))
+        return batch_results
+    
+    def _build_results(self, ranked: List[Tuple[int, float]], keyword_results: List[Tuple[int, float]],
+                       semantic_results: List[Tuple[int, float]]) -> List[Dict]:
+        """Hasil akhir dengan metadata (join skor lewat dict lookup)"""
+        keyword_scores = dict(keyword_results)
+        semantic_scores = dict(semantic_results)
         final_results = []
-        for chunk_idx, final_score in sorted_results:
+        for chunk_idx, final_score in ranked:
             if chunk_idx < len(self.chunks) and chunk_idx < len(self.metadata):
-                result = {
+                final_results.append({
                     "chunk_index": chunk_idx,
                     "text": self.chunks[chunk_idx],
                     "metadata": self.metadata[chunk_idx],
                     "combined_score": final_score,
-                    "keyword_score": next((score for idx, score in keyword_results if idx == chunk_idx), 0.0),
-                    "semantic_score": next((score for idx, score in semantic_results if idx == chunk_idx), 0.0)
-                }
-                final_results.append(result)
+                    "keyword_score": keyword_scores.get(chunk_idx, 0.0),
+                    "semantic_score": semantic_scores.get(chunk_idx, 0.0)
+                })
+        return final_results
+    
+    def multi_query_search(self, query: str, top_k: int = 5, rerank: bool = True,
+                           rrf_k: int = 60, exclude=frozenset()) -> List[Dict]:
+        """
+        Multi-query retrieval: query asli + variasi dari QueryExpander dicari sekaligus.
         
-        print(f"[HYBRID] Hybrid search selesai: {len(final_results)} hasil")
+        Semua variasi di-encode dalam satu batch, FAISS dan keyword search dijalankan
+        sebagai batched search, lalu semua ranked list digabung dengan reciprocal-rank fusion.
+        
+        Args:
+            query: Query string
+            top_k: Jumlah hasil yang diinginkan
+            rerank: Whether to apply reranking
+            rrf_k: Konstanta k pada RRF (default 60)
+            exclude: Chunk id yang tidak boleh muncul (tombstone)
+        
+        Returns:
+            List of result dictionaries dengan metadata
+        """
+        queries = QueryExpander.expand_query(query)
+        print(f"\n [MULTI-QUERY] Query: {query}")
+        print(f" [MULTI-QUERY] Variasi query: {len(queries)}")
+        
+        expanded_k = min(top_k * 3, 50)
+        keyword_lists = self.keyword_search_batch(queries, expanded_k)
+        semantic_lists = self.semantic_search_batch(queries, expanded_k)
+        if exclude:
+            keyword_lists = [[(i, score) for i, score in ranked if i not in exclude] for ranked in keyword_lists]
+            semantic_lists = [[(i, score) for i, score in ranked if i not in exclude] for ranked in semantic_lists]
+        
+        fused = reciprocal_rank_fusion(keyword_lists + semantic_lists, k=rrf_k)[:top_k * 2]
+        print(f" [MULTI-QUERY] Fused results: {len(fused)} chunks")
+        
+        if rerank and len(fused) > top_k:
+            fused = self.rerank_results(query, fused, top_k)
+        else:
+            fused = fused[:top_k]
+        
+        # Skor keyword/semantic dari query asli (index 0) untuk informasi
+        keyword_scores = dict(keyword_lists[0]) if keyword_lists else {}
+        semantic_scores = dict(semantic_lists[0]) if semantic_lists else {}
+        
+        final_results = []
+        for chunk_idx, fused_score in fused:
+            if chunk_idx < len(self.chunks) and chunk_idx < len(self.metadata):
+                final_results.append({
+                    "chunk_index": chunk_idx,
+                    "text": self.chunks[chunk_idx],
+                    "metadata": self.metadata[chunk_idx],
+                    "combined_score": fused_score,
+                    "keyword_score": keyword_scores.get(chunk_idx, 0.0),
+                    "semantic_score": semantic_scores.get(chunk_idx, 0.0)
+                })
+        
+        print(f"[MULTI-QUERY] Multi-query search selesai: {len(final_results)} hasil")
         return final_results
     
     def rerank_results(self, query: str, candidates: List[Tuple[int, float]], 
                       final_k: int) -> List[Tuple[int, float]]:
         """
-        Simple reranking berdasarkan exact term matches dan query coverage
+        Reranking lewat RerankPipeline (exact-match coverage, opsional cross-encoder)
+        dengan time budget per request. Laporan waktu per reranker disimpan di last_rerank_report.
         """
-        query_terms = set(query.lower().split())
-        reranked = []
-        
-        for chunk_idx, score in candidates:
-            if chunk_idx < len(self.chunks):
-                chunk_text = self.chunks[chunk_idx].lower()
-                
-                # Hitung exact matches
-                exact_matches = sum(1 for term in query_terms if term in chunk_text)
-                coverage = exact_matches / len(query_terms) if query_terms else 0
-                
-                # Boost score berdasarkan coverage
-                boosted_score = score + (coverage * 0.2)  # 20% boost maksimal
-                
-                reranked.append((chunk_idx, boosted_score))
-        
-        # Sort ulang dan ambil top-k
-        reranked.sort(key=lambda x: x[1], reverse=True)
-        return reranked[:final_k]
+        candidates = [(chunk_idx, score) for chunk_idx, score in candidates if chunk_idx < len(self.chunks)]
+        with stage_timer("rerank"):
+            reranked, report = self.reranker.run(query, candidates, final_k)
+        self.last_rerank_report = report
+        
+        timings = ", ".join(f"{name}={ms:.1f}ms" for name, ms in report["timings_ms"].items())
+        print(f" [RERANK] {timings or 'tanpa reranker'}"
+              f"{' (budget habis, pakai urutan fusion)' if report['budget_exhausted'] else ''}")
+        return reranked
 
 
 class QueryExpander:
@@ -225,7 +449,43 @@ class QueryExpander:
         if len(filtered_words) < len(words):
             expanded_queries.append(" ".join(filtered_words))
         
-        return list(set(expanded_queries))  # Remove duplicates
+        return list(dict.fromkeys(expanded_queries))  # Remove duplicates, query asli tetap di posisi pertama
+
+
+def distances_to_similarities(distances: np.ndarray) -> np.ndarray:
+    """
+    Convert distances ke similarity scores (lower distance = higher similarity),
+    dinormalisasi ke range 0-1 terhadap jarak terbesar di hasil
+    """
+    max_distance = np.max(distances) if len(distances) > 0 else 1.0
+    return 1.0 - (distances / max_distance) if max_distance > 0 else distances
+
+
+def combine_hybrid_scores(keyword_results: List[Tuple[int, float]], semantic_results: List[Tuple[int, float]],
+                          keyword_weight: float, semantic_weight: float, top_n: int) -> List[Tuple[int, float]]:
+    """Weighted sum skor keyword dan semantic per chunk, top_n tertinggi"""
+    combined_scores = defaultdict(float)
+    for chunk_idx, score in keyword_results:
+        combined_scores[chunk_idx] += keyword_weight * score
+    for chunk_idx, score in semantic_results:
+        combined_scores[chunk_idx] += semantic_weight * score
+    return heapq.nlargest(top_n, combined_scores.items(), key=lambda x: x[1])
+
+
+def reciprocal_rank_fusion(ranked_lists: List[List[Tuple[int, float]]],
+                           k: int = 60) -> List[Tuple[int, float]]:
+    """
+    Gabungkan beberapa ranked list dengan reciprocal-rank fusion: score = sum(1 / (k + rank))
+    
+    Returns:
+        List of (chunk_index, rrf_score) tuples, urut dari skor tertinggi
+    """
+    fused_scores = defaultdict(float)
+    for ranked in ranked_lists:
+        for rank, (chunk_idx, _) in enumerate(ranked, start=1):
+            fused_scores[chunk_idx] += 1.0 / (k + rank)
+    
+    return sorted(fused_scores.items(), key=lambda x: x[1], reverse=True)
 
 
 class DocumentLevelRetriever:
@@ -286,14 +546,14 @@ class DocumentLevelRetriever:
 
 
 def create_enhanced_retrieval_system(model, chunks: List[str], metadata: List[Dict], 
-                                   faiss_index=None) -> Dict:
+                                   faiss_index=None, keyword_index: Optional[InvertedIndex] = None) -> Dict:
     """
     Factory function untuk membuat enhanced retrieval system
     """
     print(f"\n [RETRIEVAL] Membuat enhanced retrieval system")
     
     # Create hybrid retriever
-    hybrid_retriever = HybridRetriever(model, chunks, metadata)
+    hybrid_retriever = HybridRetriever(model, chunks, metadata, keyword_index=keyword_index)
     if faiss_index:
         hybrid_retriever.set_faiss_index(faiss_index)
     
@@ -4,14 +4,78 @@ import fitz  # PyMuPDF
 import nltk
 from nltk.tokenize import sent_tokenize
 import pickle
+import numpy as np
+
+from token_windows import CHUNK_FIT, fit_chunks
 
 nltk.download("punkt")
 
 MAX_TOKENS = 500
 
+# CHUNKING_MODE untuk chunk umum: "tokens" (kalimat dipack sampai MAX_TOKENS kata) atau "semantic"
+# (dipotong di titik similarity antar kalimat yang turun, lihat split_semantic)
+CHUNKING_MODE = os.getenv("CHUNKING_MODE", "tokens")
+SEMANTIC_MIN_TOKENS = int(os.getenv("SEMANTIC_MIN_TOKENS", "50"))
+SEMANTIC_MAX_TOKENS = int(os.getenv("SEMANTIC_MAX_TOKENS", "250"))
+# Similarity kalimat bersebelahan di bawah persentil ini (per dokumen) dianggap pergantian topik
+SEMANTIC_BREAKPOINT_PERCENTILE = float(os.getenv("SEMANTIC_BREAKPOINT_PERCENTILE", "25"))
+SENTENCE_BATCH_SIZE = int(os.getenv("SENTENCE_BATCH_SIZE", "64"))
+
+_sentence_model = None
+
 def count_tokens(text):
     return len(text.split())
 
+def get_sentence_model():
+    """Model embedding untuk mode semantic (dimuat sekali per proses jika pemanggil tidak memberi model)"""
+    global _sentence_model
+    if _sentence_model is None:
+        from embedding_backend import load_embedding_model
+        _sentence_model = load_embedding_model()
+    return _sentence_model
+
+def adjacent_similarities(embeddings):
+    """Cosine similarity kalimat i dan i+1 untuk semua i sekaligus (panjang n - 1)"""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    embeddings = embeddings / norms
+    return np.einsum("ij,ij->i", embeddings[:-1], embeddings[1:])
+
+def split_semantic(sentences, model=None, min_tokens=SEMANTIC_MIN_TOKENS, max_tokens=SEMANTIC_MAX_TOKENS,
+                   percentile=SEMANTIC_BREAKPOINT_PERCENTILE):
+    """
+    Gabungkan kalimat berurutan menjadi chunk dan potong di tempat similarity antar kalimat turun.
+
+    Semua kalimat dokumen di-encode dalam satu batch. Chunk dipotong setelah kalimat i jika
+    similarity(i, i+1) di bawah persentil dokumen dan chunk sudah >= min_tokens kata, atau jika
+    kalimat berikutnya membuat chunk > max_tokens kata. Kalimat yang sendirian > max_tokens menjadi satu chunk.
+    """
+    sentences = [sentence for sentence in sentences if sentence.strip()]
+    if len(sentences) < 2:
+        return [" ".join(sentences).strip()] if sentences else []
+
+    model = model or get_sentence_model()
+    embeddings = model.encode(sentences, batch_size=SENTENCE_BATCH_SIZE, show_progress_bar=False)
+    similarities = adjacent_similarities(embeddings)
+    threshold = np.percentile(similarities, percentile)
+    sizes = [count_tokens(sentence) for sentence in sentences]
+
+    chunks = []
+    current, current_tokens = [], 0
+    for i, sentence in enumerate(sentences):
+        if current and current_tokens + sizes[i] > max_tokens:
+            chunks.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(sentence)
+        current_tokens += sizes[i]
+        if i < len(similarities) and similarities[i] < threshold and current_tokens >= min_tokens:
+            chunks.append(" ".join(current))
+            current, current_tokens = [], 0
+    if current:
+        chunks.append(" ".join(current))
+    return [chunk.strip() for chunk in chunks if chunk.strip()]
+
 def load_pdf_text(file_path):
     print(f"DEBUG: Sedang memuat teks dari '{os.path.basename(file_path)}'...")
     try:
@@ -54,7 +118,20 @@ def split_by_pasal(text):
             result.append((chunk, pasal_number))
     return result
 
-def split_into_chunks(text, source_name):
+def split_into_chunks(text, source_name, mode=None, model=None, fit=None):
+    """
+    Chunk tanggal, chunk per PASAL, lalu chunk umum dari seluruh kalimat dokumen.
+
+    Args:
+        mode: Cara membentuk chunk umum: "tokens" | "semantic" (default CHUNKING_MODE)
+        model: Model embedding untuk mode semantic dan untuk tokenizer CHUNK_FIT=pack (default get_sentence_model())
+        fit: "pack" | "pool" | "off" (default CHUNK_FIT); "pack" memecah chunk yang melebihi
+            max_seq_length model menjadi window (lihat token_windows.py)
+    """
+    mode = mode or CHUNKING_MODE
+    fit = fit or CHUNK_FIT
+    if mode not in ("tokens", "semantic"):
+        raise ValueError(f"CHUNKING_MODE tidak dikenal: '{mode}' (tokens | semantic)")
     if not text:
         print(f"DEBUG: Teks kosong dari '{source_name}', tidak ada chunk yang dibuat.")
         return [], []
@@ -80,20 +157,28 @@ def split_into_chunks(text, source_name):
 
     # --- Tambah: Chunk umum ---
     all_sentences = sent_tokenize(text)
-    i = 0
-    while i < len(all_sentences):
-        current_chunk = []
-        token_count = 0
-        while i < len(all_sentences) and token_count + count_tokens(all_sentences[i]) <= MAX_TOKENS:
-            current_chunk.append(all_sentences[i])
-            token_count += count_tokens(all_sentences[i])
-            i += 1
-        chunk_text = " ".join(current_chunk).strip()
-        if chunk_text:
+    if mode == "semantic":
+        for chunk_text in split_semantic(all_sentences, model):
             chunks.append(chunk_text)
             metadatas.append({"owner": owner, "type": "umum"})
-
-    print(f"DEBUG: Selesai chunking '{source_name}'. Total chunks: {len(chunks)}")
+    else:
+        i = 0
+        while i < len(all_sentences):
+            current_chunk = []
+            token_count = 0
+            while i < len(all_sentences) and token_count + count_tokens(all_sentences[i]) <= MAX_TOKENS:
+                current_chunk.append(all_sentences[i])
+                token_count += count_tokens(all_sentences[i])
+                i += 1
+            chunk_text = " ".join(current_chunk).strip()
+            if chunk_text:
+                chunks.append(chunk_text)
+                metadatas.append({"owner": owner, "type": "umum"})
+
+    if fit == "pack":
+        chunks, metadatas = fit_chunks(chunks, metadatas, model or get_sentence_model(), fit)
+
+    print(f"DEBUG: Selesai chunking '{source_name}' ({mode}, fit={fit}). Total chunks: {len(chunks)}")
     return chunks, metadatas
 
 def chunk_all_pdfs(pdf_folder):
@@ -0,0 +1,63 @@
+# serialization.py
+"""
+Encoding response endpoint data (/search) dengan content negotiation lewat header Accept.
+
+- application/msgpack atau application/x-msgpack → msgpack (jika paket msgpack terpasang)
+- selain itu JSON, dengan orjson jika terpasang (jauh lebih cepat dari json untuk list hasil yang besar)
+
+Streaming: JSON → NDJSON (satu objek per baris); msgpack → objek msgpack berurutan tanpa
+pemisah (dibaca dengan msgpack.Unpacker).
+"""
+import json
+from typing import Any, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "json"
+MSGPACK = "msgpack"
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+MEDIA_TYPES = {(JSON, False): "application/json", (JSON, True): "application/x-ndjson",
+               (MSGPACK, False): "application/msgpack", (MSGPACK, True): "application/msgpack"}
+
+
+def negotiate(accept: Optional[str]) -> Optional[str]:
+    """
+    Format response dari header Accept: MSGPACK, JSON, atau None jika tidak ada yang bisa dipenuhi
+    (mis. hanya msgpack yang diterima tapi paketnya tidak terpasang)
+    """
+    media_types = [part.split(";")[0].strip().lower() for part in (accept or "").split(",") if part.strip()]
+    if msgpack is not None and any(media_type in MSGPACK_TYPES for media_type in media_types):
+        return MSGPACK
+    if not media_types or any(media_type in ("*/*", "application/*", "application/json", "application/x-ndjson")
+                              for media_type in media_types):
+        return JSON
+    return None
+
+
+def media_type(fmt: str, stream: bool = False) -> str:
+    return MEDIA_TYPES[(fmt, stream)]
+
+
+def encode(obj: Any, fmt: str = JSON) -> bytes:
+    if fmt == MSGPACK:
+        return msgpack.packb(obj, use_bin_type=True)
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def encode_stream_item(obj: Any, fmt: str = JSON) -> bytes:
+    """Satu item stream: baris NDJSON, atau satu objek msgpack"""
+    return encode(obj, fmt) + b"\n" if fmt == JSON else encode(obj, fmt)
+
+
+def backends() -> dict:
+    return {"json": "orjson" if orjson is not None else "json", "msgpack": msgpack is not None}
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# serve.py
+"""
+Server produksi multi-worker (pre-fork). start_server.py / main.py tetap untuk development (reload).
+
+State read-only (model embedding, spaCy, chunks, index FAISS) dimuat SEKALI di proses induk, lalu
+worker di-fork sehingga halaman memori itu dibagi copy-on-write alih-alih disalin per worker:
+- FAISS_MMAP=1 (default di sini): vektor index dibaca lewat mmap dari page cache
+- Struktur retrieval per owner (BM25 + embedding chunk) dibangun sebelum fork (--preload-owners)
+- gc.freeze() sebelum fork: GC tidak menulis ke header objek hasil preload (halaman tidak ter-copy)
+- Worker 0 menjalankan worker ingest + compactor; worker lain hanya melayani query dan mengikuti
+  upload baru/tombstone/compaction lewat katalog (CORPUS_SYNC_SECONDS)
+- Worker yang mati di-fork ulang; SIGTERM/SIGINT diteruskan ke semua worker
+
+Usage:
+    python serve.py --workers 4 --port 8000
+    python worker_scaling.py --workers 1,2,4   # RSS/PSS per worker dan throughput
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+
+def preload(preload_owners: bool = True):
+    """Import main (index, model, spaCy, katalog) dan bangun cache owner di proses induk"""
+    import main
+    import ask
+
+    if preload_owners and ask.shard_router is None:
+        for owner in ask.all_owners:
+            ask.get_owner_retrieval(owner.lower(), ask.corpus.generation)
+    # Thread yang hidup saat fork tidak ikut ke anak (lock yang dipegangnya bisa macet selamanya)
+    alive = [thread.name for thread in threading.enumerate() if thread is not threading.main_thread()]
+    if alive:
+        print(f"[SERVE] Peringatan: thread aktif sebelum fork: {', '.join(alive)}")
+    gc.collect()
+    gc.freeze()
+    return main
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    # proto IPPROTO_TCP (bukan 0): asyncio hanya memasang TCP_NODELAY di koneksi dari socket dengan
+    # proto TCP; tanpa itu respons keep-alive tertahan Nagle + delayed ACK (~40 ms per request)
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM,
+                         socket.IPPROTO_TCP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(main, slot: int, sock: socket.socket, args):
+    """Satu worker uvicorn di socket bersama; worker 0 menjalankan worker ingest + compactor"""
+    import uvicorn
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    main.RUN_BACKGROUND_WORKERS = slot == 0 and not args.no_background
+    if not main.RUN_BACKGROUND_WORKERS and main.CORPUS_SYNC_SECONDS <= 0:
+        main.CORPUS_SYNC_SECONDS = args.sync_seconds
+    torch = sys.modules.get("torch")
+    if torch is not None and args.torch_threads:
+        torch.set_num_threads(args.torch_threads)
+
+    config = uvicorn.Config(main.app, log_level=args.log_level, timeout_keep_alive=args.keep_alive)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def serve(args) -> int:
+    os.environ.setdefault("FAISS_MMAP", "1")
+    started = time.perf_counter()
+    main = preload(not args.no_preload_owners)
+    print(f"[SERVE] State dimuat dalam {time.perf_counter() - started:.1f}s, {args.workers} worker")
+    sock = bind_socket(args.host, args.port)
+
+    if not hasattr(os, "fork"):
+        print("[SERVE] os.fork tidak tersedia, berjalan dengan satu proses")
+        run_worker(main, 0, sock, args)
+        return 0
+
+    children = {}  # pid -> slot
+    stopping = False
+
+    def spawn(slot: int):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(main, slot, sock, args)
+            except BaseException as e:
+                print(f"[SERVE] Worker {slot} gagal: {e}")
+                code = 1
+            finally:
+                sys.stdout.flush()
+                os._exit(code)
+        children[pid] = slot
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for slot in range(args.workers):
+        spawn(slot)
+    print(f"[SERVE] Listening on http://{args.host}:{args.port} "
+          f"(workers: {', '.join(str(pid) for pid in children)})")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        slot = children.pop(pid, None)
+        if slot is None or stopping:
+            continue
+        print(f"[SERVE] Worker {slot} (pid {pid}) berhenti (status {status}), di-fork ulang")
+        time.sleep(args.respawn_delay)
+        spawn(slot)
+    sock.close()
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Server multi-worker dengan state yang dimuat sebelum fork")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_WORKERS", "2")))
+    parser.add_argument("--torch-threads", type=int, default=None,
+                        help="torch.set_num_threads per worker (default: CPU / workers)")
+    parser.add_argument("--sync-seconds", type=float, default=2.0,
+                        help="Interval worker query mengikuti upload baru/tombstone/compaction (CORPUS_SYNC_SECONDS)")
+    parser.add_argument("--no-preload-owners", action="store_true",
+                        help="Jangan bangun BM25/embedding per owner sebelum fork")
+    parser.add_argument("--no-background", action="store_true",
+                        help="Tanpa worker ingest/compactor (dijalankan di deployment lain)")
+    parser.add_argument("--keep-alive", type=int, default=5)
+    parser.add_argument("--respawn-delay", type=float, default=1.0)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    if args.torch_threads is None:
+        args.torch_threads = max(1, (os.cpu_count() or 1) // max(args.workers, 1))
+
+    sys.exit(serve(args))
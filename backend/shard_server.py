@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# shard_server.py
+"""
+Proses retrieval untuk satu shard (lihat sharding.py). Tidak memuat model embedding:
+vektor query di-encode oleh router (proses API) dan dikirim bersama request.
+
+Usage:
+    python shard_server.py --shard-dir shards/shard_00 --port 8101
+"""
+import argparse
+from typing import Dict, List
+
+import numpy as np
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+from sharding import ShardIndex
+
+
+class OwnerRequest(BaseModel):
+    owner: str
+
+
+class OwnerSearchRequest(BaseModel):
+    owner: str
+    queries: List[str]
+    vectors: List[List[float]]
+    top_k: int = 5
+
+
+class KeywordStatsRequest(BaseModel):
+    terms: List[str]
+
+
+class SearchRequest(BaseModel):
+    vectors: List[List[float]]
+    keyword_weights: List[Dict[str, float]]  # bobot query per term dari router (idf global)
+    top_k: int = 15
+
+
+def create_app(shard_dir: str) -> FastAPI:
+    shard = ShardIndex(shard_dir)
+    app = FastAPI(title=f"DocumentAI Shard {shard.info['shard']}")
+
+    # Endpoint sync: numpy/FAISS dijalankan di threadpool, event loop tetap bebas
+    @app.get("/health")
+    def health():
+        return shard.health()
+
+    @app.get("/owners")
+    def owners():
+        return shard.owners
+
+    @app.post("/owner/chunks")
+    def owner_chunks(request: OwnerRequest):
+        return {"chunks": shard.owner_chunks(request.owner)}
+
+    @app.post("/owner/search")
+    def owner_search(request: OwnerSearchRequest):
+        vectors = np.asarray(request.vectors, dtype=np.float32)
+        return {"results": shard.search_owner(request.owner, request.queries, vectors, request.top_k)}
+
+    @app.post("/keyword/stats")
+    def keyword_stats(request: KeywordStatsRequest):
+        return shard.keyword_stats(request.terms)
+
+    @app.post("/search")
+    def search(request: SearchRequest):
+        vectors = np.asarray(request.vectors, dtype=np.float32)
+        return shard.search(vectors, request.keyword_weights, request.top_k)
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Proses retrieval untuk satu shard corpus")
+    parser.add_argument("--shard-dir", required=True)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8101)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(args.shard_dir), host=args.host, port=args.port, log_level=args.log_level)
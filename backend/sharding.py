@@ -0,0 +1,443 @@
+# sharding.py
+"""
+Corpus dibagi ke beberapa shard berdasarkan hash owner; setiap shard dilayani proses retrieval
+sendiri (shard_server.py) dan ShardRouter di proses API mengirim query ke shard yang tepat.
+
+- Owner selalu berada di satu shard (crc32(owner) % jumlah shard): pertanyaan untuk satu owner
+  (jalur ask.py) dikirim ke satu shard saja, hasilnya identik dengan retrieval satu proses
+- Pencarian global di-scatter ke semua shard lalu top-k digabung. Skor bisa dibandingkan antar shard:
+  jarak L2 FAISS bersifat absolut, dan bobot query keyword (idf) dihitung router dari document
+  frequency total semua shard (bobot chunk lnc tidak bergantung statistik global)
+- Chunk id di shard adalah id global (posisi di doc_index.faiss / doc_chunks.pkl master)
+
+Shard dibangun ulang dari file master (setelah ingest/compaction) dengan `split`:
+
+    python sharding.py split --shards 4 --out shards
+    python shard_server.py --shard-dir shards/shard_00 --port 8101   # satu proses per shard
+    RETRIEVAL_SHARDS=http://127.0.0.1:8101,http://127.0.0.1:8102,... python main.py
+
+`verify` menjalankan N shard lokal dan membandingkan hasil router dengan retrieval satu proses:
+
+    python sharding.py verify --shards 3
+"""
+import argparse
+import heapq
+import json
+import os
+import pickle
+import subprocess
+import sys
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import faiss
+import httpx
+import numpy as np
+
+from keyword_index import InvertedIndex
+from retrieval import (HybridRetriever, combine_hybrid_scores, distances_to_similarities, normalize_rows,
+                       owner_bm25, rank_owner_chunks)
+
+SHARD_DIR = "shards"
+SHARD_TIMEOUT = float(os.getenv("SHARD_TIMEOUT", "10"))
+SHARD_CONNECT_TIMEOUT = float(os.getenv("SHARD_CONNECT_TIMEOUT", "2"))
+
+
+def owner_shard(owner: str, num_shards: int) -> int:
+    """Shard untuk owner (stabil antar proses, tidak seperti hash() Python)"""
+    return zlib.crc32(owner.strip().lower().encode("utf-8")) % num_shards
+
+
+# === Split corpus master ke folder shard ===
+def split_corpus(index, chunks: List[str], metadatas: List[Dict], num_shards: int, out_dir: str = SHARD_DIR,
+                 deleted: Iterable[int] = ()) -> List[Dict]:
+    """
+    Tulis out_dir/shard_XX/{doc_index.faiss, doc_chunks.pkl, shard.json} dan out_dir/shards.json.
+    Chunk bertombstone (deleted) tidak ikut; vektor diambil dari index tanpa encode ulang.
+
+    Returns:
+        Info per shard: {"shard", "num_shards", "chunks", "owners"}
+    """
+    if index.ntotal != len(chunks):
+        raise ValueError(f"Index ({index.ntotal}) dan chunks ({len(chunks)}) tidak sejajar")
+    deleted = set(deleted)
+    vectors = index.reconstruct_n(0, index.ntotal) if index.ntotal else np.zeros((0, index.d), dtype=np.float32)
+    assignment: List[List[int]] = [[] for _ in range(num_shards)]
+    for i, meta in enumerate(metadatas):
+        if i not in deleted:
+            assignment[owner_shard(meta.get("owner", ""), num_shards)].append(i)
+
+    os.makedirs(out_dir, exist_ok=True)
+    shards = []
+    for shard, ids in enumerate(assignment):
+        shard_dir = os.path.join(out_dir, f"shard_{shard:02d}")
+        os.makedirs(shard_dir, exist_ok=True)
+        shard_index = faiss.IndexFlatL2(index.d)
+        if ids:
+            shard_index.add(np.ascontiguousarray(vectors[ids], dtype=np.float32))
+        faiss.write_index(shard_index, os.path.join(shard_dir, "doc_index.faiss"))
+        with open(os.path.join(shard_dir, "doc_chunks.pkl"), "wb") as f:
+            pickle.dump({"chunks": [chunks[i] for i in ids], "metadatas": [metadatas[i] for i in ids],
+                         "ids": ids}, f)
+        info = {"shard": shard, "num_shards": num_shards, "chunks": len(ids),
+                "owners": len({metadatas[i].get("owner", "") for i in ids})}
+        with open(os.path.join(shard_dir, "shard.json"), "w", encoding="utf-8") as f:
+            json.dump(info, f)
+        shards.append(info)
+    with open(os.path.join(out_dir, "shards.json"), "w", encoding="utf-8") as f:
+        json.dump({"num_shards": num_shards, "total_chunks": len(chunks) - len(deleted), "shards": shards}, f, indent=2)
+    return shards
+
+
+def load_master(catalog_path: Optional[str] = None) -> Tuple:
+    """Index, chunks, metadata dan chunk id bertombstone dari folder kerja"""
+    from doc_catalog import CATALOG_DB_PATH, DocumentCatalog
+    index = faiss.read_index("doc_index.faiss")
+    with open("doc_chunks.pkl", "rb") as f:
+        data = pickle.load(f)
+    deleted = set()
+    catalog_path = catalog_path or CATALOG_DB_PATH
+    if os.path.exists(catalog_path):
+        for start, end in DocumentCatalog(catalog_path).tombstone_ranges():
+            deleted.update(range(start, end))
+    return index, data["chunks"], data["metadatas"], deleted
+
+
+# === Satu shard (dipakai shard_server.py) ===
+class ShardIndex:
+    """Chunk, index FAISS dan keyword index satu shard; semua id keluar sebagai id global"""
+
+    def __init__(self, shard_dir: str):
+        with open(os.path.join(shard_dir, "shard.json"), encoding="utf-8") as f:
+            self.info = json.load(f)
+        with open(os.path.join(shard_dir, "doc_chunks.pkl"), "rb") as f:
+            data = pickle.load(f)
+        self.index = faiss.read_index(os.path.join(shard_dir, "doc_index.faiss"))
+        self.chunks, self.metadatas, self.ids = data["chunks"], data["metadatas"], data["ids"]
+        if self.index.ntotal != len(self.chunks):
+            raise ValueError(f"Shard '{shard_dir}': index ({self.index.ntotal}) dan chunks ({len(self.chunks)}) "
+                             f"tidak sejajar")
+
+        self.retriever = HybridRetriever(None, self.chunks, self.metadatas,
+                                         keyword_index=InvertedIndex.build(self.chunks))
+        self.retriever.set_faiss_index(self.index)
+        self.owner_ids: Dict[str, List[int]] = {}
+        for local_id, meta in enumerate(self.metadatas):
+            self.owner_ids.setdefault(meta.get("owner", "").lower(), []).append(local_id)
+        self.owners = sorted({meta["owner"] for meta in self.metadatas if meta.get("owner")})
+
+    def health(self) -> Dict:
+        return {**self.info, "dimension": self.index.d, "chunks": len(self.chunks)}
+
+    def owner_chunks(self, owner: str) -> List[Dict]:
+        return [{"text": self.chunks[i], "index": self.ids[i], "metadata": self.metadatas[i]}
+                for i in self.owner_ids.get(owner.lower(), [])]
+
+    @lru_cache(maxsize=int(os.getenv("OWNER_CACHE_SIZE", "128")))
+    def owner_retrieval(self, owner_key: str):
+        """BM25 + embedding chunk ternormalisasi milik owner (sama dengan ask.get_owner_retrieval)"""
+        ids = self.owner_ids.get(owner_key, [])
+        if not ids:
+            return [], None, None
+        embeddings = np.vstack([self.index.reconstruct(i) for i in ids])
+        return (self.owner_chunks(owner_key), owner_bm25([self.chunks[i] for i in ids]),
+                normalize_rows(np.asarray(embeddings, dtype=np.float32)))
+
+    def search_owner(self, owner: str, queries: List[str], vectors: np.ndarray, top_k: int = 5) -> List[List[Dict]]:
+        owner_chunks, bm25, chunk_embeddings = self.owner_retrieval(owner.lower())
+        if not owner_chunks:
+            return [[] for _ in queries]
+        return rank_owner_chunks(owner_chunks, bm25, chunk_embeddings, queries,
+                                 normalize_rows(np.asarray(vectors, dtype=np.float32)), top_k)
+
+    def keyword_stats(self, terms: List[str]) -> Dict:
+        keyword_index = self.retriever.keyword_index
+        return {"num_docs": keyword_index.num_docs, "doc_freq": keyword_index.term_stats(terms)}
+
+    def search(self, vectors: np.ndarray, keyword_weights: List[Dict[str, float]], top_k: int) -> Dict:
+        """
+        Kandidat global per query: jarak L2 mentah dan skor keyword dengan bobot dari router.
+
+        Returns:
+            {"results": [{"semantic": [(id, jarak)], "keyword": [(id, skor)]}], "chunks": {id: payload}}
+        """
+        semantic = self.retriever.semantic_candidates(np.asarray(vectors, dtype=np.float32), top_k)
+        keyword_index = self.retriever.keyword_index
+        keyword = [keyword_index.search_weights(weights, top_k) for weights in keyword_weights]
+        used = {local_id for rows in (semantic, keyword) for row in rows for local_id, _ in row}
+        return {
+            "results": [{"semantic": [(self.ids[i], d) for i, d in sem], "keyword": [(self.ids[i], s) for i, s in kw]}
+                        for sem, kw in zip(semantic, keyword)],
+            "chunks": {str(self.ids[i]): {"text": self.chunks[i], "metadata": self.metadatas[i]} for i in used},
+        }
+
+
+# === Router di proses API ===
+class ShardRouter:
+    """
+    Klien untuk proses shard: pertanyaan satu owner ke satu shard, pencarian global scatter-gather.
+    Urutan URL bebas; shard diurutkan menurut id yang dilaporkan /health.
+    """
+
+    def __init__(self, urls: Sequence[str], timeout: float = SHARD_TIMEOUT,
+                 connect_timeout: float = SHARD_CONNECT_TIMEOUT, startup_wait: float = 30.0, model=None):
+        self.model = model  # hanya untuk hybrid_search(query)
+        self.client = httpx.Client(timeout=httpx.Timeout(timeout, connect=connect_timeout),
+                                   limits=httpx.Limits(max_connections=4 * len(urls),
+                                                       max_keepalive_connections=4 * len(urls)))
+        self.executor = ThreadPoolExecutor(max_workers=len(urls), thread_name_prefix="shard")
+
+        deadline = time.monotonic() + startup_wait
+        healths = {}
+        for url in urls:
+            url = url.rstrip("/")
+            while True:
+                try:
+                    healths[url] = self._get(url, "/health")
+                    break
+                except httpx.HTTPError as e:
+                    if time.monotonic() > deadline:
+                        raise RuntimeError(f"Shard {url} tidak bisa dihubungi: {e}")
+                    time.sleep(0.5)
+
+        self.urls = sorted(healths, key=lambda url: healths[url]["shard"])
+        self.num_shards = len(self.urls)
+        for shard, url in enumerate(self.urls):
+            health = healths[url]
+            if health["shard"] != shard or health["num_shards"] != self.num_shards:
+                raise RuntimeError(f"Shard {url} melaporkan {health['shard']}/{health['num_shards']}, "
+                                   f"diharapkan {shard}/{self.num_shards}")
+        self.dimension = healths[self.urls[0]]["dimension"]
+        self.total_chunks = sum(health["chunks"] for health in healths.values())
+        self.owners = sorted({owner for owners in self._scatter("/owners", None) if owners for owner in owners})
+        print(f"[SHARD] Router: {self.num_shards} shard, {self.total_chunks} chunk, {len(self.owners)} owner")
+
+    def _get(self, url: str, path: str):
+        response = self.client.get(url + path)
+        response.raise_for_status()
+        return response.json()
+
+    def _post(self, url: str, path: str, payload: Dict):
+        response = self.client.post(url + path, json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    def _scatter(self, path: str, payload: Optional[Dict]) -> List:
+        """Request paralel ke semua shard; shard yang gagal → None di posisinya"""
+        def call(url):
+            try:
+                return self._post(url, path, payload) if payload is not None else self._get(url, path)
+            except httpx.HTTPError as e:
+                print(f"[SHARD] {url}{path} gagal: {e}")
+                return None
+        return list(self.executor.map(call, self.urls))
+
+    def shard_for(self, owner: str) -> str:
+        return self.urls[owner_shard(owner, self.num_shards)]
+
+    def owner_chunks(self, owner: str) -> List[Dict]:
+        """Semua chunk milik owner (urut id global) dari shard owner"""
+        return self._post(self.shard_for(owner), "/owner/chunks", {"owner": owner})["chunks"]
+
+    def search_owner(self, owner: str, queries: List[str], query_vectors: np.ndarray, top_k: int = 5) -> List[List[Dict]]:
+        """Hybrid BM25 + cosine untuk pertanyaan satu owner, dihitung di shard owner"""
+        payload = {"owner": owner, "queries": list(queries),
+                   "vectors": np.asarray(query_vectors, dtype=np.float32).tolist(), "top_k": top_k}
+        return self._post(self.shard_for(owner), "/owner/search", payload)["results"]
+
+    def search(self, queries: List[str], query_vectors: np.ndarray, top_k: int = 5, keyword_weight: float = 0.3,
+               semantic_weight: float = 0.7) -> Tuple[List[List[Dict]], List[int]]:
+        """
+        Hybrid search global (setara HybridRetriever.hybrid_search tanpa rerank), scatter-gather.
+
+        Returns:
+            (hasil per query, daftar shard yang gagal); hasil tetap dikembalikan dari shard yang berhasil
+        """
+        analyzer = InvertedIndex()
+        terms = sorted({term for query in queries for term in analyzer.analyze(query)})
+
+        # Fase 1: document frequency total untuk idf query
+        stats = self._scatter("/keyword/stats", {"terms": terms})
+        num_docs, doc_freq = 0, {}
+        for shard_stats in stats:
+            if shard_stats is None:
+                continue
+            num_docs += shard_stats["num_docs"]
+            for term, df in shard_stats["doc_freq"].items():
+                doc_freq[term] = doc_freq.get(term, 0) + df
+        weights = [analyzer.query_weights(query, doc_freq, num_docs) for query in queries]
+
+        # Fase 2: kandidat per shard, lalu top-k global
+        expanded_k = max(min(top_k * 3, 50), top_k)
+        responses = self._scatter("/search", {"vectors": np.asarray(query_vectors, dtype=np.float32).tolist(),
+                                              "keyword_weights": weights, "top_k": expanded_k})
+        failed = [shard for shard, response in enumerate(responses) if response is None or stats[shard] is None]
+        payloads = {}
+        for response in responses:
+            if response is not None:
+                payloads.update(response["chunks"])
+
+        results = []
+        for q in range(len(queries)):
+            rows = [response["results"][q] for response in responses if response is not None]
+            # Seri diputus dengan chunk id terkecil, sama seperti top-k keyword di tiap shard
+            semantic = heapq.nsmallest(expanded_k, (tuple(hit) for row in rows for hit in row["semantic"]),
+                                       key=lambda hit: (hit[1], hit[0]))
+            similarities = distances_to_similarities(np.array([distance for _, distance in semantic]))
+            semantic_results = [(chunk_idx, float(similarity)) for (chunk_idx, _), similarity in zip(semantic, similarities)]
+            keyword_results = heapq.nsmallest(expanded_k, (tuple(hit) for row in rows for hit in row["keyword"]),
+                                              key=lambda hit: (-hit[1], hit[0]))
+
+            merged = combine_hybrid_scores(keyword_results, semantic_results, keyword_weight, semantic_weight,
+                                           top_k * 2)[:top_k]
+            keyword_scores, semantic_scores = dict(keyword_results), dict(semantic_results)
+            results.append([{
+                "chunk_index": chunk_idx,
+                "text": payloads[str(chunk_idx)]["text"],
+                "metadata": payloads[str(chunk_idx)]["metadata"],
+                "combined_score": score,
+                "keyword_score": keyword_scores.get(chunk_idx, 0.0),
+                "semantic_score": semantic_scores.get(chunk_idx, 0.0),
+            } for chunk_idx, score in merged])
+        return results, failed
+
+    def hybrid_search(self, query: str, top_k: int = 5) -> List[Dict]:
+        """Satu query global dengan self.model untuk encode (antarmuka HybridRetriever)"""
+        vectors = np.asarray(self.model.encode([query]), dtype=np.float32)
+        return self.search([query], vectors, top_k)[0][0]
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.client.close()
+
+
+# === verify: N shard lokal vs satu proses ===
+def _same_ranking(expected: List[Tuple[int, float]], actual: List[Tuple[int, float]], tol: float = 1e-5) -> bool:
+    """
+    Skor per posisi sama (dalam toleransi float); id boleh berbeda hanya di posisi yang skornya seri,
+    karena urutan chunk dengan skor sama bergantung urutan gabungan kandidat
+    """
+    if len(expected) != len(actual) or len({i for i, _ in actual}) != len(actual):
+        return False
+    return all(abs(e_score - a_score) <= tol for (_, e_score), (_, a_score) in zip(expected, actual))
+
+
+def _percentile_ms(values: List[float], q: float) -> float:
+    return round(float(np.percentile(values, q)) * 1000, 2) if values else 0.0
+
+
+def verify(args) -> int:
+    from embedding_backend import load_embedding_model
+
+    index, chunks, metadatas, deleted = load_master()
+    split_corpus(index, chunks, metadatas, args.shards, args.out, deleted)
+    live = [i for i in range(len(chunks)) if i not in deleted]
+    print(f"[SHARD] {len(live)} chunk dibagi ke {args.shards} shard di '{args.out}'")
+
+    processes, urls = [], []
+    log = open(os.path.join(args.out, "shard_servers.log"), "ab")
+    try:
+        for shard in range(args.shards):
+            port = args.base_port + shard
+            processes.append(subprocess.Popen(
+                [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "shard_server.py"),
+                 "--shard-dir", os.path.join(args.out, f"shard_{shard:02d}"), "--port", str(port),
+                 "--log-level", "warning"], stdout=log, stderr=subprocess.STDOUT))
+            urls.append(f"http://127.0.0.1:{port}")
+        # URL sengaja dibalik: router harus mengurutkan sendiri menurut id shard
+        router = ShardRouter(list(reversed(urls)), startup_wait=args.startup_timeout)
+        model = load_embedding_model()
+
+        # Referensi satu proses atas chunk yang sama (tanpa tombstone), id dipetakan ke id global
+        live_chunks = [chunks[i] for i in live]
+        reference = HybridRetriever(model, live_chunks, [metadatas[i] for i in live],
+                                    keyword_index=InvertedIndex.build(live_chunks))
+        reference_index = faiss.IndexFlatL2(index.d)
+        if live:
+            reference_index.add(np.ascontiguousarray(index.reconstruct_n(0, index.ntotal)[live], dtype=np.float32))
+        reference.set_faiss_index(reference_index)
+
+        rng = np.random.default_rng(args.seed)
+        owners = router.owners[:args.owners]
+        queries = [" ".join(chunks[i].split()[:8]) for i in rng.choice(live, size=min(args.queries, len(live)),
+                                                                          replace=False)] if live else []
+        mismatches, owner_latency, global_latency = 0, [], []
+
+        # Pertanyaan satu owner: shard owner vs ranking owner atas corpus penuh
+        for owner in owners:
+            ids = [i for i in live if metadatas[i].get("owner", "").lower() == owner.lower()]
+            owner_chunks = [{"text": chunks[i], "index": i, "metadata": metadatas[i]} for i in ids]
+            embeddings = normalize_rows(np.asarray(np.vstack([index.reconstruct(i) for i in ids]), dtype=np.float32))
+            owner_queries = queries[:args.owner_queries]
+            vectors = np.asarray(model.encode(owner_queries), dtype=np.float32)
+            expected = rank_owner_chunks(owner_chunks, owner_bm25([chunks[i] for i in ids]), embeddings,
+                                         owner_queries, normalize_rows(vectors), args.top_k)
+            started = time.perf_counter()
+            actual = router.search_owner(owner, owner_queries, vectors, args.top_k)
+            owner_latency.append(time.perf_counter() - started)
+            for exp, act in zip(expected, actual):
+                if not _same_ranking([(c["index"], c["combined_score"]) for c in exp],
+                                     [(c["index"], c["combined_score"]) for c in act]):
+                    mismatches += 1
+                    print(f"[SHARD] Owner '{owner}' berbeda: {[c['index'] for c in exp]} vs {[c['index'] for c in act]}")
+
+        # Pencarian global: scatter-gather vs HybridRetriever satu proses
+        for query in queries:
+            vectors = np.asarray(model.encode([query]), dtype=np.float32)
+            expected = [(live[r["chunk_index"]], r["combined_score"])
+                        for r in reference.hybrid_search(query, args.top_k, rerank=False)]
+            started = time.perf_counter()
+            results, failed = router.search([query], vectors, args.top_k)
+            global_latency.append(time.perf_counter() - started)
+            actual = [(r["chunk_index"], r["combined_score"]) for r in results[0]]
+            if failed or not _same_ranking(expected, actual):
+                mismatches += 1
+                print(f"[SHARD] Global '{query[:40]}' berbeda: {expected} vs {actual} (gagal: {failed})")
+
+        print(f"[SHARD] Owner search: {len(owners)} owner x {min(args.owner_queries, len(queries))} query, "
+              f"p50={_percentile_ms(owner_latency, 50)}ms p95={_percentile_ms(owner_latency, 95)}ms")
+        print(f"[SHARD] Global search: {len(queries)} query, "
+              f"p50={_percentile_ms(global_latency, 50)}ms p95={_percentile_ms(global_latency, 95)}ms")
+        print(f"[SHARD] {'OK: hasil identik dengan satu proses' if not mismatches else f'{mismatches} hasil berbeda'}")
+        router.close()
+        return 1 if mismatches else 0
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        log.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sharding corpus per owner untuk proses retrieval terpisah")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    split_parser = commands.add_parser("split", help="Bagi doc_index.faiss / doc_chunks.pkl ke folder shard")
+    split_parser.add_argument("--shards", type=int, required=True)
+    split_parser.add_argument("--out", default=SHARD_DIR)
+
+    verify_parser = commands.add_parser("verify", help="Jalankan N shard lokal dan bandingkan dengan satu proses")
+    verify_parser.add_argument("--shards", type=int, default=3)
+    verify_parser.add_argument("--out", default=SHARD_DIR)
+    verify_parser.add_argument("--base-port", type=int, default=8101)
+    verify_parser.add_argument("--queries", type=int, default=20, help="Query global (potongan chunk acak)")
+    verify_parser.add_argument("--owners", type=int, default=10, help="Owner yang dicek")
+    verify_parser.add_argument("--owner-queries", type=int, default=3, help="Query per owner")
+    verify_parser.add_argument("--top-k", type=int, default=5)
+    verify_parser.add_argument("--seed", type=int, default=42)
+    verify_parser.add_argument("--startup-timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    if args.command == "split":
+        index, chunks, metadatas, deleted = load_master()
+        for info in split_corpus(index, chunks, metadatas, args.shards, args.out, deleted):
+            print(f"[SHARD] shard_{info['shard']:02d}: {info['chunks']} chunk, {info['owners']} owner")
+        sys.exit(0)
+    sys.exit(verify(args))
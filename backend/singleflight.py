@@ -0,0 +1,76 @@
+# singleflight.py
+import re
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, rapikan whitespace dan buang tanda baca di akhir pertanyaan"""
+    return re.sub(r"\s+", " ", question.lower()).strip().rstrip("?!. ")
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalescing untuk request identik yang sedang berjalan: request pertama (leader) menjalankan
+    fungsi, request lain dengan key yang sama menunggu dan memakai hasil (atau error) yang sama.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self._stats = {"leaders": 0, "coalesced": 0, "errors": 0}
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs) -> Tuple[Any, bool]:
+        """
+        Returns:
+            (result, shared) dimana shared=True jika hasil berasal dari request lain yang sedang berjalan
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._stats["coalesced"] += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self._stats["leaders"] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+        return call.result, False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self._stats["leaders"] + self._stats["coalesced"]
+            return {
+                **self._stats,
+                "in_flight": len(self._calls),
+                "requests": total,
+                "coalesced_ratio": self._stats["coalesced"] / total if total else 0.0
+            }
@@ -0,0 +1,199 @@
+# summarizer.py
+import os
+import pickle
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from json_store import JsonStore
+from semantic_chunker import split_by_pasal
+
+SUMMARY_STORE_PATH = "doc_summaries.json"
+
+# Batas karakter per panggilan LLM saat map/reduce
+MAX_SECTION_CHARS = 6000
+MAP_WORKERS = 4
+
+MAP_SYSTEM_PROMPT = (
+    "Rangkum bagian dokumen perjanjian berikut dalam 2-3 kalimat. "
+    "Pertahankan pihak-pihak, objek, angka (luas, nilai, tanggal) dan kewajiban penting. "
+    "Jangan menambahkan informasi di luar teks."
+)
+
+REDUCE_SYSTEM_PROMPT = (
+    "Berikut adalah ringkasan per bagian dari satu dokumen perjanjian. "
+    "Gabungkan menjadi rangkuman komprehensif dalam 5 poin penjelasan singkat yang merangkum keseluruhan isi dokumen. "
+    "Setiap poin harus mencakup aspek penting dari dokumen seperti pihak-pihak yang terlibat, "
+    "ruang lingkup pekerjaan, jangka waktu, dan ketentuan-ketentuan utama. "
+    "Jangan memberikan informasi tambahan di luar ringkasan."
+)
+
+LLMFunc = Callable[[str, str], str]
+
+
+class SummaryStore:
+    """
+    Penyimpanan rangkuman per dokumen (per owner) dalam file JSON. Pakai SummaryStore.shared():
+    satu instance per file dalam satu proses; antar proses disamakan lewat JsonStore.
+    """
+
+    _shared: Dict[str, "SummaryStore"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, path: str = SUMMARY_STORE_PATH):
+        self.path = path
+        self._store = JsonStore(path, "SUMMARY")
+
+    @classmethod
+    def shared(cls, path: str = SUMMARY_STORE_PATH) -> "SummaryStore":
+        with cls._shared_lock:
+            key = os.path.abspath(path)
+            store = cls._shared.get(key)
+            if store is None:
+                store = cls._shared[key] = cls(path)
+            return store
+
+    def get(self, owner: str) -> Optional[str]:
+        entry = self._store.get(owner.lower())
+        return entry["summary"] if entry else None
+
+    def put(self, owner: str, summary: str, sections: int):
+        self._store.set(owner.lower(), {
+            "owner": owner,
+            "summary": summary,
+            "sections": sections,
+            "created_at": datetime.now().isoformat()
+        })
+
+    def remove(self, owner: str):
+        self._store.set(owner.lower(), None)
+
+    def __contains__(self, owner: str) -> bool:
+        return owner.lower() in self._store.snapshot()
+
+    def __len__(self) -> int:
+        return len(self._store.snapshot())
+
+
+def _pack_sections(sections: List[str], max_chars: int) -> List[str]:
+    """Gabungkan section kecil (dan potong section besar) menjadi batch <= max_chars"""
+    batches = []
+    current = ""
+    for section in sections:
+        section = section.strip()
+        while len(section) > max_chars:
+            if current:
+                batches.append(current)
+                current = ""
+            batches.append(section[:max_chars])
+            section = section[max_chars:]
+        if current and len(current) + len(section) + 2 > max_chars:
+            batches.append(current)
+            current = ""
+        current = f"{current}\n\n{section}" if current else section
+    if current:
+        batches.append(current)
+    return batches
+
+
+def map_reduce_summary(sections: List[str], llm: LLMFunc, max_chars: int = MAX_SECTION_CHARS) -> str:
+    """
+    Map: rangkum setiap batch section secara paralel.
+    Reduce: gabungkan ringkasan parsial (bertingkat jika masih terlalu panjang) menjadi rangkuman akhir.
+    """
+    batches = _pack_sections([s for s in sections if s.strip()], max_chars)
+    if not batches:
+        return ""
+
+    print(f"[SUMMARY] Map: {len(batches)} batch dari {len(sections)} section")
+    with ThreadPoolExecutor(max_workers=MAP_WORKERS) as executor:
+        partials = list(executor.map(lambda batch: llm(MAP_SYSTEM_PROMPT, batch), batches))
+
+    # Reduce bertingkat sampai semua ringkasan parsial muat dalam satu prompt
+    while sum(len(p) for p in partials) > max_chars and len(partials) > 1:
+        groups = _pack_sections(partials, max_chars)
+        if len(groups) >= len(partials):
+            break
+        print(f"[SUMMARY] Reduce antara: {len(partials)} -> {len(groups)}")
+        with ThreadPoolExecutor(max_workers=MAP_WORKERS) as executor:
+            partials = list(executor.map(lambda group: llm(MAP_SYSTEM_PROMPT, group), groups))
+
+    print(f"[SUMMARY] Reduce akhir dari {len(partials)} ringkasan parsial")
+    return llm(REDUCE_SYSTEM_PROMPT, "\n\n".join(partials))
+
+
+def summarize_text(text: str, llm: LLMFunc) -> Tuple[str, int]:
+    """Rangkum teks dokumen utuh, section = hasil split_by_pasal"""
+    sections = [chunk for chunk, _ in split_by_pasal(text)]
+    return map_reduce_summary(sections, llm), len(sections)
+
+
+def _join_windows(items: List[Tuple[str, Dict]]) -> List[str]:
+    """Gabungkan window (CHUNK_FIT=pack, metadata "window" > 0) kembali ke section induknya"""
+    sections = []
+    for chunk, meta in items:
+        if meta.get("window", 0) > 0 and sections:
+            sections[-1] += "\n" + chunk
+        else:
+            sections.append(chunk)
+    return sections
+
+
+def sections_from_chunks(owner_chunks: List[str], owner_metadatas: List[Dict]) -> List[str]:
+    """
+    Rekonstruksi section dokumen dari chunk yang sudah ter-index (untuk backfill).
+    Urutan split_into_chunks: chunk tanggal, section pasal (diawali pembukaan bertipe 'umum'),
+    lalu chunk umum. Jika tidak ada pasal, pakai chunk umum. Window dari section yang sama digabung lagi.
+    """
+    items = list(zip(owner_chunks, owner_metadatas))
+    pasal_positions = [i for i, meta in enumerate(owner_metadatas) if meta.get("type") == "pasal"]
+    if not pasal_positions:
+        return _join_windows([(chunk, meta) for chunk, meta in items if meta.get("type") == "umum"])
+
+    first = pasal_positions[0]
+    start = first
+    if first > 0 and owner_metadatas[first - 1].get("type") == "umum":
+        start = first - 1
+        while start > 0 and owner_metadatas[start].get("window", 0) > 0:
+            start -= 1
+    return _join_windows(items[start:first] + [items[i] for i in pasal_positions])
+
+
+def summarize_owner(owner: str, chunks: List[str], metadatas: List[Dict], llm: LLMFunc,
+                    store: SummaryStore) -> str:
+    """Hitung rangkuman untuk owner dari chunk yang sudah ter-index dan simpan ke store"""
+    owner_items = [(chunk, meta) for chunk, meta in zip(chunks, metadatas)
+                   if meta.get("owner", "").lower() == owner.lower()]
+    sections = sections_from_chunks([c for c, _ in owner_items], [m for _, m in owner_items])
+    summary = map_reduce_summary(sections, llm)
+    if summary:
+        store.put(owner, summary, len(sections))
+    return summary
+
+
+if __name__ == "__main__":
+    # Backfill rangkuman untuk semua dokumen di doc_chunks.pkl
+    # Pakai LLM_BACKEND=stub untuk mencoba pipeline tanpa network
+    import sys
+    from llm import chat_completion
+
+    force = "--force" in sys.argv
+    with open("doc_chunks.pkl", "rb") as f:
+        data = pickle.load(f)
+    chunks, metadatas = data["chunks"], data["metadatas"]
+
+    store = SummaryStore.shared()
+    owners = sorted(set(meta["owner"] for meta in metadatas if "owner" in meta))
+    print(f"Total dokumen: {len(owners)}, sudah dirangkum: {len(store)}")
+
+    for owner in owners:
+        if owner in store and not force:
+            continue
+        print(f"\nMerangkum dokumen '{owner}'...")
+        try:
+            summarize_owner(owner, chunks, metadatas, chat_completion, store)
+        except Exception as e:
+            print(f"Gagal merangkum '{owner}': {e}")
+
+    print(f"\nSelesai. Rangkuman tersimpan di '{SUMMARY_STORE_PATH}'")
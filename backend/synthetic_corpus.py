@@ -0,0 +1,171 @@
+# synthetic_corpus.py
+"""
+Generator korpus PDF perjanjian sintetis (bahasa Indonesia) untuk benchmark.
+
+Struktur mengikuti dokumen asli: pembukaan "Pada hari ini, <hari>, tanggal .. bulan .. tahun ..",
+identitas para pihak (dengan tanggal lahir dd-mm-yyyy), objek Properti dan Area Dirambah
+(luas + lokasi), lalu PASAL 1..N. Sebagian halaman bisa dibuat sebagai hasil scan (gambar, tanpa
+text layer). Deterministik untuk seed yang sama.
+
+    python synthetic_corpus.py --output bench_pdf --docs 200 --pasal 12 --scanned-ratio 0.1
+"""
+import argparse
+import os
+import random
+from typing import Dict, List, Tuple
+
+import fitz  # PyMuPDF
+
+FIRST_NAMES = ["Akarsana", "Budi", "Citra", "Dewi", "Eka", "Fajar", "Gita", "Hendra", "Indah", "Joko",
+               "Kartika", "Lestari", "Made", "Nadia", "Oki", "Putri", "Rizky", "Sari", "Taufik", "Wulan"]
+LAST_NAMES = ["Fujiati", "Santoso", "Wijaya", "Pratama", "Hidayat", "Nugroho", "Kusuma", "Saputra",
+              "Halim", "Siregar", "Lubis", "Nasution", "Gunawan", "Setiawan", "Purnama", "Rahayu"]
+DAYS = ["Senin", "Selasa", "Rabu", "Kamis", "Jumat", "Sabtu", "Minggu"]
+MONTHS = ["Januari", "Februari", "Maret", "April", "Mei", "Juni", "Juli", "Agustus", "September",
+          "Oktober", "November", "Desember"]
+CITIES = ["Pekanbaru", "Duri", "Dumai", "Siak", "Bengkalis", "Rokan Hilir", "Kampar", "Medan"]
+STREETS = ["Ronggowarsito", "Sudirman", "Diponegoro", "Gatot Subroto", "Cihampelas", "Hang Tuah",
+           "Imam Bonjol", "Tuanku Tambusai", "Riau", "Nangka"]
+PASAL_TITLES = ["DEFINISI", "JAMINAN PIHAK PERTAMA", "RUANG LINGKUP PEKERJAAN", "KEWAJIBAN PIHAK PERTAMA",
+                "KEWAJIBAN PIHAK KEDUA", "JANGKA WAKTU", "KOMPENSASI", "KERAHASIAAN", "KEADAAN KAHAR",
+                "PENYELESAIAN SENGKETA", "PENGAKHIRAN PERJANJIAN", "KETENTUAN LAIN-LAIN"]
+CLAUSES = [
+    "Pihak Pertama wajib memenuhi semua kewajiban sehubungan dengan kepemilikan atas Properti sesuai "
+    "dengan peraturan perundang-undangan yang berlaku.",
+    "Pihak Kedua berhak melaksanakan pekerjaan pemulihan lahan terkontaminasi minyak bumi di Area Dirambah "
+    "selama Jangka Waktu Perjanjian.",
+    "Setiap perselisihan yang timbul akan diselesaikan secara musyawarah untuk mufakat dalam waktu "
+    "tiga puluh hari kalender.",
+    "Para Pihak sepakat bahwa seluruh informasi yang diperoleh sehubungan dengan Perjanjian bersifat "
+    "rahasia dan tidak akan diungkapkan kepada pihak ketiga.",
+    "Kompensasi dibayarkan oleh Pihak Kedua kepada Pihak Pertama melalui transfer ke rekening yang "
+    "ditunjuk paling lambat empat belas hari kerja.",
+    "Pihak Pertama menjamin bahwa Properti tidak sedang dalam sengketa, tidak dijaminkan, dan tidak "
+    "dalam sitaan pihak manapun.",
+    "Perjanjian ini dapat diakhiri lebih awal atas kesepakatan tertulis Para Pihak dengan pemberitahuan "
+    "paling lambat tiga puluh hari sebelumnya.",
+    "Keadaan kahar meliputi bencana alam, kebakaran, perang, huru-hara, serta kebijakan pemerintah "
+    "yang secara langsung mempengaruhi pelaksanaan pekerjaan.",
+]
+
+LINES_PER_PAGE = 58
+LINE_WIDTH = 95
+
+
+def owner_names(count: int, rng: random.Random) -> List[str]:
+    """Nama owner unik (ditambah angka jika kombinasi nama habis)"""
+    combos = [f"{first} {last}" for first in FIRST_NAMES for last in LAST_NAMES]
+    rng.shuffle(combos)
+    return [combos[i % len(combos)] + (f" {i // len(combos) + 1}" if i >= len(combos) else "")
+            for i in range(count)]
+
+
+def _wrap(paragraph: str, width: int = LINE_WIDTH) -> List[str]:
+    lines, current = [], ""
+    for word in paragraph.split():
+        if current and len(current) + 1 + len(word) > width:
+            lines.append(current)
+            current = word
+        else:
+            current = f"{current} {word}".strip()
+    if current:
+        lines.append(current)
+    return lines
+
+
+def contract_lines(owner: str, rng: random.Random, num_pasal: int) -> Tuple[List[str], Dict]:
+    """Baris teks satu dokumen perjanjian beserta fakta yang dimasukkan (untuk verifikasi)"""
+    facts = {
+        "hari": rng.choice(DAYS),
+        "tanggal": rng.randint(1, 28),
+        "bulan": rng.choice(MONTHS),
+        "tahun": rng.randint(2019, 2025),
+        "luas_properti": rng.randint(80, 2500),
+        "lokasi_properti": f"Jalan {rng.choice(STREETS)} Persil #{rng.randint(1, 300)}",
+        "luas_rambah": rng.randint(20, 900),
+        "lokasi_rambah": f"Jalan {rng.choice(STREETS)} Persil #{rng.randint(1, 300)}",
+    }
+    lahir = f"{rng.randint(1, 28):02d}-{rng.randint(1, 12):02d}-{rng.randint(1955, 2000)}"
+
+    lines = ["TEMPLATE PERJANJIAN", "PERJANJIAN PELAKSANAAN PEKERJAAN TERKAIT",
+             "PEMULIHAN LAHAN/TANAH TERKONTAMINASI MINYAK BUMI",
+             f"No. SP {rng.randint(1, 99)} /KBO/Tahun-Kode Simpan", ""]
+    lines += _wrap(f"Pada hari ini, {facts['hari']}, tanggal {facts['tanggal']} bulan {facts['bulan']} "
+                   f"tahun {facts['tahun']}, telah dibuat Perjanjian Pelaksanaan Pekerjaan Terkait Pemulihan "
+                   f"Lahan/Tanah Terkontaminasi Minyak Bumi ('Perjanjian'), oleh dan antara:")
+    lines += ["", f"Nama: {owner}", f"Nomor Identitas (KTP): {rng.randint(10 ** 15, 10 ** 16 - 1)}",
+              f"Tempat/Tanggal Lahir: {rng.choice(CITIES)}, {lahir}",
+              f"Alamat: Jalan {rng.choice(STREETS)} No. {rng.randint(1, 200):03d}, {rng.choice(CITIES)}", ""]
+    lines += _wrap(f"Pihak Pertama adalah pemilik sebidang tanah seluas ± {facts['luas_properti']} m2 di Lokasi "
+                   f"{facts['lokasi_properti']} ('Properti') dan penggarap lahan seluas ± {facts['luas_rambah']} m2 "
+                   f"di Lokasi {facts['lokasi_rambah']} ('Area Dirambah').")
+    lines.append("")
+
+    for number in range(1, num_pasal + 1):
+        lines += [f"PASAL {number}", PASAL_TITLES[(number - 1) % len(PASAL_TITLES)], ""]
+        for clause_number in range(1, rng.randint(2, 5) + 1):
+            lines += _wrap(f"({clause_number}) {rng.choice(CLAUSES)}")
+        lines.append("")
+    return lines, facts
+
+
+def write_contract_pdf(path: str, lines: List[str], rng: random.Random, scanned_ratio: float = 0.0) -> int:
+    """
+    Tulis baris teks ke PDF. Halaman "scan" dirender ke gambar lalu disisipkan tanpa text layer.
+
+    Returns:
+        Jumlah halaman
+    """
+    doc = fitz.open()
+    for start in range(0, len(lines), LINES_PER_PAGE):
+        page = doc.new_page(width=595, height=842)  # A4
+        y = 50
+        for line in lines[start:start + LINES_PER_PAGE]:
+            page.insert_text((50, y), line, fontsize=9, fontname="helv")
+            y += 13
+
+        # Halaman pertama selalu teks agar tanggal/owner tetap terbaca
+        if start > 0 and rng.random() < scanned_ratio:
+            pixmap = page.get_pixmap(dpi=100)
+            doc.delete_page(-1)
+            scanned = doc.new_page(width=595, height=842)
+            scanned.insert_image(scanned.rect, pixmap=pixmap)
+
+    pages = doc.page_count
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+    return pages
+
+
+def generate_corpus(output_dir: str, docs: int = 100, num_pasal: int = 12,
+                    scanned_ratio: float = 0.1, seed: int = 42) -> Dict:
+    """
+    Returns:
+        Ringkasan korpus: jumlah dokumen, halaman, byte, dan fakta per owner
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    rng = random.Random(seed)
+    owners = owner_names(docs, rng)
+    facts = {}
+    pages = 0
+    total_bytes = 0
+    for owner in owners:
+        lines, facts[owner] = contract_lines(owner, rng, num_pasal)
+        path = os.path.join(output_dir, f"{owner}.pdf")
+        pages += write_contract_pdf(path, lines, rng, scanned_ratio)
+        total_bytes += os.path.getsize(path)
+    return {"docs": docs, "pages": pages, "bytes": total_bytes, "seed": seed,
+            "num_pasal": num_pasal, "scanned_ratio": scanned_ratio, "facts": facts}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate korpus PDF perjanjian sintetis")
+    parser.add_argument("--output", default="bench_pdf")
+    parser.add_argument("--docs", type=int, default=100)
+    parser.add_argument("--pasal", type=int, default=12)
+    parser.add_argument("--scanned-ratio", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    corpus = generate_corpus(args.output, args.docs, args.pasal, args.scanned_ratio, args.seed)
+    print(f"{corpus['docs']} dokumen, {corpus['pages']} halaman, {corpus['bytes'] / 1e6:.1f} MB → '{args.output}'")
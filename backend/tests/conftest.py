@@ -0,0 +1,41 @@
+# conftest.py
+"""
+Fixture bersama. Modul backend memakai path relatif (doc_index.faiss, doc_catalog.db, ...), jadi setiap
+test berjalan di folder sementara sendiri.
+"""
+import hashlib
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class WordTokenizer:
+    def encode(self, text, add_special_tokens: bool = True, verbose: bool = False):
+        return list(range(len(text.split())))
+
+
+class HashingModel:
+    """Pengganti model embedding untuk test: vektor deterministik dari hash kata, tanpa download model"""
+    max_seq_length = 256
+    dimension = 16
+    tokenizer = WordTokenizer()
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def encode(self, texts, batch_size: int = 32, show_progress_bar: bool = False):
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[row, hashlib.md5(word.encode()).digest()[0] % self.dimension] += 1.0
+        return vectors
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,164 @@
+# test_compaction.py
+"""
+Compaction (compaction.py) dan ingest_manifest.json: pergeseran rentang chunk di dalam write-ahead
+marker, recovery compaction yang terputus, dan run ingest.py setelah compaction.
+"""
+import json
+import os
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from conftest import HashingModel
+
+
+def _extract_text(path, source_name):
+    """Pengganti _extract_pdf: file "PDF" di test berisi teks biasa, satu chunk per baris"""
+    owner = os.path.splitext(source_name)[0].strip()
+    with open(path, "r", encoding="utf-8") as f:
+        chunks = [line for line in f.read().splitlines() if line.strip()]
+    return chunks, [{"owner": owner, "type": "umum"} for _ in chunks], {}
+
+
+@pytest.fixture
+def ingest_env(workdir, monkeypatch):
+    import background_tasks
+    import ingest
+    import token_windows
+
+    monkeypatch.setattr(token_windows, "CHUNK_FIT", "off")
+    monkeypatch.setattr(ingest, "_extract_pdf", _extract_text)
+    monkeypatch.setattr(ingest, "ProcessPoolExecutor", ThreadPoolExecutor)
+    monkeypatch.setattr(ingest, "load_embedding_model", HashingModel)
+    monkeypatch.setattr(background_tasks, "load_embedding_model", HashingModel)
+
+    pdf_dir = workdir / "pdf"
+    pdf_dir.mkdir()
+    for name in ("Alfa", "Beta", "Gama"):
+        (pdf_dir / f"{name}.pdf").write_text(
+            "\n".join(f"{name} kalimat nomor {i}" for i in range(3)), encoding="utf-8")
+    return pdf_dir
+
+
+def _run_ingest(pdf_dir):
+    from ingest import BulkIngester
+
+    return BulkIngester(str(pdf_dir), workers=1).run()
+
+
+def _manifest():
+    with open("ingest_manifest.json", "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _assert_manifest_matches_chunks():
+    with open("doc_chunks.pkl", "rb") as f:
+        metadatas = pickle.load(f)["metadatas"]
+    manifest = _manifest()
+    for name, entry in manifest["files"].items():
+        owners = {metadatas[i]["owner"] for i in range(entry["chunk_start"], entry["chunk_end"])}
+        assert owners == {os.path.splitext(name)[0]}
+    assert manifest["chunk_count"] == len(metadatas)
+
+
+def _manager():
+    from background_tasks import BackgroundTaskManager
+
+    manager = BackgroundTaskManager()
+    if manager.index is None:
+        manager.load_existing_data()
+    return manager
+
+
+def test_apply_compaction_is_idempotent(workdir):
+    from ingest import IngestManifest
+
+    manifest = IngestManifest()
+    manifest.chunk_count = 9
+    manifest.files = {
+        "a.pdf": {"chunk_start": 0, "chunk_end": 3},
+        "b.pdf": {"chunk_start": 3, "chunk_end": 6},
+        "c.pdf": {"chunk_start": 6, "chunk_end": 9},
+    }
+    assert manifest.apply_compaction([(3, 6)], "c1")
+    assert not manifest.apply_compaction([(3, 6)], "c1")
+    assert manifest.files == {"a.pdf": {"chunk_start": 0, "chunk_end": 3},
+                              "c.pdf": {"chunk_start": 3, "chunk_end": 6}}
+    assert manifest.chunk_count == 6
+
+
+def test_apply_compaction_ignores_chunks_beyond_manifest(workdir):
+    from ingest import IngestManifest
+
+    # Chunk 4..8 ditambahkan lewat /upload/background, bukan milik manifest
+    manifest = IngestManifest()
+    manifest.chunk_count = 4
+    manifest.files = {"a.pdf": {"chunk_start": 0, "chunk_end": 4}}
+    assert manifest.apply_compaction([(5, 7)], "c1")
+    assert manifest.files["a.pdf"] == {"chunk_start": 0, "chunk_end": 4}
+    assert manifest.chunk_count == 4
+
+
+def test_ingest_after_compaction(ingest_env):
+    assert _run_ingest(ingest_env)["processed"] == 3
+
+    manager = _manager()
+    assert manager.delete_document("pdf_dir:Beta.pdf") is not None
+    (ingest_env / "Beta.pdf").unlink()
+    result = manager.compactor.compact(force=True)
+    assert result["removed_chunks"] == 3
+
+    manifest = _manifest()
+    assert set(manifest["files"]) == {"Alfa.pdf", "Gama.pdf"}
+    assert manifest["files"]["Gama.pdf"]["chunk_start"] == 3
+    _assert_manifest_matches_chunks()
+
+    # Run berikutnya tidak memproses ulang atau memotong apa pun
+    stats = _run_ingest(ingest_env)
+    assert stats["processed"] == 0
+    assert stats["total_chunks"] == 6
+    _assert_manifest_matches_chunks()
+
+
+def test_ingest_after_compaction_of_file_still_in_folder(ingest_env):
+    _run_ingest(ingest_env)
+    manager = _manager()
+    manager.delete_document("pdf_dir:Alfa.pdf")
+    manager.compactor.compact(force=True)
+
+    # File masih ada di folder: dilepas dari manifest lalu di-ingest ulang, tanpa duplikat
+    stats = _run_ingest(ingest_env)
+    assert stats["processed"] == 1
+    assert stats["total_chunks"] == 9
+    _assert_manifest_matches_chunks()
+
+
+def test_recover_interrupted_compaction_updates_manifest_once(ingest_env):
+    from compaction import compact_manifest
+
+    _run_ingest(ingest_env)
+    manager = _manager()
+    manager.delete_document("pdf_dir:Alfa.pdf")
+    (ingest_env / "Alfa.pdf").unlink()
+
+    # Crash setelah index/chunks ditulis ulang, sebelum manifest dan katalog disentuh
+    ranges = manager.catalog.tombstone_ranges()
+    compaction_id = manager.catalog.begin_compaction(ranges, len(manager.chunks))
+    manager.compactor._rewrite(ranges)
+    assert _manifest()["files"]["Beta.pdf"]["chunk_start"] == 3
+
+    # Restart: marker di katalog diselesaikan saat BackgroundTaskManager dibuat
+    restarted = _manager()
+    assert restarted.catalog.pending_compaction() is None
+    assert len(restarted.chunks) == 6
+    manifest = _manifest()
+    assert manifest["applied_compaction"] == compaction_id
+    assert manifest["files"]["Beta.pdf"]["chunk_start"] == 0
+    _assert_manifest_matches_chunks()
+    assert restarted.catalog.tombstone_ranges() == []
+
+    # Diterapkan tepat sekali
+    assert not compact_manifest(ranges, compaction_id)
+    assert _run_ingest(ingest_env)["processed"] == 0
+    _assert_manifest_matches_chunks()
@@ -0,0 +1,57 @@
+# test_embedding_backend.py
+"""
+Parity backend embedding ONNX / ONNX int8 (embedding_backend.py) terhadap SentenceTransformer torch.
+Butuh model hasil `python embedding_backend.py export`; di-skip jika belum diekspor.
+"""
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("transformers")
+
+import embedding_backend  # noqa: E402
+from embedding_backend import ONNX_DIR, ONNX_FILES, OnnxEmbedder  # noqa: E402
+
+# Path relatif ONNX_DIR mengikuti folder backend (tempat main.py dijalankan), bukan cwd pytest
+MODEL_DIR = ONNX_DIR if os.path.isabs(ONNX_DIR) else \
+    os.path.join(os.path.dirname(os.path.abspath(embedding_backend.__file__)), ONNX_DIR)
+
+# Sama dengan default `embedding_backend.py parity`
+PARITY_THRESHOLD = 0.99
+
+SENTENCES = [
+    "Pihak pertama menyewakan lahan perkebunan kelapa sawit kepada pihak kedua.",
+    "Pembayaran sewa dilakukan setiap tahun paling lambat tanggal 1 Januari.",
+    "PASAL 2 KEWAJIBAN PIHAK KEDUA",
+    "Luas tanah 1.250 m2 terletak di Desa Sukamaju, Kecamatan Cibeber.",
+    "What are the obligations of the first party?",
+    # Lebih panjang dari max_seq_length (256 token): kedua backend harus memotong dengan cara sama
+    " ".join(["Perjanjian ini berlaku sejak ditandatangani oleh kedua belah pihak."] * 60),
+]
+
+
+@pytest.fixture(scope="module")
+def torch_embeddings():
+    sentence_transformers = pytest.importorskip("sentence_transformers")
+    if not all(os.path.exists(os.path.join(MODEL_DIR, name)) for name in ONNX_FILES.values()):
+        pytest.skip(f"model ONNX belum diekspor ke '{MODEL_DIR}' (python embedding_backend.py export)")
+    model = sentence_transformers.SentenceTransformer(embedding_backend.EMBEDDING_MODEL, device="cpu")
+    embeddings = np.asarray(model.encode(SENTENCES), dtype=np.float32)
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("backend", list(ONNX_FILES))
+def test_onnx_backend_matches_torch(torch_embeddings, backend):
+    model = OnnxEmbedder(MODEL_DIR, quantized=backend == "onnx-int8")
+    embeddings = model.encode(SENTENCES, batch_size=4)
+
+    assert embeddings.shape == torch_embeddings.shape
+    np.testing.assert_allclose(np.linalg.norm(embeddings, axis=1), 1.0, atol=1e-4)
+    cosine = np.sum(torch_embeddings * embeddings, axis=1)
+    assert cosine.min() >= PARITY_THRESHOLD, f"{backend}: cosine per kalimat {np.round(cosine, 5)}"
+
+    # Satu kalimat (bentuk query) sama dengan hasil batch
+    single = model.encode(SENTENCES[0])
+    assert float(np.dot(single, embeddings[0])) >= 0.9999
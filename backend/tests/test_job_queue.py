@@ -0,0 +1,126 @@
+# test_job_queue.py
+"""
+Lease, retry dan kepemilikan job di JobQueue (job_queue.py), serta retry ingest setelah crash di
+tengah _process_task (background_tasks.py).
+"""
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+from conftest import HashingModel
+
+
+@pytest.fixture
+def queue(workdir):
+    from job_queue import JobQueue
+
+    return JobQueue("jobs.db", max_attempts=2, lease_seconds=60)
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    import job_queue
+
+    monkeypatch.setattr(job_queue, "JOB_BACKOFF_SECONDS", 0.0)
+
+
+def _expire_lease(queue, job_id):
+    queue._connect().execute("UPDATE jobs SET locked_until = ? WHERE id = ?", (time.time() - 1, job_id))
+    # Claim berikutnya hanya menjadwalkan ulang (run_after = sekarang + backoff)
+    assert queue.claim("sweeper") is None
+
+
+def test_expired_lease_is_retried_with_backoff(queue):
+    job_id = queue.enqueue("index_pdf", {})
+    assert queue.claim("w1")["attempts"] == 1
+    _expire_lease(queue, job_id)
+
+    # Lease habis: dijadwalkan ulang dengan backoff, tidak langsung diambil worker lain
+    assert queue.claim("w2") is None
+    job = queue.get(job_id)
+    assert job["status"] == "pending"
+    assert job["run_after"] > time.time()
+    assert "Lease expired" in job["error"]
+
+
+def test_expired_lease_fails_after_max_attempts(queue, no_backoff):
+    job_id = queue.enqueue("index_pdf", {})
+    for attempt in (1, 2):
+        assert queue.claim(f"w{attempt}")["attempts"] == attempt
+        _expire_lease(queue, job_id)
+
+    job = queue.get(job_id)
+    assert job["status"] == "failed"
+    assert job["attempts"] == 2
+
+
+def test_stale_worker_cannot_complete_or_fail(queue, no_backoff):
+    job_id = queue.enqueue("index_pdf", {})
+    queue.claim("w1")
+    _expire_lease(queue, job_id)
+    assert queue.claim("w2")["id"] == job_id
+
+    assert not queue.heartbeat(job_id, "w1")
+    assert not queue.complete(job_id, "w1", {"chunks": 1})
+    assert queue.fail(job_id, "w1", "boom") is None
+    assert queue.get(job_id)["locked_by"] == "w2"
+
+    assert queue.complete(job_id, "w2", {"chunks": 2})
+    assert queue.get(job_id)["result"] == {"chunks": 2}
+
+
+def test_release_dead_workers_counts_the_attempt(queue):
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    job_id = queue.enqueue("index_pdf", {})
+    queue.claim(f"{socket.gethostname()}:{dead.pid}:abc123")
+    alive_id = queue.enqueue("index_pdf", {})
+    queue.claim(f"{socket.gethostname()}:{os.getpid()}:def456")
+
+    assert queue.release_dead_workers() == 1
+    job = queue.get(job_id)
+    assert job["status"] == "pending"
+    assert job["attempts"] == 1
+    assert job["run_after"] > time.time()
+    assert queue.get(alive_id)["status"] == "processing"
+
+
+def test_retry_after_crash_does_not_duplicate_chunks(workdir, monkeypatch, no_backoff):
+    import background_tasks
+    from background_tasks import BackgroundTaskManager
+
+    monkeypatch.setattr(background_tasks, "load_embedding_model", HashingModel)
+    monkeypatch.setattr(background_tasks, "load_pdf_text", lambda path: "isi dokumen")
+    monkeypatch.setattr(background_tasks, "split_into_chunks", lambda text, filename, model=None: (
+        ["pasal satu", "pasal dua"], [{"owner": "Delta", "type": "umum"}] * 2))
+    monkeypatch.setattr(background_tasks, "summarize_text", lambda text, llm: ("", 0))
+    (workdir / "Delta.pdf").write_bytes(b"%PDF")
+
+    manager = BackgroundTaskManager()
+    manager.load_existing_data()
+    job_id = manager.create_task("job-1", "index_pdf", str(workdir / "Delta.pdf"))
+
+    # Attempt 1 crash setelah index/chunks tersimpan, sebelum progress dan katalog dicatat
+    def crash(*args):
+        raise RuntimeError("crash after save")
+
+    monkeypatch.setattr(manager, "_catalog_indexed", crash)
+    manager._run_job(manager.queue.claim("w1"), "w1")
+    assert manager.queue.get(job_id)["status"] == "pending"
+
+    # Restart: proses baru memuat index dari disk dan mengulang job
+    restarted = BackgroundTaskManager()
+    restarted.load_existing_data()
+    job = restarted.queue.claim("w2")
+    assert job["attempts"] == 2
+    restarted._run_job(job, "w2")
+
+    assert restarted.queue.get(job_id)["status"] == "completed"
+    assert restarted.chunks == ["pasal satu", "pasal dua"]
+    assert restarted.index.ntotal == 2
+    doc = restarted.catalog.get(job_id)
+    assert (doc["chunk_start"], doc["chunk_end"]) == (0, 2)
@@ -0,0 +1,48 @@
+# test_json_store.py
+"""
+FactStore / SummaryStore di atas JsonStore: beberapa instance (proses) menulis file yang sama tanpa
+saling menimpa.
+"""
+import json
+
+
+def test_two_fact_stores_do_not_lose_updates(workdir):
+    from fact_extractor import FactStore
+
+    first, second = FactStore(), FactStore()
+    first.put("Alfa", {"luas": {"value": "100 m2", "confidence": 0.9}})
+    second.put("Beta", {"luas": {"value": "200 m2", "confidence": 0.9}})
+
+    with open("doc_facts.json", "r", encoding="utf-8") as f:
+        assert set(json.load(f)) == {"alfa", "beta"}
+    assert second.lookup("Alfa", "luas")["value"] == "100 m2"
+    assert first.lookup("Beta", "luas")["value"] == "200 m2"
+
+    first.remove("Beta")
+    assert not second.has_owner("Beta")
+    assert second.has_owner("Alfa")
+
+
+def test_two_summary_stores_do_not_lose_updates(workdir):
+    from summarizer import SummaryStore
+
+    first, second = SummaryStore(), SummaryStore()
+    first.put("Alfa", "rangkuman alfa", 2)
+    second.put("Beta", "rangkuman beta", 3)
+
+    assert first.get("Beta") == "rangkuman beta"
+    assert second.get("Alfa") == "rangkuman alfa"
+    assert len(first) == len(second) == 2
+
+    second.remove("Alfa")
+    assert "Alfa" not in first
+    assert len(SummaryStore()) == 1
+
+
+def test_shared_returns_one_instance_per_file(workdir):
+    from fact_extractor import FactStore
+    from summarizer import SummaryStore
+
+    assert SummaryStore.shared() is SummaryStore.shared("doc_summaries.json")
+    assert FactStore.shared() is FactStore.shared()
+    assert SummaryStore.shared("lain.json") is not SummaryStore.shared()
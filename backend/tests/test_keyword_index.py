@@ -0,0 +1,77 @@
+# test_keyword_index.py
+"""
+Keyword index (keyword_index.py) di sisi query: doc_keyword_index.pkl milik ingest dimuat dan dibatasi
+ke snapshot tanpa ditulis ulang, dan HybridRetriever tidak menyentuh file itu.
+"""
+import os
+
+from keyword_index import KEYWORD_INDEX_PATH, InvertedIndex, load_keyword_index
+
+CHUNKS = ["perjanjian jual beli rumah tinggal", "sewa lahan perkebunan kelapa sawit",
+          "pembayaran sewa tahunan", "hibah tanah kepada ahli waris"]
+
+
+def test_retriever_builds_keyword_index_in_memory(workdir):
+    from retrieval import HybridRetriever
+
+    InvertedIndex.build(CHUNKS).save()
+    saved = os.path.getmtime(KEYWORD_INDEX_PATH), os.path.getsize(KEYWORD_INDEX_PATH)
+
+    # Subset (mis. chunk satu shard) tidak boleh menimpa index global
+    retriever = HybridRetriever(None, CHUNKS[:2], [{}, {}])
+    assert retriever.keyword_index.num_docs == 2
+    assert (os.path.getmtime(KEYWORD_INDEX_PATH), os.path.getsize(KEYWORD_INDEX_PATH)) == saved
+    assert InvertedIndex.load().num_docs == len(CHUNKS)
+
+    os.remove(KEYWORD_INDEX_PATH)
+    HybridRetriever(None, CHUNKS, [{}] * len(CHUNKS))
+    assert not os.path.exists(KEYWORD_INDEX_PATH)
+
+
+def _file_state():
+    return os.path.getmtime(KEYWORD_INDEX_PATH), os.path.getsize(KEYWORD_INDEX_PATH)
+
+
+def test_load_caps_saved_index_to_snapshot(workdir):
+    # Worker sudah meng-index chunk ke-4 setelah snapshot query dibuat
+    InvertedIndex.build(CHUNKS).save()
+    saved = _file_state()
+
+    index = load_keyword_index(CHUNKS[:3])
+    assert sorted(index.doc_terms) == [0, 1, 2]
+    assert index.search("hibah tanah") == []
+    assert index.search("kelapa sawit")[0][0] == 1
+    assert _file_state() == saved
+
+
+def test_load_adds_missing_chunks_in_memory(workdir):
+    saved_index = InvertedIndex.build(CHUNKS[:2])
+    saved_index.remove_document(0)  # tombstone di worker
+    saved_index.save()
+    saved = _file_state()
+
+    index = load_keyword_index(CHUNKS)
+    assert sorted(index.doc_terms) == [1, 2, 3]
+    assert index.search("hibah tanah")[0][0] == 3
+    assert _file_state() == saved
+    assert InvertedIndex.load().num_docs == 1
+
+
+def test_load_rebuilds_when_saved_index_does_not_match(workdir):
+    # Mis. file dari compaction lain: id chunk sudah bergeser
+    InvertedIndex.build(CHUNKS[1:]).save()
+    index = load_keyword_index(CHUNKS[:3])
+    assert index.doc_terms == InvertedIndex.build(CHUNKS[:3]).doc_terms
+
+    os.remove(KEYWORD_INDEX_PATH)
+    assert load_keyword_index(CHUNKS).num_docs == len(CHUNKS)
+    assert not os.path.exists(KEYWORD_INDEX_PATH)
+
+
+def test_retriever_add_chunks_extends_keyword_search():
+    from retrieval import HybridRetriever
+
+    retriever = HybridRetriever(None, CHUNKS[:2], [{}, {}])
+    retriever.add_chunks(CHUNKS[2:], [{}, {}])
+    assert retriever.keyword_search("hibah tanah")[0][0] == 3
+    assert retriever.keyword_index.doc_terms == InvertedIndex.build(CHUNKS).doc_terms
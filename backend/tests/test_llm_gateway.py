@@ -0,0 +1,151 @@
+# test_llm_gateway.py
+"""
+LLMGateway (llm.py) terhadap fake_llm_server.py (in-process lewat ASGI) dan transport httpx palsu:
+retry, circuit breaker, hedging dan pembatalan request.
+"""
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from fake_llm_server import FakeLLMConfig, create_fake_llm_app
+from llm import CircuitBreaker, CircuitOpenError, LLMError, LLMGateway
+
+
+def _gateway(transport, **kwargs) -> LLMGateway:
+    kwargs.setdefault("hedge", False)
+    gateway = LLMGateway("http://fake-llm/v1", "test-key", backoff_base=0.0, **kwargs)
+    gateway._client = httpx.AsyncClient(base_url=gateway.base_url, transport=transport)
+    return gateway
+
+
+def _fake_server(**config) -> FakeLLMConfig:
+    return FakeLLMConfig(latency_ms=0.0, distribution="fixed", **config)
+
+
+def _completion(content: str) -> httpx.Response:
+    return httpx.Response(200, json={"choices": [{"message": {"role": "assistant", "content": content}}]})
+
+
+def _scripted(*steps):
+    """Transport yang menjalankan satu langkah per request: Response, exception, atau (delay, Response)"""
+    calls = []
+
+    async def handler(request):
+        step = steps[min(len(calls), len(steps) - 1)]
+        calls.append(request)
+        if isinstance(step, tuple):
+            delay, step = step
+            await asyncio.sleep(delay)
+        if isinstance(step, Exception):
+            raise step
+        return step
+
+    return httpx.MockTransport(handler), calls
+
+
+def test_answer_from_fake_server():
+    config = _fake_server()
+    gateway = _gateway(httpx.ASGITransport(app=create_fake_llm_app(config)))
+    assert asyncio.run(gateway.acomplete("system", "halo dunia")) == "halo dunia"
+    assert config.stats["requests"] == 1
+
+
+def test_5xx_is_retried_until_max_retries():
+    config = _fake_server(down=True, error_status=503)
+    gateway = _gateway(httpx.ASGITransport(app=create_fake_llm_app(config)), max_retries=2)
+    with pytest.raises(LLMError, match="3 percobaan"):
+        asyncio.run(gateway.acomplete("system", "halo"))
+    assert config.stats["requests"] == 3
+    assert gateway.metrics()["counters"]["retries"] == 2
+
+
+@pytest.mark.parametrize("first", [httpx.Response(502, text="bad gateway"), httpx.ReadTimeout("slow")])
+def test_transient_error_then_success(first):
+    transport, calls = _scripted(first, _completion("pulih"))
+    gateway = _gateway(transport, max_retries=2)
+    assert asyncio.run(gateway.acomplete("system", "halo")) == "pulih"
+    assert len(calls) == 2
+    assert gateway.breaker.state == "closed"
+
+
+def test_4xx_is_not_retried():
+    config = _fake_server(down=True, error_status=400)
+    gateway = _gateway(httpx.ASGITransport(app=create_fake_llm_app(config)), max_retries=2)
+    with pytest.raises(LLMError, match="HTTP 400"):
+        asyncio.run(gateway.acomplete("system", "halo"))
+    assert config.stats["requests"] == 1
+    assert gateway.breaker.state == "closed"
+
+
+def test_breaker_opens_fails_fast_and_recovers():
+    config = _fake_server(down=True)
+    gateway = _gateway(httpx.ASGITransport(app=create_fake_llm_app(config)), max_retries=0,
+                       breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.1))
+    for _ in range(2):
+        with pytest.raises(LLMError):
+            asyncio.run(gateway.acomplete("system", "halo"))
+    assert gateway.breaker.state == "open"
+
+    # Gagal cepat: request tidak sampai ke server
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(gateway.acomplete("system", "halo"))
+    assert config.stats["requests"] == 2
+
+    config.down = False
+    time.sleep(0.15)
+    assert asyncio.run(gateway.acomplete("system", "pulih")) == "pulih"
+    assert gateway.breaker.state == "closed"
+
+
+def test_hedge_is_launched_and_wins():
+    transport, calls = _scripted((1.0, _completion("primary")), _completion("hedge"))
+    gateway = _gateway(transport, hedge=True, hedge_min_samples=1, hedge_min_delay=0.05)
+    gateway.latency.record(0.01)
+
+    started = time.perf_counter()
+    assert asyncio.run(gateway.acomplete("system", "halo")) == "hedge"
+    assert time.perf_counter() - started < 0.9
+    counters = gateway.metrics()["counters"]
+    assert counters["hedges_launched"] == 1
+    assert counters["hedges_won"] == 1
+    assert len(calls) == 2
+
+
+def test_cancelled_half_open_probe_releases_breaker():
+    transport, calls = _scripted(httpx.Response(500), (10.0, _completion("lambat")))
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60.0)
+    gateway = _gateway(transport, max_retries=0, breaker=breaker)
+
+    async def scenario():
+        with pytest.raises(LLMError):
+            await gateway.acomplete("system", "halo")
+        assert breaker.state == "open"
+        breaker.opened_at -= 60.0  # reset_timeout lewat
+
+        probe = asyncio.ensure_future(gateway.acomplete("system", "probe"))
+        while len(calls) < 2:
+            await asyncio.sleep(0.01)
+        assert breaker.state == "half_open"
+        assert not breaker.allow()  # hanya satu percobaan sekaligus
+
+        # Mis. client /ask/batch disconnect
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+    asyncio.run(scenario())
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+
+
+def test_lost_half_open_probe_expires_after_reset_timeout():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()
+    # Percobaan tidak pernah melapor (record_success/record_failure/release)
+    time.sleep(0.06)
+    assert breaker.allow()
@@ -0,0 +1,125 @@
+# test_query_corpus.py
+"""
+Snapshot query di ask.py mengikuti index yang ditulis worker upload (background_tasks.py) tanpa restart,
+di proses yang sama (index_listeners) maupun di worker serve.py lain (_sync_query_corpus).
+"""
+import asyncio
+import pickle
+import sys
+
+import faiss
+import nltk
+import numpy as np
+import pytest
+
+from conftest import HashingModel
+
+
+def _nltk_data_available() -> bool:
+    """preprocess_text (BM25 owner) butuh punkt + stopwords NLTK yang tidak diunduh saat test"""
+    try:
+        nltk.data.find("tokenizers/punkt_tab")
+        nltk.data.find("corpora/stopwords")
+    except LookupError:
+        return False
+    return True
+
+
+def _write_corpus(chunks, metadatas):
+    index = faiss.IndexFlatL2(HashingModel.dimension)
+    index.add(np.asarray(HashingModel().encode(chunks), dtype=np.float32))
+    faiss.write_index(index, "doc_index.faiss")
+    with open("doc_chunks.pkl", "wb") as f:
+        pickle.dump({"chunks": chunks, "metadatas": metadatas}, f)
+
+
+@pytest.fixture
+def query_app(workdir, monkeypatch):
+    """main.py (dan ask.py) diimpor ulang di folder sementara dengan corpus satu dokumen"""
+    spacy = pytest.importorskip("spacy")
+    import background_tasks
+    import embedding_backend
+
+    monkeypatch.setenv("LLM_BACKEND", "stub")
+    monkeypatch.setattr(spacy, "load", lambda name: spacy.blank("en"))
+    monkeypatch.setattr(embedding_backend, "load_embedding_model", HashingModel)
+    monkeypatch.setattr(background_tasks, "load_embedding_model", HashingModel)
+    monkeypatch.setattr(background_tasks, "load_pdf_text", lambda path: "isi dokumen")
+    monkeypatch.setattr(background_tasks, "split_into_chunks", lambda text, filename, model=None: (
+        ["sewa lahan perkebunan kelapa sawit", "pembayaran sewa tahunan"], [{"owner": "Beta", "type": "umum"}] * 2))
+    monkeypatch.setattr(background_tasks, "summarize_text", lambda text, llm: ("", 0))
+
+    _write_corpus(["perjanjian jual beli rumah tinggal"], [{"owner": "Alfa", "type": "umum"}])
+    monkeypatch.setattr(background_tasks, "task_manager", background_tasks.BackgroundTaskManager())
+    for name in ("ask", "main"):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+    import main
+
+    background_tasks.task_manager.load_existing_data()
+    return main
+
+
+def _index_upload(workdir, manager):
+    path = workdir / "Beta.pdf"
+    path.write_bytes(b"%PDF")
+    job_id = manager.create_task("job-beta", "index_pdf", str(path))
+    manager._run_job(manager.queue.claim("w1"), "w1")
+    assert manager.queue.get(job_id)["status"] == "completed"
+
+
+@pytest.mark.parametrize("mmap", [False, True])
+def test_uploaded_document_is_searchable_without_restart(query_app, workdir, monkeypatch, mmap):
+    ask = query_app.ask
+    # FAISS_MMAP: snapshot tidak disambung di memori tapi dimuat ulang dari disk
+    monkeypatch.setattr(ask, "FAISS_MMAP", mmap)
+    before = query_app.task_manager.catalog.index_version()
+    ask.search_chunks(["rumah"], top_k=1)
+    retriever = ask.get_global_retriever(ask.corpus.generation)
+
+    _index_upload(workdir, query_app.task_manager)
+
+    assert query_app.task_manager.catalog.index_version() == before + 1
+    assert "Beta" in ask.all_owners
+    assert len(ask.corpus.chunks) == ask.corpus.index.ntotal == 3
+    hits, _ = ask.search_chunks(["kelapa sawit"], top_k=2)
+    assert hits[0][0]["metadata"]["owner"] == "Beta"
+    # Tanpa mmap keyword index global diperpanjang di tempat, tidak dibangun ulang
+    assert (ask.get_global_retriever(ask.corpus.generation) is retriever) != mmap
+
+
+@pytest.mark.skipif(not _nltk_data_available(), reason="data NLTK (punkt_tab, stopwords) belum diunduh")
+def test_uploaded_owner_is_answerable_without_restart(query_app, workdir):
+    ask = query_app.ask
+    _index_upload(workdir, query_app.task_manager)
+
+    assert ask.detect_owner_from_question("berapa pembayaran sewa Beta") == "Beta"
+    owner_hits, _ = ask.search_chunks(["pembayaran sewa"], owner="Beta", top_k=2)
+    assert {hit["chunk_id"] for hit in owner_hits[0]} == {1, 2}
+
+
+def test_other_worker_follows_index_version(query_app, workdir, monkeypatch):
+    """Worker query serve.py tanpa worker ingest: upload dari proses lain terlihat lewat katalog"""
+    import background_tasks
+
+    ask = query_app.ask
+    monkeypatch.setattr(ask, "FAISS_MMAP", True)
+    # Proses lain (worker 0) dengan katalog dan file yang sama; listener-nya tidak menyentuh ask
+    ingest_worker = background_tasks.BackgroundTaskManager()
+    ingest_worker.load_existing_data()
+
+    async def scenario():
+        sync = asyncio.ensure_future(query_app._sync_query_corpus(0.01))
+        await asyncio.sleep(0.05)
+        _index_upload(workdir, ingest_worker)
+        assert len(ask.corpus.chunks) == 1
+        for _ in range(200):
+            if len(ask.corpus.chunks) == 3:
+                break
+            await asyncio.sleep(0.01)
+        sync.cancel()
+
+    asyncio.run(scenario())
+    assert len(ask.corpus.chunks) == ask.corpus.index.ntotal == 3
+    assert "Beta" in ask.all_owners
+    hits, _ = ask.search_chunks(["kelapa sawit"], top_k=2)
+    assert hits[0][0]["metadata"]["owner"] == "Beta"
@@ -0,0 +1,132 @@
+# test_sharding.py
+"""
+Pencarian global lewat dua proses shard_server.py (ShardRouter.search, scatter-gather ke /search)
+harus memberi top-k yang sama dengan HybridRetriever satu index atas corpus yang sama.
+"""
+import hashlib
+import os
+import random
+import socket
+import subprocess
+import sys
+
+import faiss
+import numpy as np
+import pytest
+
+from conftest import HashingModel
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NUM_SHARDS = 2
+TOP_K = 5
+
+
+class DenseHashingModel(HashingModel):
+    """Vektor acak (seed dari hash kata) per kata: jarak L2 antar chunk praktis tidak pernah seri"""
+    dimension = 32
+
+    def encode(self, texts, batch_size: int = 32, show_progress_bar: bool = False):
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                seed = int.from_bytes(hashlib.md5(word.encode()).digest()[:4], "little")
+                vectors[row] += np.random.default_rng(seed).standard_normal(self.dimension)
+        return vectors
+
+
+def _synthetic_chunks(docs: int = 12):
+    """Paragraf perjanjian sintetis (synthetic_corpus.py) sebagai chunk, satu owner per dokumen"""
+    synthetic_corpus = pytest.importorskip("synthetic_corpus")
+    rng = random.Random(7)
+    chunks, metadatas = [], []
+    for owner in synthetic_corpus.owner_names(docs, rng):
+        lines, _ = synthetic_corpus.contract_lines(owner, rng, num_pasal=4)
+        paragraph = []
+        for line in lines + [""]:
+            if line:
+                paragraph.append(line)
+            elif paragraph:
+                # Nama owner di setiap chunk: tidak ada dua chunk identik (skor seri)
+                chunks.append(f"{owner}. " + " ".join(paragraph))
+                metadatas.append({"owner": owner, "type": "pasal" if paragraph[0].startswith("PASAL") else "umum"})
+                paragraph = []
+    return chunks, metadatas
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def shard_cluster(workdir):
+    """Corpus master dibagi ke 2 shard, masing-masing dilayani proses shard_server.py sendiri"""
+    from sharding import ShardRouter, split_corpus
+
+    chunks, metadatas = _synthetic_chunks()
+    index = faiss.IndexFlatL2(DenseHashingModel.dimension)
+    index.add(np.asarray(DenseHashingModel().encode(chunks), dtype=np.float32))
+    deleted = {3, 10}  # tombstone tidak ikut ke shard
+    shards = split_corpus(index, chunks, metadatas, NUM_SHARDS, "shards", deleted)
+    assert all(info["chunks"] for info in shards)
+
+    processes, urls = [], []
+    log = open("shard_servers.log", "ab")
+    try:
+        for shard in range(NUM_SHARDS):
+            port = _free_port()
+            processes.append(subprocess.Popen(
+                [sys.executable, os.path.join(BACKEND_DIR, "shard_server.py"), "--shard-dir",
+                 os.path.join("shards", f"shard_{shard:02d}"), "--port", str(port), "--log-level", "warning"],
+                stdout=log, stderr=subprocess.STDOUT))
+            urls.append(f"http://127.0.0.1:{port}")
+        # URL dibalik: router mengurutkan shard menurut id dari /health
+        router = ShardRouter(list(reversed(urls)), startup_wait=60.0)
+        yield router, index, chunks, metadatas, deleted
+        router.close()
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        log.close()
+
+
+def test_two_shards_match_single_index(shard_cluster):
+    from retrieval import HybridRetriever
+    from sharding import _same_ranking
+
+    router, index, chunks, metadatas, deleted = shard_cluster
+    live = [i for i in range(len(chunks)) if i not in deleted]
+    assert router.num_shards == NUM_SHARDS
+    assert router.total_chunks == len(live)
+
+    # Referensi satu proses atas chunk hidup; id lokal dipetakan ke id global
+    model = DenseHashingModel()
+    reference = HybridRetriever(model, [chunks[i] for i in live], [metadatas[i] for i in live])
+    reference_index = faiss.IndexFlatL2(index.d)
+    reference_index.add(np.ascontiguousarray(index.reconstruct_n(0, index.ntotal)[live], dtype=np.float32))
+    reference.set_faiss_index(reference_index)
+
+    # Klausul sintetis berulang antar dokumen: banyak skor keyword seri di batas kandidat (expanded_k)
+    queries = [" ".join(chunks[i].split()[:10]) for i in live[::7]] + \
+        ["kewajiban pihak pertama", "penyelesaian sengketa secara musyawarah", chunks[3]]
+    vectors = np.asarray(model.encode(queries), dtype=np.float32)
+    results, failed = router.search(queries, vectors, TOP_K)
+    assert failed == []
+
+    expected_lists = reference.hybrid_search_batch(queries, TOP_K, query_vecs=vectors)
+    for query, expected, actual in zip(queries, expected_lists, results):
+        expected = [(live[r["chunk_index"]], r["combined_score"]) for r in expected]
+        actual = [(r["chunk_index"], r["combined_score"]) for r in actual]
+        assert len(actual) == TOP_K
+        assert _same_ranking(expected, actual), f"{query!r}: {expected} vs {actual}"
+        assert not deleted & {chunk_id for chunk_id, _ in actual}
+
+    for hit in results[0]:
+        assert hit["text"] == chunks[hit["chunk_index"]]
+        assert hit["metadata"] == metadatas[hit["chunk_index"]]
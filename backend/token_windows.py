@@ -0,0 +1,166 @@
+# token_windows.py
+"""
+Ukuran chunk dalam token tokenizer model embedding, bukan kata.
+
+all-MiniLM-L6-v2 memotong input di max_seq_length (256 wordpiece termasuk [CLS]/[SEP]); teks setelah
+itu ikut di-tokenisasi tapi tidak pernah masuk embedding, jadi tidak bisa ditemukan lewat FAISS.
+
+CHUNK_FIT:
+    pack  chunk yang melebihi budget dipecah menjadi beberapa chunk (window) di batas kalimat/baris (default)
+    pool  chunk tetap utuh; embedding-nya rata-rata embedding setiap window (encode_chunks)
+    off   perilaku lama: chunk di-encode apa adanya dan terpotong di encoder
+
+Window tidak saling tumpang tindih dan diambil langsung dari teks asli (format baris tetap).
+"""
+import os
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+CHUNK_FIT = os.getenv("CHUNK_FIT", "pack")
+CHUNK_FIT_MODES = ("pack", "pool", "off")
+
+WORD_PATTERN = re.compile(r"\S+")
+SENTENCE_END = ".!?;:"
+
+
+def _check_fit(fit: Optional[str]) -> str:
+    fit = fit or CHUNK_FIT
+    if fit not in CHUNK_FIT_MODES:
+        raise ValueError(f"CHUNK_FIT tidak dikenal: '{fit}' ({' | '.join(CHUNK_FIT_MODES)})")
+    return fit
+
+
+def token_budget(model) -> int:
+    """Token isi per input: max_seq_length dikurangi [CLS] dan [SEP]"""
+    return int(getattr(model, "max_seq_length", None) or 256) - 2
+
+
+def word_token_counter(tokenizer) -> Callable[[str], int]:
+    """
+    Jumlah token per kata (di-cache). Tokenizer WordPiece memecah teks per spasi lebih dulu,
+    jadi jumlah token teks = jumlah token kata-katanya.
+    """
+    cache: Dict[str, int] = {}
+
+    def count(word: str) -> int:
+        tokens = cache.get(word)
+        if tokens is None:
+            tokens = len(tokenizer.encode(word, add_special_tokens=False))
+            cache[word] = tokens
+        return tokens
+    return count
+
+
+def split_windows(text: str, count_word: Callable[[str], int], budget: int) -> List[str]:
+    """
+    Potong teks menjadi window <= budget token. Unit terkecil adalah kalimat/baris (berakhir dengan
+    tanda baca atau newline); kalimat yang sendirian melebihi budget dipotong per kata.
+    """
+    words = list(WORD_PATTERN.finditer(text))
+    if not words:
+        return [text.strip()] if text.strip() else []
+    counts = [count_word(match.group()) for match in words]
+    if sum(counts) <= budget:
+        return [text.strip()]
+
+    # Unit (kata pertama, kata terakhir, token)
+    units: List[Tuple[int, int, int]] = []
+    first, tokens = 0, 0
+    for i, match in enumerate(words):
+        tokens += counts[i]
+        is_last = i == len(words) - 1
+        if is_last or match.group()[-1] in SENTENCE_END or "\n" in text[match.end():words[i + 1].start()]:
+            if tokens > budget:
+                units.extend((j, j, counts[j]) for j in range(first, i + 1))
+            else:
+                units.append((first, i, tokens))
+            first, tokens = i + 1, 0
+
+    windows = []
+    window_first, window_last, window_tokens = None, None, 0
+    for first, last, tokens in units:
+        if window_first is not None and window_tokens + tokens > budget:
+            windows.append(text[words[window_first].start():words[window_last].end()])
+            window_first, window_tokens = None, 0
+        if window_first is None:
+            window_first = first
+        window_last = last
+        window_tokens += tokens
+    windows.append(text[words[window_first].start():words[window_last].end()])
+    return windows
+
+
+def fit_chunks(chunks: List[str], metadatas: List[Dict], model, fit: Optional[str] = None) -> Tuple[List[str], List[Dict]]:
+    """
+    CHUNK_FIT=pack: chunk yang melebihi budget diganti window-nya; metadata disalin ke setiap window
+    (ditambah "window": urutan window) sehingga filter owner/type/pasal tetap berlaku.
+    Mode lain: chunks dikembalikan apa adanya.
+    """
+    if _check_fit(fit) != "pack" or not chunks:
+        return chunks, metadatas
+    count_word, budget = word_token_counter(model.tokenizer), token_budget(model)
+    fitted_chunks, fitted_metadatas = [], []
+    for chunk, meta in zip(chunks, metadatas):
+        windows = split_windows(chunk, count_word, budget)
+        if len(windows) <= 1:
+            fitted_chunks.append(chunk)
+            fitted_metadatas.append(meta)
+            continue
+        for position, window in enumerate(windows):
+            fitted_chunks.append(window)
+            fitted_metadatas.append({**meta, "window": position})
+    return fitted_chunks, fitted_metadatas
+
+
+def encode_chunks(model, chunks: List[str], batch_size: int = 32, fit: Optional[str] = None) -> np.ndarray:
+    """
+    Embedding chunk (float32). CHUNK_FIT=pool: setiap chunk dipecah ke window, semua window di-encode
+    dalam satu batch lalu dirata-rata per chunk (norma = rata-rata norma window, jadi tetap di ruang
+    yang sama dengan chunk satu window). Mode lain: encode biasa.
+    """
+    if _check_fit(fit) != "pool" or not chunks:
+        return np.asarray(model.encode(chunks, batch_size=batch_size, show_progress_bar=False), dtype=np.float32)
+
+    count_word, budget = word_token_counter(model.tokenizer), token_budget(model)
+    windows, owners = [], []
+    for i, chunk in enumerate(chunks):
+        for window in split_windows(chunk, count_word, budget) or [chunk]:
+            windows.append(window)
+            owners.append(i)
+    vectors = np.asarray(model.encode(windows, batch_size=batch_size, show_progress_bar=False), dtype=np.float32)
+    owners = np.asarray(owners)
+    counts = np.bincount(owners, minlength=len(chunks)).astype(np.float32)[:, None]
+
+    pooled = np.zeros((len(chunks), vectors.shape[1]), dtype=np.float32)
+    np.add.at(pooled, owners, vectors)
+    pooled /= counts
+    norms = np.zeros((len(chunks), 1), dtype=np.float32)
+    np.add.at(norms, owners, np.linalg.norm(vectors, axis=1, keepdims=True))
+    pooled_norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+    pooled_norms[pooled_norms == 0] = 1.0
+    return pooled * (norms / counts) / pooled_norms
+
+
+def truncation_stats(chunks: List[str], model, fit: Optional[str] = None) -> Dict:
+    """
+    Token input encoder yang berada di luar max_seq_length (dibuang encoder). Input encoder adalah
+    chunk itu sendiri, atau window-nya untuk CHUNK_FIT=pool.
+    """
+    count_word, budget = word_token_counter(model.tokenizer), token_budget(model)
+    inputs = chunks
+    if _check_fit(fit) == "pool":
+        inputs = [window for chunk in chunks for window in split_windows(chunk, count_word, budget) or [chunk]]
+    sizes = [sum(count_word(word) for word in text.split()) for text in inputs]
+    total = sum(sizes)
+    dropped = sum(max(0, size - budget) for size in sizes)
+    return {
+        "token_budget": budget,
+        "encoder_inputs": len(inputs),
+        "total_tokens": total,
+        "tokens_beyond_budget": dropped,
+        "truncated_token_ratio": round(dropped / total, 4) if total else 0.0,
+        "inputs_over_budget": sum(size > budget for size in sizes),
+        "max_input_tokens": max(sizes) if sizes else 0,
+    }
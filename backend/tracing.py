@@ -0,0 +1,139 @@
+# tracing.py
+"""
+Trace per request (opt-in) dan profiling cProfile yang disimpan ke disk.
+
+Trace aktif hanya di dalam run_traced(); di luar itu current_trace() mengembalikan None dan
+stage_timer/trace_set tidak melakukan apa-apa selain satu ContextVar.get.
+
+Profiling dipicu header X-Profile: 1 atau sampling acak PROFILE_SAMPLE_RATE (default 0 = mati).
+Hasil: PROFILE_DIR/ask_<waktu>_<id>.prof (buka dengan `python -m pstats` atau snakeviz)
+plus trace JSON dengan nama yang sama.
+"""
+import cProfile
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+_current_trace: ContextVar[Optional["RequestTrace"]] = ContextVar("request_trace", default=None)
+
+# cProfile (sys.monitoring di Python >= 3.12) hanya boleh aktif satu per proses
+_profile_lock = threading.Lock()
+
+
+class RequestTrace:
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex[:12]
+        self.stages: List[Tuple[str, float]] = []
+        self.attributes: Dict[str, Any] = {}
+        self.total_seconds = 0.0
+        self.profile_path: Optional[str] = None
+
+    @contextmanager
+    def stage(self, name: str, histogram=None):
+        """Catat durasi tahap ke trace (dan ke histogram jika diberikan)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(name, time.perf_counter() - started, histogram)
+
+    def record_stage(self, name: str, seconds: float, histogram=None):
+        self.stages.append((name, seconds))
+        if histogram is not None:
+            histogram.observe(seconds, name)
+
+    def to_dict(self) -> Dict:
+        totals: Dict[str, float] = {}
+        for name, seconds in self.stages:
+            totals[name] = totals.get(name, 0.0) + seconds
+        return {
+            "trace_id": self.trace_id,
+            "total_ms": round(self.total_seconds * 1000, 3),
+            "stages": [{"stage": name, "ms": round(seconds * 1000, 3)} for name, seconds in self.stages],
+            "stage_totals_ms": {name: round(seconds * 1000, 3) for name, seconds in totals.items()},
+            "profile_path": self.profile_path,
+            **self.attributes,
+        }
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+def trace_set(key: str, value: Any):
+    """Tambahkan atribut ke trace aktif (no-op jika tidak ada trace)"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.attributes[key] = value
+
+
+def should_profile(header_value: Optional[str] = None) -> bool:
+    if header_value is not None and header_value.lower() in ("1", "true", "yes"):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _prune_profiles():
+    """Simpan hanya PROFILE_MAX_FILES profile terbaru (beserta trace JSON-nya)"""
+    profiles = sorted((os.path.join(PROFILE_DIR, name) for name in os.listdir(PROFILE_DIR)
+                       if name.endswith(".prof")), key=os.path.getmtime)
+    for path in profiles[:max(0, len(profiles) - PROFILE_MAX_FILES)]:
+        for stale in (path, os.path.splitext(path)[0] + ".json"):
+            if os.path.exists(stale):
+                os.remove(stale)
+
+
+def _save_profile(profiler: cProfile.Profile, trace: RequestTrace) -> str:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stem = os.path.join(PROFILE_DIR, f"ask_{time.strftime('%Y%m%d-%H%M%S')}_{trace.trace_id}")
+    profiler.dump_stats(stem + ".prof")
+    trace.profile_path = stem + ".prof"
+    with open(stem + ".json", "w", encoding="utf-8") as f:
+        json.dump(trace.to_dict(), f, indent=2, ensure_ascii=False, default=str)
+    _prune_profiles()
+    return trace.profile_path
+
+
+def run_traced(func: Callable, *args, profile: bool = False, **kwargs) -> Tuple[Any, RequestTrace]:
+    """
+    Jalankan func dengan trace aktif; jika profile=True juga dengan cProfile
+    (dilewati jika profiling lain sedang berjalan, ditandai profile_skipped).
+
+    Returns:
+        (hasil func, trace)
+    """
+    trace = RequestTrace()
+    token = _current_trace.set(trace)
+    profiler = None
+    if profile:
+        if _profile_lock.acquire(blocking=False):
+            profiler = cProfile.Profile()
+        else:
+            trace.attributes["profile_skipped"] = "profiler sedang dipakai request lain"
+
+    started = time.perf_counter()
+    try:
+        if profiler is not None:
+            try:
+                return profiler.runcall(func, *args, **kwargs), trace
+            finally:
+                _profile_lock.release()
+        return func(*args, **kwargs), trace
+    finally:
+        trace.total_seconds = time.perf_counter() - started
+        _current_trace.reset(token)
+        if profiler is not None:
+            try:
+                _save_profile(profiler, trace)
+            except OSError as e:
+                print(f"[PROFILE] Gagal menyimpan profile: {e}")
@@ -15,7 +15,11 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class DeleteManager:
-    """Manages file deletion operations for DocNLP RAG System"""
+    """
+    Manages file deletion operations for DocNLP RAG System (layout lama storage/index).
+    Server memakai DELETE /files: tombstone + compaction.py di atas doc_index.faiss/doc_chunks.pkl.
+    Chunk id di layout ini tidak berhubungan dengan doc_catalog.db, jadi katalog tidak disentuh.
+    """
     
     def __init__(self, base_dir: str):
         self.base_dir = base_dir
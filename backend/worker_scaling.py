@@ -0,0 +1,182 @@
+# worker_scaling.py
+"""
+Memori dan throughput serve.py dari 1 sampai N worker (Linux, membaca /proc).
+
+Untuk setiap jumlah worker: jalankan serve.py di folder kerja (korpus sintetis loadtest.py + fake LLM),
+beri beban closed-loop, lalu ukur per proses dari /proc/<pid>/smaps_rollup:
+- RSS: halaman yang dipetakan proses (halaman bersama dihitung penuh di setiap proses)
+- PSS: halaman bersama dibagi rata antar proses → jumlah PSS = memori fisik sebenarnya
+- USS (Private_Clean + Private_Dirty): tambahan memori per worker karena copy-on-write
+
+Pembanding (--baseline): satu proses `uvicorn main:app` tanpa preload/mmap, yaitu biaya per worker
+jika setiap worker memuat state sendiri.
+
+    python worker_scaling.py --workers 1,2,4 --users 16 --duration 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from benchmark import _git_commit
+from loadtest import (BACKEND_DIR, DEFAULT_MIX, LoadGenerator, backend_process, fake_llm_process,
+                      parse_mix, prepare_workdir)
+
+MB = 1024 * 1024
+
+
+def process_memory(pid: int) -> Dict[str, Optional[float]]:
+    """RSS/PSS/USS (MB) satu proses; PSS/USS None jika smaps_rollup tidak tersedia"""
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    except FileNotFoundError:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    fields["Rss"] = int(line.split()[1]) * 1024
+    uss = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0) if "Pss" in fields else None
+    return {
+        "rss_mb": round(fields["Rss"] / MB, 1),
+        "pss_mb": round(fields["Pss"] / MB, 1) if "Pss" in fields else None,
+        "uss_mb": round(uss / MB, 1) if uss is not None else None,
+    }
+
+
+def child_pids(pid: int) -> List[int]:
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(value) for value in f.read().split()]
+
+
+def _total(values: List[Optional[float]]) -> Optional[float]:
+    return round(sum(values), 1) if all(value is not None for value in values) else None
+
+
+def measure(master_pid: int) -> Dict:
+    master = process_memory(master_pid)
+    workers = [process_memory(pid) for pid in child_pids(master_pid)]
+    processes = [master] + workers
+    return {
+        "master": master,
+        "workers": workers,
+        "total_rss_mb": _total([p["rss_mb"] for p in processes]),
+        "total_pss_mb": _total([p["pss_mb"] for p in processes]),
+        "mean_worker_uss_mb": round(sum(w["uss_mb"] for w in workers) / len(workers), 1)
+        if workers and workers[0]["uss_mb"] is not None else None,
+    }
+
+
+def run_load(base_url: str, owners: List[str], args) -> Dict:
+    generator = LoadGenerator(base_url, owners, parse_mix(args.mix), [], timeout=args.timeout, seed=args.seed)
+    return asyncio.run(generator.run_step(args.users, args.duration, args.warmup))
+
+
+def scaling_step(workdir: str, owners: List[str], args, log, workers: Optional[int]) -> Dict:
+    """workers=None → baseline satu proses uvicorn tanpa preload"""
+    if workers is None:
+        command, extra_env = None, {"FAISS_MMAP": "0"}
+    else:
+        command = [sys.executable, os.path.join(BACKEND_DIR, "serve.py"), "--workers", str(workers),
+                   "--host", "127.0.0.1", "--port", str(args.port), "--log-level", "warning"]
+        extra_env = {}
+    with backend_process(workdir, args, log, command, extra_env) as backend:
+        time.sleep(1.0)  # worker lain masih menjalankan startup setelah worker pertama siap
+        idle = measure(backend.pid) if workers is not None else {"master": process_memory(backend.pid)}
+        load = run_load(f"http://127.0.0.1:{args.port}", owners, args)
+        loaded = measure(backend.pid) if workers is not None else {"master": process_memory(backend.pid)}
+    return {"workers": workers or "baseline", "idle": idle, "loaded": loaded,
+            "throughput_rps": load["throughput_rps"], "latency": load["latency"], "error_rate": load["error_rate"]}
+
+
+def add_scaling(steps: List[Dict]):
+    """Tambahan PSS per worker dan efisiensi throughput relatif terhadap 1 worker"""
+    first = next((step for step in steps if step["workers"] == 1), None)
+    baseline = next((step for step in steps if step["workers"] == "baseline"), None)
+    for step in steps:
+        if baseline is not None and step is not baseline:
+            # Perkiraan jika setiap worker memuat state sendiri (uvicorn --workers tanpa preload)
+            step["naive_rss_mb"] = round(baseline["loaded"]["master"]["rss_mb"] * step["workers"], 1)
+        if first is None or step["workers"] in ("baseline", 1):
+            continue
+        extra = step["workers"] - 1
+        pss, first_pss = step["loaded"]["total_pss_mb"], first["loaded"]["total_pss_mb"]
+        if pss is not None and first_pss is not None:
+            step["incremental_pss_per_worker_mb"] = round((pss - first_pss) / extra, 1)
+        if first["throughput_rps"]:
+            step["speedup"] = round(step["throughput_rps"] / first["throughput_rps"], 2)
+            step["efficiency"] = round(step["speedup"] / step["workers"], 2)
+
+
+def print_table(steps: List[Dict]):
+    print(f"{'workers':>8} {'rss MB':>9} {'pss MB':>9} {'uss/wkr':>8} {'+pss/wkr':>9} "
+          f"{'rps':>8} {'p50 ms':>8} {'p99 ms':>8} {'speedup':>8}")
+    for step in steps:
+        loaded = step["loaded"]
+        rss = loaded.get("total_rss_mb", loaded["master"]["rss_mb"])
+        pss = loaded.get("total_pss_mb", loaded["master"]["pss_mb"])
+        print(f"{step['workers']!s:>8} {rss!s:>9} {pss!s:>9} {loaded.get('mean_worker_uss_mb', '-')!s:>8} "
+              f"{step.get('incremental_pss_per_worker_mb', '-')!s:>9} {step['throughput_rps']:>8.1f} "
+              f"{step['latency'].get('p50_ms', 0):>8.1f} {step['latency'].get('p99_ms', 0):>8.1f} "
+              f"{step.get('speedup', '-')!s:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RSS/PSS per worker dan throughput serve.py dari 1..N worker")
+    parser.add_argument("--workers", default="1,2,4", help="Jumlah worker per step")
+    parser.add_argument("--baseline", action="store_true",
+                        help="Tambahkan step satu proses uvicorn tanpa preload/mmap sebagai pembanding")
+    parser.add_argument("--users", type=int, default=16, help="User virtual (sama untuk semua step)")
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--mix", default=DEFAULT_MIX.replace(",upload=0", ""))
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "docqa_loadtest"))
+    parser.add_argument("--docs", type=int, default=50)
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--startup-timeout", type=float, default=180.0)
+    parser.add_argument("--llm-port", type=int, default=8089)
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0)
+    parser.add_argument("--llm-distribution", default="lognormal")
+    parser.add_argument("--llm-spread", type=float, default=0.5)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--output", default="worker_scaling_results.json")
+    args = parser.parse_args()
+
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        print("[SCALING] /proc/<pid>/smaps_rollup tidak tersedia: hanya RSS yang dilaporkan")
+    os.makedirs(args.workdir, exist_ok=True)
+    owners = prepare_workdir(args.workdir, args.docs, args.seed)
+    counts = [int(value) for value in args.workers.split(",")]
+
+    steps = []
+    with open(os.path.join(args.workdir, "worker_scaling_server.log"), "ab") as log, fake_llm_process(args, log):
+        for workers in ([None] if args.baseline else []) + counts:
+            step = scaling_step(args.workdir, owners, args, log, workers)
+            steps.append(step)
+            print(f"[SCALING] workers={step['workers']} rps={step['throughput_rps']:.1f} "
+                  f"rss={step['loaded'].get('total_rss_mb', step['loaded']['master']['rss_mb'])}MB "
+                  f"pss={step['loaded'].get('total_pss_mb', step['loaded']['master']['pss_mb'])}MB")
+    add_scaling(steps)
+    print_table(steps)
+
+    results = {
+        "meta": {"timestamp": datetime.now().isoformat(), "git_commit": _git_commit(),
+                 "python": platform.python_version(), "platform": platform.platform(),
+                 "cpu_count": os.cpu_count(),
+                 "params": {key: value for key, value in vars(args).items() if key != "output"}},
+        "steps": steps,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"[SCALING] Hasil disimpan ke '{args.output}'")
@@ -22,9 +22,24 @@ export interface UploadResponse {
 }
 
 export interface FileInfo {
+  id?: string;
   filename: string;
+  original_name?: string;
+  owner?: string | null;
   size: number;
+  pages?: number | null;
+  status?: string;
+  chunks?: number;
   upload_time: number;
+  indexed_at?: string | null;
+}
+
+export interface FileListParams {
+  limit?: number;
+  offset?: number;
+  owner?: string;
+  q?: string;
+  status?: string;
 }
 
 export interface TaskResponse {
@@ -33,6 +48,16 @@ export interface TaskResponse {
   status: string;
 }
 
+export interface TaskEvent {
+  id: number;
+  task_id: string;
+  status: string;
+  stage: string | null;
+  progress: number;
+  message: string;
+  created_at: string;
+}
+
 export interface TaskStatus {
   id: string;
   status: string;
@@ -140,9 +165,16 @@ class DocumentAIAPI {
   }
 
   // Get uploaded files
-  async getUploadedFiles(): Promise<{ files: FileInfo[] }> {
+  async getUploadedFiles(
+    params: FileListParams = {}
+  ): Promise<{ files: FileInfo[]; total: number }> {
     try {
-      const response = await fetch(`${this.baseUrl}/files`);
+      const query = new URLSearchParams();
+      Object.entries(params).forEach(([key, value]) => {
+        if (value !== undefined && value !== "") query.set(key, String(value));
+      });
+      const suffix = query.toString() ? `?${query}` : "";
+      const response = await fetch(`${this.baseUrl}/files${suffix}`);
       if (!response.ok) {
         throw new Error(`HTTP error! status: ${response.status}`);
       }
@@ -191,6 +223,28 @@ class DocumentAIAPI {
     }
   }
 
+  // Subscribe to task progress (Server-Sent Events). Without taskId: all tasks.
+  // EventSource reconnects automatically and resumes via Last-Event-ID.
+  subscribeTaskEvents(
+    onEvent: (event: TaskEvent) => void,
+    taskId?: string
+  ): () => void {
+    const url = taskId
+      ? `${this.baseUrl}/upload/tasks/${taskId}/events`
+      : `${this.baseUrl}/upload/tasks/events`;
+    const source = new EventSource(url);
+
+    source.addEventListener("progress", (message) => {
+      const event: TaskEvent = JSON.parse((message as MessageEvent).data);
+      onEvent(event);
+      if (taskId && (event.status === "completed" || event.status === "failed")) {
+        source.close();
+      }
+    });
+
+    return () => source.close();
+  }
+
   // Get all tasks
   async getAllTasks(): Promise<{ tasks: TaskStatus[] }> {
     try {